@@ -0,0 +1,91 @@
+"""
+A local HTTP server for tests that talk to a registry.
+
+The tests subclass ``RegistryHandler`` to get their own documents and
+request log, and run it with ``RegistryServerTestCase``.
+"""
+
+import gzip
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, NamedTuple, Optional, Type
+
+
+class SeenRequest(NamedTuple):
+    """A request the server received."""
+
+    path: str
+    if_none_match: Optional[str]
+    authorization: Optional[str]
+    client_port: int
+
+
+class RegistryHandler(BaseHTTPRequestHandler):
+    """Serves JSON documents over persistent connections and honours If-None-Match.
+
+    ``documents`` maps request paths to the documents served; subclasses
+    compute them from the path by overriding ``document``. Responses are
+    gzip-encoded when ``compress`` is set and the client accepts it.
+    """
+
+    protocol_version = "HTTP/1.1"
+    documents: Dict[str, Any] = {}
+    requests_seen: List[SeenRequest] = []
+    compress = False
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        type(self).requests_seen.append(SeenRequest(self.path, self.headers.get("If-None-Match"),
+                                                    self.headers.get("Authorization"), self.client_address[1]))
+        doc = self.document(self.path)
+        if doc is None:
+            self._send(404)
+            return
+        body = json.dumps(doc).encode("utf-8")
+        etag = f'"{hash(body) & 0xffffffff:x}"'
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, {"ETag": etag})
+            return
+        headers = {"Content-Type": "application/json", "ETag": etag}
+        if self.compress and "gzip" in (self.headers.get("Accept-Encoding") or ""):
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        self._send(200, headers, body)
+
+    def document(self, path: str) -> Any:
+        """The document served at ``path``, or None for a 404."""
+        return self.documents.get(path)
+
+    def _send(self, status: int, headers: Optional[Dict[str, str]] = None, body: bytes = b"") -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+class RegistryServerTestCase(unittest.TestCase):
+    """Runs ``handler`` at ``base`` for the tests of the class; each test starts with an empty request log."""
+
+    handler: Type[RegistryHandler] = RegistryHandler
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), cls.handler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.handler.requests_seen = []
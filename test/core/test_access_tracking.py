@@ -0,0 +1,91 @@
+"""
+Unit tests for tracking the document parts templates read.
+"""
+
+import hashlib
+import unittest
+
+import jinja2
+
+from xregistry.generator.access_tracking import AccessRecorder, enable_tracking, read_digest
+
+DOCUMENT = {
+    "messagegroups": {
+        "a": {"description": "first", "messages": {"m1": {"name": "one"}, "m2": {"name": "two"}}},
+        "b/c": {"description": "second", "messages": {}},
+    },
+    "tags": ["x", "y", "z"],
+}
+
+TEMPLATE = """
+{%- for id, group in root.messagegroups.items() %}{{ id }}:{{ group.description }};{% endfor %}
+{{ root.messagegroups.a.messages | length }} {{ root.tags[-1] }} {{ root.tags | last }} {{ root.tags[:2] }}
+{{ root.messagegroups.a.messages.m1 | tojson }} {{ root.missing is defined }} {{ root.get('other', 'none') }}
+{{ root.messagegroups['b/c'] }} {{ 'y' in root.tags }}
+"""
+
+
+def _digest(node):
+    return hashlib.sha256(repr(node).encode("utf-8")).digest()
+
+
+class TestAccessTracking(unittest.TestCase):
+    """Test that tracked renders produce the same output and record what they read."""
+
+    def _render(self, tracked):
+        env = jinja2.Environment()
+        if tracked:
+            enable_tracking(env)
+        recorder = AccessRecorder()
+        root = recorder.track(DOCUMENT) if tracked else DOCUMENT
+        return env.from_string(TEMPLATE).render(root=root), recorder.reads()
+
+    def test_output_is_unchanged(self):
+        """Tracked documents render like plain ones."""
+        self.assertEqual(self._render(True)[0], self._render(False)[0])
+
+    def test_reads_are_recorded(self):
+        """Reads are recorded by pointer with their kind; reads below whole subtrees are dropped."""
+        reads = self._render(True)[1]
+        self.assertEqual(reads["/messagegroups"], "keys")
+        self.assertEqual(reads["/messagegroups/a/description"], "value")
+        self.assertEqual(reads["/messagegroups/a/messages"], "keys")
+        self.assertEqual(reads["/messagegroups/a/messages/m1"], "tree")
+        self.assertEqual(reads["/messagegroups/b~1c"], "tree")
+        self.assertEqual(reads["/missing"], "value")
+        self.assertEqual(reads["/other"], "value")
+        self.assertEqual(reads["/tags"], "tree")
+        self.assertNotIn("/messagegroups/b~1c/description", reads)
+        self.assertNotIn("/messagegroups/a/messages/m2", reads)
+
+    def test_undefined_messages_name_plain_types(self):
+        """Errors about missing members name the plain types, not the tracking wrappers."""
+        for template in ("{{ root.endpoints.x }}", "{{ root.tags.first.x }}"):
+            messages = []
+            for tracked in (False, True):
+                env = jinja2.Environment(undefined=jinja2.StrictUndefined)
+                if tracked:
+                    enable_tracking(env)
+                root = AccessRecorder().track(DOCUMENT) if tracked else DOCUMENT
+                with self.assertRaises(jinja2.UndefinedError) as raised:
+                    env.from_string(template).render(root=root)
+                messages.append(str(raised.exception))
+            self.assertEqual(messages[1], messages[0])
+        self.assertEqual(messages[0], "'list object' has no attribute 'first'")
+
+    def test_read_digest(self):
+        """Digests change with what the kind of read sees, and only with that."""
+        changed = {"messagegroups": {"a": {"description": "first", "messages": {"m1": {"name": "uno"}}}}}
+        self.assertEqual(read_digest(DOCUMENT, "/messagegroups/a/description", "value", _digest),
+                         read_digest(changed, "/messagegroups/a/description", "value", _digest))
+        self.assertEqual(read_digest(DOCUMENT, "/messagegroups/a/messages", "value", _digest),
+                         read_digest(changed, "/messagegroups/a/messages", "value", _digest))
+        self.assertNotEqual(read_digest(DOCUMENT, "/messagegroups/a/messages", "keys", _digest),
+                            read_digest(changed, "/messagegroups/a/messages", "keys", _digest))
+        self.assertNotEqual(read_digest(DOCUMENT, "/messagegroups/a/messages/m1", "tree", _digest),
+                            read_digest(changed, "/messagegroups/a/messages/m1", "tree", _digest))
+        self.assertEqual(read_digest(changed, "/tags/1", "value", _digest), "missing")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -613,6 +613,45 @@ class TestBasemessageResolution(unittest.TestCase):
         # Should have inherited dataschemaurl from CloudEvents base
         self.assertEqual(mqtt_msg["dataschemaurl"], "#/schemagroups/eventgroup/schemas/SensorReading")
 
+    def test_shared_base_chain_is_resolved_once(self):
+        """Test that derived messages listed before their bases reuse one resolution of the shared chain."""
+        messages = {
+            f"Derived{i}": {
+                "messageid": f"Derived{i}",
+                "basemessageurl": "#/messagegroups/testgroup/messages/Middle",
+                "envelopemetadata": {"type": {"value": f"com.example.derived{i}"}}
+            }
+            for i in range(3)
+        }
+        messages["Middle"] = {
+            "messageid": "Middle",
+            "basemessageurl": "/messagegroups/testgroup/messages/Root",
+            "envelopemetadata": {"source": {"value": "/middle"}}
+        }
+        messages["Root"] = {
+            "messageid": "Root",
+            "envelope": "CloudEvents/1.0",
+            "envelopemetadata": {"type": {"value": "com.example.root"}},
+            "protocolmetadata": {"headers": {"x": {"value": "1"}}}
+        }
+        doc = {"messagegroups": {"testgroup": {"messagegroupid": "testgroup", "messages": messages}}}
+
+        with patch('xregistry.generator.xregistry_loader.Model'):
+            resolver = XRegistryLoader().message_resolver
+        with patch.object(resolver, '_deep_merge', wraps=resolver._deep_merge) as mock_merge:
+            replaced = resolver.resolve_all_basemessages(doc)
+
+        # One merge per derived message, plus one for Middle over Root (nested merges included)
+        self.assertEqual(len([c for c in mock_merge.call_args_list if "messageid" in c.args[1]]), 4)
+        self.assertEqual(len(replaced), 4)
+        resolved = doc["messagegroups"]["testgroup"]["messages"]
+        self.assertEqual(resolved["Derived2"]["envelopemetadata"],
+                         {"type": {"value": "com.example.derived2"}, "source": {"value": "/middle"}})
+        self.assertEqual(resolved["Derived0"]["envelope"], "CloudEvents/1.0")
+        self.assertNotIn("basemessageurl", resolved["Derived1"])
+        # Unchanged subtrees of the base are shared, not copied
+        self.assertIs(resolved["Derived0"]["protocolmetadata"], messages["Root"]["protocolmetadata"])
+
 
 if __name__ == '__main__':
     unittest.main()
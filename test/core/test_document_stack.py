@@ -0,0 +1,75 @@
+"""
+Unit tests for copy-on-write document stacking.
+"""
+
+import copy
+import unittest
+
+from xregistry.common.model import ModelIndex
+from xregistry.generator.document_stack import DocumentStack
+
+MODEL_INDEX = ModelIndex.build({
+    "messagegroups": {"singular": "messagegroup", "resources": {"messages": {"singular": "message"}}},
+    "schemagroups": {"singular": "schemagroup", "resources": {"schemas": {"singular": "schema"}}},
+})
+
+
+class TestDocumentStack(unittest.TestCase):
+    """Test stacking semantics and what is shared with the stacked documents."""
+
+    def setUp(self):
+        self.base = {
+            "specversion": "1.0",
+            "messagegroups": {
+                "orders": {"description": "base", "messages": {"created": {"v": 1}, "deleted": {"v": 1}}},
+                "billing": {"messages": {"paid": {"v": 1}}},
+            },
+            "schemagroups": {"orders": {"schemas": {"created": {"v": 1}}}},
+        }
+        self.overlays = [
+            {"messagegroups": {"orders": {"description": "overlay", "messages": {"created": {"v": 2}}}}},
+            {"messagegroups": {"orders": {"messages": {"updated": {"v": 3}}}, "new": {"messages": {}}},
+             "specversion": "1.1"},
+        ]
+        self.inputs = copy.deepcopy([self.base] + self.overlays)
+
+    def _stack(self):
+        stack = DocumentStack(MODEL_INDEX, self.base)
+        for overlay in self.overlays:
+            stack.push(overlay)
+        return stack.document
+
+    def test_stacking_semantics(self):
+        """Groups and resources are merged by ID, everything else is replaced."""
+        document = self._stack()
+        orders = document["messagegroups"]["orders"]
+        self.assertEqual(orders["description"], "overlay")
+        self.assertEqual(orders["messages"], {"created": {"v": 2}, "deleted": {"v": 1}, "updated": {"v": 3}})
+        self.assertEqual(sorted(document["messagegroups"]), ["billing", "new", "orders"])
+        self.assertEqual(document["specversion"], "1.1")
+
+    def test_inputs_are_not_modified(self):
+        """Writes go to the stack's own copies."""
+        self._stack()
+        self.assertEqual([self.base] + self.overlays, self.inputs)
+
+    def test_untouched_containers_are_shared(self):
+        """Only the containers an overlay writes into are copied."""
+        document = self._stack()
+        self.assertIs(document["schemagroups"], self.base["schemagroups"])
+        self.assertIs(document["messagegroups"]["billing"], self.base["messagegroups"]["billing"])
+        self.assertIs(document["messagegroups"]["new"], self.overlays[1]["messagegroups"]["new"])
+        self.assertIsNot(document["messagegroups"]["orders"], self.base["messagegroups"]["orders"])
+
+    def test_copies_are_made_once(self):
+        """Later pushes write into the copies made by earlier pushes."""
+        stack = DocumentStack(MODEL_INDEX, self.base)
+        stack.push(self.overlays[0])
+        document, messages = stack.document, stack.document["messagegroups"]["orders"]["messages"]
+        stack.push(self.overlays[1])
+        self.assertIs(stack.document, document)
+        self.assertIs(stack.document["messagegroups"]["orders"]["messages"], messages)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Unit tests for checking expired snapshots against the epochs of registry groups.
+"""
+
+import json
+import tempfile
+import unittest
+
+from registry_server import RegistryHandler, RegistryServerTestCase
+from xregistry.common.http_cache import HttpResponseCache
+from xregistry.common.snapshot_cache import SnapshotCache
+from xregistry.generator.epoch_sync import entity_versions, split_registry_url
+from xregistry.generator.xregistry_loader import XRegistryLoader
+
+GROUP_TYPES = ("messagegroups", "schemagroups")
+
+
+class _RegistryHandler(RegistryHandler):
+    """Serves group listings and inlined groups built from ``groups``."""
+
+    groups: dict = {}
+
+    def document(self, path):
+        parts = [p for p in path.split("?")[0].split("/") if p]
+        if parts == ["capabilities"]:
+            return {}
+        if len(parts) == 1 and parts[0] in self.groups:
+            # Listings carry the group attributes, but not the resources
+            return {group_id: {k: v for k, v in group.items() if k not in ("messages", "schemas")}
+                    for group_id, group in self.groups[parts[0]].items()}
+        node = self.groups if len(parts) > 1 else None
+        for part in parts:
+            node = node.get(part) if isinstance(node, dict) else None
+        return node
+
+
+class TestEntityVersions(unittest.TestCase):
+    """Test what is recorded about fetched documents."""
+
+    def test_split_registry_url(self):
+        """Roots below a path prefix are kept whole."""
+        self.assertEqual(split_registry_url("https://h/reg/messagegroups/a?inline=*", GROUP_TYPES),
+                         ("https://h/reg", "messagegroups", ["a"]))
+        self.assertEqual(split_registry_url("https://h/reg?inline=*", GROUP_TYPES), ("https://h/reg", None, []))
+        self.assertIsNone(split_registry_url("doc.xreg.json", GROUP_TYPES))
+
+    def test_groups_and_collections(self):
+        """Groups record their version; collections the versions and IDs of their groups."""
+        self.assertEqual(entity_versions("https://h/messagegroups/a?inline=*", {"epoch": 2}, GROUP_TYPES),
+                         {"entities": {"https://h/messagegroups/a": [2, None]}, "members": {}})
+        registry = {"messagegroups": {"a": {"epoch": 1, "modifiedat": "t"}}, "schemagroups": {}}
+        self.assertEqual(entity_versions("https://h?inline=*", registry, GROUP_TYPES), {
+            "entities": {"https://h/messagegroups/a": [1, "t"]},
+            "members": {"https://h/messagegroups": ["a"], "https://h/schemagroups": []}})
+
+    def test_other_documents(self):
+        """Resources, unversioned groups and other documents record nothing."""
+        self.assertEqual(entity_versions("https://h/messagegroups/a/messages/m", {"epoch": 1}, GROUP_TYPES), {})
+        self.assertEqual(entity_versions("https://h/messagegroups", {"a": {}}, GROUP_TYPES), {})
+        self.assertEqual(entity_versions("https://h/files/schema.json", {"type": "object"}, GROUP_TYPES), {})
+
+
+class TestSnapshotResync(RegistryServerTestCase):
+    """Test loads of expired snapshots."""
+
+    handler = _RegistryHandler
+
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        _RegistryHandler.groups = {
+            "messagegroups": {"orders": {
+                "messagegroupid": "orders", "xid": "/messagegroups/orders", "epoch": 1,
+                "messages": {"created": {"messageid": "created", "xid": "/messagegroups/orders/messages/created",
+                                         "dataschemauri": "/schemagroups/orders/schemas/created"}}}},
+            "schemagroups": {"orders": {
+                "schemagroupid": "orders", "xid": "/schemagroups/orders", "epoch": 1,
+                "schemas": {"created": {"schemaid": "created", "xid": "/schemagroups/orders/schemas/created",
+                                        "versions": {"1": {"schema": {"type": "object"}}}}}}},
+        }
+
+    def _load(self):
+        # Snapshots and responses expire right away, so every load checks the registry
+        loader = XRegistryLoader(http_cache=HttpResponseCache(self.temp_dir.name + "/http", ttl=0),
+                                 snapshot_cache=SnapshotCache(self.temp_dir.name + "/snapshots", ttl=0))
+        _RegistryHandler.requests_seen = []
+        _, document = loader.load_with_dependencies(self.base + "/messagegroups/orders")
+        return loader, document
+
+    def test_unchanged_epochs_serve_the_snapshot(self):
+        """An expired snapshot is served after listing the groups and revalidating the other documents."""
+        _, cold = self._load()
+        loader, warm = self._load()
+        self.assertEqual(loader.stats.strategy, "resynced")
+        # The message group is checked by the listing, the referenced schema by revalidating it
+        self.assertEqual(sorted(request.path for request in _RegistryHandler.requests_seen),
+                         ["/messagegroups", "/schemagroups/orders/schemas/created?inline=*"])
+        self.assertEqual(warm, json.loads(json.dumps(cold)))
+
+    def test_changed_epoch_reloads(self):
+        """A group with a new epoch is fetched again."""
+        self._load()
+        group = _RegistryHandler.groups["messagegroups"]["orders"]
+        group["epoch"] = 2
+        group["messages"]["created"]["description"] = "changed"
+        loader, document = self._load()
+        self.assertEqual(loader.stats.strategy, "walk")
+        self.assertIn("/messagegroups/orders?inline=*", [request.path for request in _RegistryHandler.requests_seen])
+        self.assertEqual(document["messagegroups"]["orders"]["messages"]["created"]["description"], "changed")
+        loader, _ = self._load()
+        self.assertEqual(loader.stats.strategy, "resynced")
+
+    def test_changes_without_epoch_go_unnoticed(self):
+        """Groups are trusted by their epoch; their content is not compared."""
+        _, cold = self._load()
+        _RegistryHandler.groups["messagegroups"]["orders"]["messages"]["created"]["description"] = "changed"
+        loader, document = self._load()
+        self.assertEqual(loader.stats.strategy, "resynced")
+        self.assertEqual(document, json.loads(json.dumps(cold)))
+
+
+if __name__ == '__main__':
+    unittest.main()
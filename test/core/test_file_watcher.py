@@ -0,0 +1,54 @@
+"""
+Unit tests for polling files and directories for changes.
+"""
+
+import os
+import tempfile
+import unittest
+
+from xregistry.common.file_watcher import FileWatcher
+
+
+class TestFileWatcher(unittest.TestCase):
+    """Test that changed, added and removed files are reported once."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.definitions = os.path.join(self.temp_dir.name, "defs.xreg.json")
+        self.templates = os.path.join(self.temp_dir.name, "templates")
+        os.makedirs(os.path.join(self.templates, "py"))
+        self._write(self.definitions, "{}")
+        self._write(os.path.join(self.templates, "py", "a.jinja"), "a")
+
+    @staticmethod
+    def _write(path, content, mtime_ns=None):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def test_changes(self):
+        """Modified watched files and files added to or removed from watched directories are reported."""
+        watcher = FileWatcher([self.definitions], [self.templates], interval=0.01)
+        self.assertEqual(watcher.changes(), set())
+
+        self._write(self.definitions, "{ }", mtime_ns=10**18)
+        added = os.path.join(self.templates, "py", "b.jinja")
+        self._write(added, "b")
+        os.remove(os.path.join(self.templates, "py", "a.jinja"))
+        self._write(os.path.join(self.temp_dir.name, "unwatched.txt"), "x")
+        self.assertEqual(watcher.changes(), {os.path.abspath(self.definitions), os.path.abspath(added),
+                                             os.path.abspath(os.path.join(self.templates, "py", "a.jinja"))})
+        self.assertEqual(watcher.changes(), set())
+
+    def test_wait(self):
+        """Waiting returns the changes, or nothing after the timeout."""
+        watcher = FileWatcher([self.definitions], interval=0.01)
+        self.assertEqual(watcher.wait(timeout=0.05), set())
+        self._write(self.definitions, "{ }", mtime_ns=10**18)
+        self.assertEqual(watcher.wait(timeout=1), {os.path.abspath(self.definitions)})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+Unit tests for incremental generation with the generation manifest.
+"""
+
+import os
+import tempfile
+import unittest
+
+from xregistry.generator.generation_manifest import MANIFEST_NAME, GenerationManifest
+from xregistry.generator.generator_context import GeneratorContext
+from xregistry.generator.template_renderer import TemplateRenderer
+
+TEMPLATES = {
+    "greet.txt.jinja": 'Hello {{ root.name }}{{ root.name | push("names") }}',
+    "count.txt.jinja": '{{ pop("names") }} was pushed last',
+}
+
+
+class TestGenerationManifest(unittest.TestCase):
+    """Test that unchanged renders are skipped and unchanged files are not rewritten."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.template_dir = os.path.join(self.temp_dir.name, "templates")
+        self.out = os.path.join(self.temp_dir.name, "out")
+        os.makedirs(self.template_dir)
+        for name, source in TEMPLATES.items():
+            with open(os.path.join(self.template_dir, name), "w", encoding="utf-8") as f:
+                f.write(source)
+
+    def _generate(self, names, full=False, other=""):
+        manifest = GenerationManifest(self.out, full=full)
+        ctx = GeneratorContext(self.out, manifest=manifest)
+        renderer = TemplateRenderer(ctx, "Test", "py", "test", self.out, "", {}, [], {}, False, False)
+        env = renderer.setup_jinja_env([self.template_dir])
+        jobs = [renderer.template_job("Test", "Test", "TestData", "", {"name": name, "other": other}, self.out, f"{i:02}-{template}.txt",
+                                      env.get_template(f"{template}.txt.jinja"), {})
+                for i, (template, name) in enumerate(names)]
+        renderer.scheduler.run(jobs)
+        manifest.save()
+        return manifest, ctx
+
+    def _mtimes(self):
+        return {name: os.stat(os.path.join(self.out, name)).st_mtime_ns
+                for name in os.listdir(self.out) if name != MANIFEST_NAME}
+
+    def test_unchanged_renders_are_skipped(self):
+        """A second generation renders nothing, keeps the files and replays what the renders pushed."""
+        names = [("greet", "a"), ("greet", "b"), ("count", "")]
+        first, _ = self._generate(names)
+        self.assertEqual((first.rendered, first.written), (3, 3))
+        mtimes = self._mtimes()
+
+        second, ctx = self._generate(names)
+        self.assertEqual((second.skipped, second.rendered, second.written), (2, 1, 0))
+        self.assertEqual(self._mtimes(), mtimes)
+        self.assertEqual(ctx.stacks.stack("names"), ["a"])
+        with open(os.path.join(self.out, "02-count.txt"), "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), "b was pushed last")
+
+    def test_changed_inputs_are_rendered(self):
+        """Renders run again when their scope, template or output file changed, or with ``full``."""
+        names = [("greet", "a"), ("greet", "b")]
+        self._generate(names)
+
+        manifest, _ = self._generate([("greet", "a"), ("greet", "c")])
+        self.assertEqual((manifest.skipped, manifest.rendered, manifest.written), (1, 1, 1))
+
+        with open(os.path.join(self.out, "00-greet.txt"), "w", encoding="utf-8") as f:
+            f.write("edited")
+        manifest, _ = self._generate([("greet", "a"), ("greet", "c")])
+        self.assertEqual((manifest.skipped, manifest.rendered, manifest.written), (1, 1, 1))
+
+        manifest, _ = self._generate([("greet", "a"), ("greet", "c")], full=True)
+        self.assertEqual((manifest.skipped, manifest.rendered, manifest.written, manifest.unchanged), (0, 2, 0, 2))
+
+    def test_unread_document_parts_do_not_render_again(self):
+        """Renders run again only when the parts of the document they read changed."""
+        self._generate([("greet", "a")], other="x")
+        manifest, _ = self._generate([("greet", "a")], other="y")
+        self.assertEqual((manifest.skipped, manifest.rendered), (1, 0))
+        record = manifest.renders["greet.txt.jinja|00-greet.txt"]
+        self.assertEqual(record["reads"], {"/name": "value"})
+
+    def test_track_keeps_times_of_rewritten_files(self):
+        """Files a tool rewrites with the same content keep their modification time."""
+        manifest = GenerationManifest(self.out)
+        path = os.path.join(self.out, "data.txt")
+
+        def write(content):
+            os.makedirs(self.out, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+
+        manifest.track(self.out, lambda: write("one"))
+        os.utime(path, ns=(10**18, 10**18))
+        manifest.track(self.out, lambda: write("one"))
+        self.assertEqual(os.stat(path).st_mtime_ns, 10**18)
+        manifest.track(self.out, lambda: write("two"))
+        self.assertNotEqual(os.stat(path).st_mtime_ns, 10**18)
+        self.assertEqual((manifest.written, manifest.unchanged), (2, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Unit tests for the generation pipeline of watch mode.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from xregistry.common.http_cache import HttpResponseCache
+from xregistry.commands.generate_code import GenerationPipeline
+from xregistry.generator.generator_context import GeneratorContext
+
+
+class TestGenerationPipeline(unittest.TestCase):
+    """Test the stages of a generation and which of them a change affects."""
+
+    def _pipeline(self, offline=False):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        http_cache = HttpResponseCache(os.path.join(temp_dir.name, "http"), ttl=60, offline=offline)
+        ctx = GeneratorContext(os.path.join(temp_dir.name, "out"), http_cache=http_cache)
+        return GenerationPipeline(ctx, ["defs.xreg.json"], {}, {}, "Test", "py", "kafkaproducer",
+                                  os.path.join(temp_dir.name, "out"), None, False, False)
+
+    def test_validation_uses_the_http_cache(self):
+        """Definitions are validated through the generation's HTTP cache, so offline mode covers validation."""
+        pipeline = self._pipeline(offline=True)
+        with patch("xregistry.commands.generate_code.validate", return_value=1) as validate:
+            self.assertEqual(pipeline.run(), 1)
+        self.assertIs(validate.call_args.kwargs["http_cache"], pipeline.ctx.loader.http_cache)
+
+    def test_reload_forgets_resolved_references(self):
+        """Reloading the definitions resolves references again instead of reusing an earlier load's results."""
+        pipeline = self._pipeline()
+        resolver = pipeline.ctx.loader.dependency_resolver
+        resolver.resolved_resources["https://example.com/schemagroups/g"] = {}
+        resolver.unresolvable.add("https://example.com/messagegroups/m")
+        resolver.group_documents["https://example.com/schemagroups/g"] = {}
+        with patch("xregistry.commands.generate_code.validate", return_value=1):
+            pipeline.run(reload_definitions=False)
+            self.assertIn("https://example.com/messagegroups/m", resolver.unresolvable)
+            pipeline.run()
+        self.assertEqual((resolver.resolved_resources, resolver.unresolvable, resolver.group_documents), ({}, set(), {}))
+
+    def test_affected(self):
+        """Only paths below the template directories are template changes."""
+        templates = os.path.abspath(os.path.join("templates", "py", "kafkaproducer"))
+        template_dirs = {templates}
+        definitions = os.path.abspath("defs.xreg.json")
+        schema = os.path.abspath(os.path.join("schemas", "order.avsc"))
+        self.assertEqual(GenerationPipeline.affected({definitions}, template_dirs), (True, False))
+        self.assertEqual(GenerationPipeline.affected({schema}, template_dirs), (True, False))
+        self.assertEqual(GenerationPipeline.affected({os.path.join(templates, "producer.py.jinja")}, template_dirs),
+                         (False, True))
+        self.assertEqual(GenerationPipeline.affected({templates + "-other.json"}, template_dirs), (True, False))
+        self.assertEqual(GenerationPipeline.affected({schema, os.path.join(templates, "a.jinja")}, template_dirs),
+                         (True, True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""
+Unit tests for the on-disk HTTP response cache and its use by the loader.
+
+A small local HTTP server serves registry documents with an ETag so the
+tests can observe cache hits, conditional revalidation and offline mode.
+"""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from registry_server import RegistryHandler, RegistryServerTestCase
+from xregistry.common.http_cache import HttpResponseCache, extract_epoch
+from xregistry.common.http_transport import HttpTransport
+from xregistry.generator.xregistry_loader import XRegistryLoader
+
+
+class _RegistryHandler(RegistryHandler):
+    """Serves a fixed document, whatever the query."""
+
+    documents = {"/messagegroups": {"epoch": 3, "mg1": {"messagegroupid": "mg1"}}}
+
+    def document(self, path):
+        return self.documents.get(path.split("?")[0])
+
+
+class TestHttpResponseCache(unittest.TestCase):
+    """Test the cache store itself."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = HttpResponseCache(self.temp_dir.name, ttl=60)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_store_and_lookup(self):
+        """Stored bodies are returned together with their validators."""
+        self.cache.store("https://example.com/a", {}, b'{"epoch": 1}', {"ETag": '"x"'}, 1)
+        entry, body = self.cache.lookup("https://example.com/a", {})
+        self.assertEqual(body, b'{"epoch": 1}')
+        self.assertEqual(entry.etag, '"x"')
+        self.assertEqual(entry.epoch, 1)
+        self.assertTrue(self.cache.is_fresh(entry))
+
+    def test_headers_are_part_of_the_key(self):
+        """Requests with different credentials do not share entries."""
+        self.cache.store("https://example.com/a", {"Authorization": "one"}, b"{}")
+        self.assertIsNotNone(self.cache.lookup("https://example.com/a", {"Authorization": "one"}))
+        self.assertIsNone(self.cache.lookup("https://example.com/a", {"Authorization": "two"}))
+
+    def test_identical_bodies_share_a_blob(self):
+        """Bodies are content-addressed."""
+        self.cache.store("https://example.com/a", {}, b"{}")
+        self.cache.store("https://example.com/b", {}, b"{}")
+        self.assertEqual(len(list((self.cache.cache_dir / "blobs").iterdir())), 1)
+
+    def test_expired_entry(self):
+        """Entries older than the TTL need revalidation unless offline."""
+        entry = self.cache.store("https://example.com/a", {}, b"{}")
+        entry.stored_at = time.time() - 120
+        self.assertFalse(self.cache.is_fresh(entry))
+        self.cache.offline = True
+        self.assertTrue(self.cache.is_fresh(entry))
+
+    def test_clear(self):
+        """Clearing removes entries and blobs."""
+        self.cache.store("https://example.com/a", {}, b"{}")
+        self.assertEqual(self.cache.clear(), 2)
+        self.assertIsNone(self.cache.lookup("https://example.com/a", {}))
+
+    def test_registry_roots(self):
+        """Recorded roots are matched against candidates in order and expire with the TTL."""
+        self.cache.store_registry_root("https://example.com/api/")
+        candidates = ["https://example.com", "https://example.com/api", "https://example.com/api/registry"]
+        self.assertEqual(self.cache.lookup_registry_root(candidates), "https://example.com/api")
+        self.assertIsNone(self.cache.lookup_registry_root(["https://other.example.com"]))
+
+        with open(os.path.join(self.temp_dir.name, "roots.json"), "w", encoding="utf-8") as f:
+            json.dump({"https://example.com/api": time.time() - 120}, f)
+        self.assertIsNone(self.cache.lookup_registry_root(candidates))
+        self.cache.offline = True
+        self.assertEqual(self.cache.lookup_registry_root(candidates), "https://example.com/api")
+        self.assertEqual(self.cache.clear(), 1)
+
+    def test_extract_epoch(self):
+        """The epoch is taken from the document root."""
+        self.assertEqual(extract_epoch({"epoch": 7}), 7)
+        self.assertIsNone(extract_epoch({"epoch": "7"}))
+        self.assertIsNone(extract_epoch([1]))
+
+
+class TestLoaderHttpCaching(RegistryServerTestCase):
+    """Test conditional GET handling in the loader."""
+
+    handler = _RegistryHandler
+
+    def setUp(self):
+        super().setUp()
+        self.url = self.base + "/messagegroups"
+        self.temp_dir = tempfile.TemporaryDirectory()
+        with patch('xregistry.generator.xregistry_loader.Model'):
+            self.loader = XRegistryLoader(http_cache=HttpResponseCache(self.temp_dir.name, ttl=60))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_fresh_entry_is_served_without_request(self):
+        """A second load within the TTL does not contact the server."""
+        _, first = self.loader._load_from_url(self.url, {})
+        _, second = self.loader._load_from_url(self.url, {})
+        self.assertEqual(first, second)
+        self.assertEqual(len(_RegistryHandler.requests_seen), 1)
+        self.assertEqual(self.loader.http_cache.stats.to_dict(), {"hits": 1, "misses": 1, "revalidated": 0})
+
+    def test_expired_entry_is_revalidated(self):
+        """Stale entries are revalidated with If-None-Match."""
+        self.loader._load_from_url(self.url, {})
+        self.loader.http_cache._ttl = 0
+        _, document = self.loader._load_from_url(self.url, {})
+        self.assertEqual(document["epoch"], 3)
+        self.assertIsNotNone(_RegistryHandler.requests_seen[-1].if_none_match)
+        self.assertEqual(self.loader.http_cache.stats.revalidated, 1)
+
+    def test_offline_mode(self):
+        """Offline mode serves cached documents and fails for unknown ones."""
+        self.loader._load_from_url(self.url, {})
+        self.loader.http_cache.offline = True
+        self.loader.http_cache._ttl = 0
+        _, document = self.loader._load_from_url(self.url, {})
+        self.assertEqual(document["epoch"], 3)
+        _, missing = self.loader._load_from_url(self.url + "/other", {})
+        self.assertIsNone(missing)
+        self.assertEqual(len(_RegistryHandler.requests_seen), 1)
+
+    def test_configured_credentials_are_part_of_the_key(self):
+        """Responses fetched with the transport's configured token are not served to other identities."""
+        base_url = self.url.rsplit("/", 1)[0]
+
+        def loader(token, offline=False):
+            transport = HttpTransport(auth_token=token, auth_base_url=base_url)
+            self.addCleanup(transport.close)
+            with patch('xregistry.generator.xregistry_loader.Model'):
+                return XRegistryLoader(http_cache=HttpResponseCache(self.temp_dir.name, ttl=60, offline=offline),
+                                       transport=transport)
+
+        loader("a")._load_from_url(self.url, {})
+        loader("b")._load_from_url(self.url, {})
+        self.assertEqual(len(_RegistryHandler.requests_seen), 2)
+        loader("a")._load_from_url(self.url, {})
+        self.assertEqual(len(_RegistryHandler.requests_seen), 2)
+        _, document = loader(None, offline=True)._load_from_url(self.url, {})
+        self.assertIsNone(document)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Unit tests for the shared pooled HTTP transport.
+
+A local HTTP/1.1 server records the client port of every request so the
+tests can observe connection reuse.
+"""
+
+import unittest
+from unittest.mock import patch
+
+from registry_server import RegistryHandler, RegistryServerTestCase
+from xregistry.common.http_transport import HttpTransport
+from xregistry.generator.xregistry_loader import XRegistryLoader
+
+
+class _KeepAliveHandler(RegistryHandler):
+    """Serves a gzip-encoded JSON document naming the requested path."""
+
+    compress = True
+
+    def document(self, path):
+        document = {"path": path}
+        if path.startswith("/large"):
+            document["items"] = [{"id": i, "description": "repetitive text"} for i in range(200)]
+        return document
+
+
+class TestHttpTransport(RegistryServerTestCase):
+    """Test connection reuse, decoding and auth scoping."""
+
+    handler = _KeepAliveHandler
+
+    def setUp(self):
+        super().setUp()
+        self.transport = HttpTransport(timeout=5, auth_token="secret", auth_base_url=self.base + "/registry")
+
+    def tearDown(self):
+        self.transport.close()
+
+    def test_connections_are_reused(self):
+        """Sequential requests to one host share a single connection."""
+        for path in ("/capabilities", "/messagegroups", "/schemagroups"):
+            self.assertEqual(self.transport.get(self.base + path).json(), {"path": path})
+        self.assertEqual(len(set(request.client_port for request in _KeepAliveHandler.requests_seen)), 1)
+
+    def test_gzip_is_decoded(self):
+        """Compressed responses are requested and decoded transparently."""
+        response = self.transport.get(self.base + "/doc")
+        self.assertEqual(response.headers.get("Content-Encoding"), "gzip")
+        self.assertEqual(response.json(), {"path": "/doc"})
+
+    def test_loader_records_wire_and_decoded_bytes(self):
+        """The loader parses the decoded bytes and counts the compressed transfer separately."""
+        with patch('xregistry.generator.xregistry_loader.Model'):
+            loader = XRegistryLoader(transport=self.transport)
+        _, document = loader._load_from_url(self.base + "/large", {})
+        self.assertEqual(len(document["items"]), 200)
+        self.assertEqual(loader.stats.requests, 1)
+        self.assertGreater(loader.stats.bytes_on_wire, 0)
+        self.assertLess(loader.stats.bytes_on_wire * 5, loader.stats.bytes_decoded)
+
+    def test_auth_is_scoped_to_the_registry(self):
+        """The configured token is only sent below the registry base URL."""
+        self.transport.get(self.base + "/registry/messagegroups")
+        self.transport.get(self.base + "/registryx")
+        self.transport.get(self.base + "/other")
+        self.assertEqual([request.authorization for request in _KeepAliveHandler.requests_seen], ["Bearer secret", None, None])
+
+    def test_explicit_headers_take_precedence(self):
+        """Request headers override the shared auth header."""
+        headers = self.transport.effective_headers(self.base + "/registry", {"authorization": "Basic x"})
+        self.assertEqual(headers, {"authorization": "Basic x"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+Unit tests for event-based JSON loading with group skipping.
+"""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from xregistry.generator import json_streaming
+from xregistry.generator.xregistry_loader import XRegistryLoader
+
+
+DOCUMENT = {
+    "specversion": "1.0",
+    "endpoints": {
+        "ep.a": {"usage": ["producer"], "messagegroups": ["#/messagegroups/mg.a"]},
+        "ep.b": {"usage": ["producer"], "messagegroups": ["#/messagegroups/mg.b"]},
+    },
+    "messagegroups": {
+        "mg.a": {"messagegroupid": "mg.a", "messages": {"derived": {
+            "messageid": "derived", "basemessageurl": "#/messagegroups/base/messages/base",
+            "metadata": {"type": {"value": "x.derived"}}}}},
+        "mg.b": {"messagegroupid": "mg.b", "messages": {"other": {"messageid": "other", "ratio": 0.5}}},
+        "base": {"messagegroupid": "base", "messages": {"base": {
+            "messageid": "base", "envelope": "CloudEvents/1.0", "dataschemauri": "#/schemagroups/base/schemas/s"}}},
+    },
+    "schemagroups": {
+        "mg.a": {"schemas": {}},
+        "base": {"schemas": {"s": {"versions": {"1": {"schema": {"type": "object"}}}}}},
+    },
+}
+
+
+class TestLoadGroups(unittest.TestCase):
+    """Test the event-based parser."""
+
+    def test_unwanted_groups_are_skipped(self):
+        """Only kept group instances are built; everything else is parsed as usual."""
+        data = json.dumps(DOCUMENT).encode("utf-8")
+        document, skipped = json_streaming.load_groups(
+            io.BytesIO(data), {"messagegroups", "schemagroups", "endpoints"},
+            lambda group_type, group_id: group_id != "base")
+        self.assertEqual(skipped, [("messagegroups", "base"), ("schemagroups", "base")])
+        self.assertEqual(list(document), ["specversion", "endpoints", "messagegroups", "schemagroups"])
+        self.assertEqual(document["messagegroups"]["mg.b"], DOCUMENT["messagegroups"]["mg.b"])
+        self.assertNotIn("base", document["schemagroups"])
+
+    def test_invalid_json(self):
+        """Truncated documents are reported as ValueError."""
+        with self.assertRaises(ValueError):
+            json_streaming.load_groups(io.BytesIO(b'{"messagegroups": {"a": {'), {"messagegroups"}, lambda t, i: True)
+
+
+class TestStreamedFileLoading(unittest.TestCase):
+    """Test that streamed loads with filters match full loads."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "registry.json")
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(DOCUMENT, f)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _load(self, stream_threshold, **filters):
+        loader = XRegistryLoader()
+        loader.stream_threshold = stream_threshold
+        return loader.load(self.path, {}, **filters)[1]
+
+    def test_filtered_loads_match(self):
+        """Groups referenced from kept groups (here a basemessage) are restored before resolution."""
+        for filters in ({"messagegroup_filter": "mg.a"}, {"endpoint_filter": "ep.a"},
+                        {"messagegroup_filter": "mg", "endpoint_filter": "ep.b"}):
+            with self.subTest(**filters):
+                self.assertEqual(self._load(0, **filters), self._load(10 ** 12, **filters))
+        streamed = self._load(0, messagegroup_filter="mg.a")
+        self.assertEqual(streamed["messagegroups"]["mg.a"]["messages"]["derived"]["envelope"], "CloudEvents/1.0")
+
+    def test_small_files_are_not_streamed(self):
+        """Below the threshold, and without filters, the whole file is parsed at once."""
+        with patch.object(json_streaming, "load_groups") as mock_load_groups:
+            self._load(10 ** 12, messagegroup_filter="mg.a")
+            self._load(0)
+        mock_load_groups.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
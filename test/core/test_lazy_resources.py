@@ -0,0 +1,131 @@
+"""
+Unit tests for lazily resolved resources and collections.
+"""
+
+import copy
+import json
+import os
+import pickle
+import tempfile
+import unittest
+
+import yaml
+
+from xregistry.generator.lazy_resources import LazyEntity, pending_entities
+from xregistry.generator.xregistry_loader import XRegistryLoader
+
+
+class TestLazyEntity(unittest.TestCase):
+    """Test when a lazy entity resolves."""
+
+    def setUp(self):
+        self.calls = 0
+
+        def resolve(entity):
+            self.calls += 1
+            entity["schema"] = {"type": "string"}
+        self.entity = LazyEntity({"schemaurl": "s.json", "format": "JsonSchema"}, resolve)
+
+    def test_present_members_do_not_resolve(self):
+        """Reading members the entity already has leaves it pending."""
+        self.assertEqual(self.entity["format"], "JsonSchema")
+        self.assertEqual(self.entity.get("schemaurl"), "s.json")
+        self.assertIn("format", self.entity)
+        self.assertTrue(self.entity.pending)
+        self.assertEqual(self.calls, 0)
+
+    def test_missing_members_resolve_once(self):
+        """Reading or testing for a missing member resolves the entity, once."""
+        self.assertIn("schema", self.entity)
+        self.assertEqual(self.entity["schema"], {"type": "string"})
+        self.assertIsNone(self.entity.get("other"))
+        with self.assertRaises(KeyError):
+            self.entity["other"]
+        self.assertFalse(self.entity.pending)
+        self.assertEqual(self.calls, 1)
+
+    def test_enumeration_and_serialization_resolve(self):
+        """Whole-entity operations see the resolved content and produce plain dicts."""
+        self.assertEqual(json.loads(json.dumps({"v": self.entity}))["v"]["schema"], {"type": "string"})
+        self.assertEqual(self.calls, 1)
+        for value in (dict(self.entity), self.entity.copy(), copy.deepcopy(self.entity),
+                      pickle.loads(pickle.dumps(self.entity))):
+            self.assertIs(type(value), dict)
+            self.assertEqual(value, self.entity)
+        self.assertEqual(yaml.safe_load(yaml.safe_dump(self.entity))["schema"], {"type": "string"})
+
+    def test_pending_entities(self):
+        """Pending entities are found without resolving them."""
+        document = {"a": [self.entity], "b": LazyEntity({}, lambda entity: None)}
+        self.assertEqual(len(pending_entities(document)), 2)
+        self.assertEqual(self.calls, 0)
+
+
+class TestLazyLoading(unittest.TestCase):
+    """Test deferred fetching of schemaurl and schemasurl in loaded documents."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        schema_path = self._write("schema.json", {"type": "record", "name": "A", "fields": []})
+        schemas_path = self._write("schemas.json", {"b": {"versions": {"1": {"schemaurl": schema_path}}}})
+        self.document_path = self._write("doc.xreg.json", {"schemagroups": {
+            "inline": {"schemas": {"a": {"versions": {"1": {"format": "Avro", "schemaurl": schema_path}}}}},
+            "linked": {"schemasurl": schemas_path},
+        }})
+
+    def _write(self, name, data):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        return path
+
+    def _load(self, lazy_resources=True):
+        loader = XRegistryLoader(lazy_resources=lazy_resources)
+        fetched = []
+        load_core = loader._load_core
+
+        def counting_load_core(uri, *args, **kwargs):
+            fetched.append(os.path.basename(uri))
+            return load_core(uri, *args, **kwargs)
+        loader._load_core = counting_load_core
+        _, document = loader.load(self.document_path)
+        return loader, document, fetched
+
+    def test_resources_are_fetched_on_first_use(self):
+        """Only the entry document is loaded until a schema is used."""
+        _, document, fetched = self._load()
+        groups = document["schemagroups"]
+        version = groups["inline"]["schemas"]["a"]["versions"]["1"]
+        self.assertEqual(fetched, ["doc.xreg.json"])
+        self.assertEqual(version["format"], "Avro")
+        self.assertEqual(fetched, ["doc.xreg.json"])
+        self.assertEqual(version["schema"]["name"], "A")
+        self.assertEqual(version["schema"]["name"], "A")
+        self.assertEqual(fetched, ["doc.xreg.json", "schema.json"])
+
+    def test_reference_index_fetches_nothing(self):
+        """Indexing a document leaves deferred entities out instead of fetching them."""
+        loader, document, fetched = self._load()
+        index = loader.build_reference_index(document)
+        self.assertEqual(fetched, ["doc.xreg.json"])
+        self.assertEqual(index.occurrences("schema"), [])
+        version = document["schemagroups"]["inline"]["schemas"]["a"]["versions"]["1"]
+        self.assertEqual(version["schema"]["name"], "A")
+        paths = [path for path, _ in loader.build_reference_index(document).occurrences("schema")]
+        self.assertEqual(paths, [("schemagroups", "inline", "schemas", "a", "versions", "1", "schema")])
+        self.assertEqual(fetched, ["doc.xreg.json", "schema.json"])
+
+    def test_prefetch_matches_eager_loading(self):
+        """Prefetching resolves everything, including the content of lazily fetched collections."""
+        loader, document, fetched = self._load()
+        self.assertEqual(loader.prefetch_resources(document), 3)
+        self.assertEqual(pending_entities(document), [])
+        self.assertEqual(sorted(fetched), ["doc.xreg.json", "schema.json", "schema.json", "schemas.json"])
+        _, eager_document, _ = self._load(lazy_resources=False)
+        self.assertEqual(pending_entities(eager_document), [])
+        self.assertEqual(json.dumps(document), json.dumps(eager_document))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+Unit tests for the --messagegroup/--endpoint filter pushdown.
+"""
+
+import unittest
+
+from xregistry.generator.load_filter import LoadFilter, endpoint_messagegroup_ids
+
+GROUP_TYPES = ["messagegroups", "schemagroups", "endpoints"]
+
+DOCUMENT = {
+    "endpoints": {
+        "prod.http": {"messagegroups": ["#/messagegroups/prod.orders"]},
+        "test.http": {"config": {"messagegroups": ["test.orders"]}},
+    },
+    "messagegroups": {
+        "base": {"messages": {"envelope": {}}},
+        "prod.orders": {"messages": {"created": {"basemessageurl": "/messagegroups/base/messages/envelope"}}},
+        "test.orders": {"messages": {"created": {}}},
+    },
+    "schemagroups": {"prod.orders": {}, "test.orders": {}},
+}
+
+
+class TestLoadFilter(unittest.TestCase):
+    """Test the group predicate compiled from the filters."""
+
+    def test_endpoint_messagegroup_ids(self):
+        """Message group references are collected from endpoints and their config."""
+        self.assertEqual(endpoint_messagegroup_ids(DOCUMENT["endpoints"]), {"prod.orders", "test.orders"})
+
+    def test_inactive_filter_includes_everything(self):
+        """Without filters, every group and reference is included."""
+        load_filter = LoadFilter(GROUP_TYPES)
+        load_filter.bind(DOCUMENT)
+        self.assertFalse(load_filter.active)
+        self.assertTrue(load_filter.includes("messagegroups", "test.orders"))
+        self.assertTrue(load_filter.includes_reference("/schemagroups/test.orders/schemas/s"))
+
+    def test_messagegroup_filter(self):
+        """Groups are kept by ID; basemessage groups of kept messages are included as well."""
+        load_filter = LoadFilter(GROUP_TYPES, messagegroup_filter="prod")
+        load_filter.bind(DOCUMENT)
+        self.assertTrue(load_filter.keeps("messagegroups", "prod.orders"))
+        self.assertTrue(load_filter.keeps("schemagroups", "prod.orders"))
+        self.assertTrue(load_filter.keeps("endpoints", "test.http"))
+        self.assertFalse(load_filter.keeps("messagegroups", "base"))
+        self.assertTrue(load_filter.includes("messagegroups", "base"))
+        self.assertFalse(load_filter.includes("messagegroups", "test.orders"))
+        self.assertFalse(load_filter.includes("schemagroups", "test.orders"))
+
+    def test_messagegroup_filter_needs_message_groups(self):
+        """Like _apply_messagegroup_filter, the filter only applies once message groups exist."""
+        load_filter = LoadFilter(GROUP_TYPES, messagegroup_filter="prod")
+        load_filter.bind({"schemagroups": {"test.orders": {}}})
+        self.assertTrue(load_filter.includes("schemagroups", "test.orders"))
+
+    def test_endpoint_filter(self):
+        """Endpoints are kept by ID, message and schema groups by the selected endpoints' references."""
+        load_filter = LoadFilter(GROUP_TYPES, endpoint_filter="prod")
+        load_filter.bind(DOCUMENT)
+        self.assertTrue(load_filter.keeps("endpoints", "prod.http"))
+        self.assertFalse(load_filter.keeps("endpoints", "test.http"))
+        self.assertTrue(load_filter.keeps("schemagroups", "prod.orders"))
+        self.assertFalse(load_filter.keeps("messagegroups", "test.orders"))
+        self.assertTrue(load_filter.includes("messagegroups", "base"))
+
+    def test_references_and_paths(self):
+        """References and document paths are mapped to their groups."""
+        load_filter = LoadFilter(GROUP_TYPES, messagegroup_filter="prod")
+        load_filter.bind(DOCUMENT)
+        self.assertEqual(load_filter.group_of("https://example.com/reg/schemagroups/test.orders/schemas/s#/x"),
+                         ("schemagroups", "test.orders"))
+        self.assertEqual(load_filter.group_of("#/messagegroups/base/messages/envelope"), ("messagegroups", "base"))
+        self.assertIsNone(load_filter.group_of("https://example.com/other"))
+        self.assertFalse(load_filter.includes_reference("/schemagroups/test.orders/schemas/s"))
+        self.assertTrue(load_filter.includes_reference("https://example.com/other"))
+        self.assertTrue(load_filter.includes_path(("schemagroups",)))
+        self.assertFalse(load_filter.includes_path(("schemagroups", "test.orders", "schemas")))
+
+
+if __name__ == '__main__':
+    unittest.main()
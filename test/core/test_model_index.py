@@ -0,0 +1,68 @@
+"""
+Unit tests for the precomputed model index.
+"""
+
+import dataclasses
+import unittest
+from unittest.mock import Mock
+
+from xregistry.common.model import Model, ModelIndex
+
+GROUPS = {
+    "messagegroups": {
+        "singular": "messagegroup",
+        "resources": {"messages": {"singular": "message"}},
+    },
+    "schemagroups": {
+        "singular": "schemagroup",
+        "resources": {"schemas": {"singular": "schema"}, "blobs": {}},
+    },
+    "endpoints": {},
+}
+
+
+class TestModelIndex(unittest.TestCase):
+    """Test the look-ups the index precomputes."""
+
+    def setUp(self):
+        self.index = ModelIndex.build(GROUPS)
+
+    def test_group_names(self):
+        """Group types keep the model order; names default like the resolvers did."""
+        self.assertEqual(self.index.group_types, ("messagegroups", "schemagroups", "endpoints"))
+        self.assertEqual(self.index.group_plurals, frozenset(GROUPS))
+        self.assertEqual(self.index.group("endpoints").singular, "endpoint")
+        self.assertEqual(self.index.group("schemagroups").id_attribute, "schemagroupid")
+        self.assertIsNone(self.index.group("unknown"))
+
+    def test_resource_names(self):
+        """Collections, singulars and the URL and base64 attribute names are precomputed."""
+        self.assertEqual(self.index.collections("schemagroups"), frozenset(["schemas", "blobs"]))
+        self.assertEqual(self.index.collections("unknown"), frozenset())
+        blobs = self.index.group("schemagroups").resource("blobs")
+        self.assertEqual((blobs.singular, blobs.url_field, blobs.collection_url_field),
+                         ("resource", "resourceurl", "blobsurl"))
+        self.assertIn("messageid", self.index.id_attributes)
+        self.assertIn("schemagroup", self.index.singulars)
+        self.assertTrue({"messageurl", "schemaurl", "messagesurl"} <= self.index.url_fields)
+        self.assertIn("schemabase64", self.index.base64_fields)
+
+    def test_index_is_immutable(self):
+        """The index cannot be changed after it is built."""
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            self.index.group_types = ()
+        with self.assertRaises(TypeError):
+            self.index._by_plural["other"] = None
+
+    def test_for_model(self):
+        """Models share the index they built; stand-ins get one from their groups."""
+        model = Model()
+        self.assertIs(ModelIndex.for_model(model), model.index)
+        self.assertEqual(model.index.group_types, tuple(model.groups))
+        stand_in = Mock(spec=Model)
+        stand_in.groups = GROUPS
+        self.assertEqual(ModelIndex.for_model(stand_in).group_types, self.index.group_types)
+
+
+if __name__ == '__main__':
+    unittest.main()
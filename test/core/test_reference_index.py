@@ -0,0 +1,100 @@
+"""
+Unit tests for the compiled reference scanner and the reference index.
+"""
+
+import unittest
+from unittest.mock import Mock
+
+from xregistry.common.model import Model
+from xregistry.generator.reference_index import ReferenceIndex, ReferenceScanner
+
+
+class TestReferenceScanner(unittest.TestCase):
+    """Test reference detection and ordering."""
+
+    def setUp(self):
+        self.scanner = ReferenceScanner(["schemagroups", "messagegroups"])
+
+    def test_references_in_document_order(self):
+        """References come out depth-first, in key order, including duplicates."""
+        data = {
+            "a": {"dataschemauri": "/schemagroups/g/schemas/one", "nested": {"ref": "/messagegroups/g/messages/two"}},
+            "b": ["/schemagroups/g/schemas/three", "#/schemagroups/g/schemas/fragment", {"schemaurl": "/schemagroups/g/schemas/one"}],
+            "schemaurl": "/schemagroups/g/schemas/four",
+        }
+        self.assertEqual(self.scanner.references(data), [
+            "/schemagroups/g/schemas/one",
+            "/messagegroups/g/messages/two",
+            "/schemagroups/g/schemas/three",
+            "/schemagroups/g/schemas/one",
+            "/schemagroups/g/schemas/four",
+        ])
+
+    def test_only_reference_keys_count_in_objects(self):
+        """Object members need a reference-like key; unknown group types never match."""
+        data = {"description": "/schemagroups/g/schemas/x", "docsurl": "/other/g/x", "messagegroupref": "/messagegroups/g/"}
+        self.assertEqual(self.scanner.references(data), ["/messagegroups/g/"])
+        self.assertEqual(self.scanner.references("/schemagroups/g/schemas/x"), [])
+
+    def test_scanner_is_shared_per_model(self):
+        """Models with the same group types share one compiled scanner."""
+        model = Mock(spec=Model)
+        model.groups = {"schemagroups": {}, "messagegroups": {}}
+        self.assertIs(ReferenceScanner.for_model(model), ReferenceScanner.for_model(model))
+
+
+class TestReferenceIndex(unittest.TestCase):
+    """Test index queries and maintenance."""
+
+    def setUp(self):
+        self.scanner = ReferenceScanner(["schemagroups", "messagegroups"])
+        self.doc = {
+            "messagegroups": {
+                "mg": {"messages": {
+                    "m1": {"dataschemauri": "/schemagroups/sg/schemas/s1"},
+                    "m2": {"basemessageurl": "/messagegroups/mg/messages/m1", "dataschemauri": "/schemagroups/sg/schemas/s1"},
+                }}
+            },
+            "schemagroups": {"sg": {"schemas": {"s1": {"versions": {"1": {"schema": {"type": "object"}}}}}}},
+        }
+        self.index = self.scanner.scan(self.doc)
+
+    def test_locations(self):
+        """References map to the JSON pointers that hold them."""
+        self.assertEqual(self.index.locations("/schemagroups/sg/schemas/s1"), [
+            "/messagegroups/mg/messages/m1/dataschemauri",
+            "/messagegroups/mg/messages/m2/dataschemauri",
+        ])
+
+    def test_tracked_keys_are_indexed_regardless_of_value(self):
+        """Tracked keys are found even if their value is not a reference."""
+        occurrences = self.index.occurrences("schema")
+        self.assertEqual(occurrences, [(("schemagroups", "sg", "schemas", "s1", "versions", "1", "schema"), {"type": "object"})])
+        self.assertEqual([p for p, _ in self.index.occurrences("basemessageurl")],
+                         [("messagegroups", "mg", "messages", "m2", "basemessageurl")])
+
+    def test_rescan_replaces_entries_below_a_path(self):
+        """Rescanning a changed subtree drops its stale entries and reports new references."""
+        self.doc["messagegroups"]["mg"]["messages"]["m2"] = {"dataschemauri": "/schemagroups/sg/schemas/s2"}
+        found = self.index.rescan(self.doc, [("messagegroups", "mg", "messages", "m2"), ("messagegroups", "mg", "messages", "m2", "x")])
+        self.assertEqual(found, ["/schemagroups/sg/schemas/s2"])
+        self.assertEqual(self.index.occurrences("basemessageurl"), [])
+        self.assertEqual(self.index.locations("/schemagroups/sg/schemas/s1"), ["/messagegroups/mg/messages/m1/dataschemauri"])
+
+    def test_set_value(self):
+        """Updated values are reflected in reference queries."""
+        path = ("messagegroups", "mg", "messages", "m1", "dataschemauri")
+        self.index.set_value(path, "#/schemagroups/sg/schemas/s1")
+        self.assertEqual(self.index.references(("messagegroups", "mg", "messages", "m1")), [])
+        self.assertEqual(self.index.occurrences("dataschemauri")[0], (path, "#/schemagroups/sg/schemas/s1"))
+
+    def test_node_at_and_pointer(self):
+        """Paths resolve to nodes and convert to escaped JSON pointers."""
+        self.assertEqual(ReferenceIndex.node_at(self.doc, ("schemagroups", "sg", "schemas", "s1", "versions", "1", "schema")),
+                         {"type": "object"})
+        self.assertIsNone(ReferenceIndex.node_at(self.doc, ("schemagroups", "missing")))
+        self.assertEqual(ReferenceIndex.to_pointer(("a/b", "c~d", 0)), "/a~1b/c~0d/0")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+"""
+Unit tests for mirroring remote registries into local definitions files.
+
+A small local HTTP server serves a registry with ETags, so the tests can
+observe what mirroring fetches and what a refresh revalidates.
+"""
+
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import requests
+
+from registry_server import RegistryHandler, RegistryServerTestCase
+from xregistry.commands.mirror import mirror_registry
+from xregistry.generator.registry_mirror import RegistryMirror
+from xregistry.generator.xregistry_loader import XRegistryLoader
+
+REGISTRY = {
+    "messagegroups": {"orders": {"messagegroupid": "orders", "xid": "/messagegroups/orders", "messages": {"created": {
+        "messageid": "created", "xid": "/messagegroups/orders/messages/created", "envelope": "CloudEvents/1.0",
+        "dataschemaformat": "JsonSchema/draft-07", "dataschemauri": "{base}/schemagroups/orders/schemas/created"}}}},
+    "schemagroups": {"orders": {"schemagroupid": "orders", "xid": "/schemagroups/orders", "schemas": {"created": {
+        "schemaid": "created", "xid": "/schemagroups/orders/schemas/created", "versions": {"1": {
+            "format": "JsonSchema/draft-07", "schemaurl": "{base}/static/schemas/created.json"}}}}}},
+}
+
+
+class _RegistryHandler(RegistryHandler):
+    """Serves the registry with ?inline=*, a schema file and /capabilities."""
+
+
+class TestRegistryMirror(RegistryServerTestCase):
+    """Test mirroring, loading bundles and refreshing them."""
+
+    handler = _RegistryHandler
+
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.bundle = os.path.join(self.temp_dir.name, "registry.xreg.json")
+        registry = json.loads(json.dumps(REGISTRY).replace("{base}", self.base))
+        _RegistryHandler.documents = {
+            "/capabilities": {},
+            "/?inline=*": registry,
+            "/static/schemas/created.json": {"type": "object", "properties": {"id": {"type": "string"}}},
+        }
+
+    def test_entry_urls(self):
+        """Roots and group types are fetched inlined; collections through their parent."""
+        self.assertEqual(RegistryMirror.entry_url("https://r.example/"), "https://r.example/?inline=*")
+        self.assertEqual(RegistryMirror.entry_url("https://r.example/messagegroups"),
+                         "https://r.example/messagegroups?inline=*")
+        self.assertEqual(RegistryMirror.entry_url("https://r.example/messagegroups/g/messages"),
+                         "https://r.example/messagegroups/g")
+        self.assertEqual(RegistryMirror.entry_url("https://r.example/messagegroups/g"), "https://r.example/messagegroups/g")
+        with self.assertRaises(ValueError):
+            RegistryMirror.entry_url("registry.xreg.json")
+
+    def test_bundle_is_self_contained(self):
+        """The bundle inlines referenced resources and loads without contacting the registry."""
+        result = RegistryMirror(self.bundle).mirror(self.base + "/")
+        self.assertTrue(result.written)
+        self.assertEqual(result.documents, 2)
+        with open(self.bundle, "r", encoding="utf-8") as f:
+            bundle = json.load(f)
+        message = bundle["messagegroups"]["orders"]["messages"]["created"]
+        self.assertEqual(message["dataschemauri"], "#/schemagroups/orders/schemas/created")
+
+        seen = len(_RegistryHandler.requests_seen)
+        _, document = XRegistryLoader().load(self.bundle)
+        self.assertEqual(len(_RegistryHandler.requests_seen), seen)
+        version = document["schemagroups"]["orders"]["schemas"]["created"]["versions"]["1"]
+        self.assertEqual(version["schema"]["type"], "object")
+
+    def test_refresh_revalidates(self):
+        """Refreshing sends conditional requests and rewrites the bundle only when something changed."""
+        mirror = RegistryMirror(self.bundle)
+        mirror.mirror(self.base + "/")
+        mtime = os.stat(self.bundle).st_mtime_ns
+
+        _RegistryHandler.requests_seen = []
+        result = mirror.mirror(self.base + "/")
+        self.assertFalse(result.written)
+        self.assertEqual(result.changed, [])
+        self.assertEqual(result.revalidated, 2)
+        self.assertTrue(all(request.if_none_match for request in _RegistryHandler.requests_seen
+                            if request.path != "/capabilities"))
+        self.assertEqual(os.stat(self.bundle).st_mtime_ns, mtime)
+
+        schema = copy.deepcopy(_RegistryHandler.documents["/static/schemas/created.json"])
+        schema["required"] = ["id"]
+        _RegistryHandler.documents["/static/schemas/created.json"] = schema
+        result = mirror.mirror(self.base + "/")
+        self.assertTrue(result.written)
+        self.assertEqual(result.changed, [self.base + "/static/schemas/created.json"])
+        with open(self.bundle, "r", encoding="utf-8") as f:
+            bundle = json.load(f)
+        version = bundle["schemagroups"]["orders"]["schemas"]["created"]["versions"]["1"]
+        self.assertEqual(version["schema"]["required"], ["id"])
+
+    def test_command_reports_failures(self):
+        """The mirror command reports unwritable outputs and request failures and returns non-zero."""
+        blocker = os.path.join(self.temp_dir.name, "file")
+        with open(blocker, "w", encoding="utf-8") as f:
+            f.write("")
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            result = mirror_registry(argparse.Namespace(url=self.base + "/", output=os.path.join(blocker, "registry.xreg.json"),
+                                                        headers=None))
+        self.assertEqual(result, 1)
+        self.assertTrue(stderr.getvalue().startswith("Error: "))
+
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), \
+                patch.object(RegistryMirror, "mirror", side_effect=requests.ConnectionError("refused")):
+            result = mirror_registry(argparse.Namespace(url=self.base + "/", output=self.bundle, headers=None))
+        self.assertEqual(result, 1)
+        self.assertEqual(stderr.getvalue(), "Error: refused\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+Unit tests for rendering templates on a process pool.
+"""
+
+import os
+import tempfile
+import unittest
+
+from xregistry.generator.generator_context import GeneratorContext
+from xregistry.generator.lazy_resources import LazyEntity
+from xregistry.generator.render_scheduler import RenderScheduler
+from xregistry.generator.template_renderer import TemplateRenderer
+
+TEMPLATES = {
+    "names.include": '{%- macro greet(name) %}Hello {{ name }}{% endmacro %}',
+    "greet.txt.jinja": '{%- import "names.include" as names -%}{{ names.greet(root.name) }}{{ root.name | push("names") }}',
+    "count.txt.jinja": '{{ pop("names") }} was pushed last',
+    "popper.include": '{{ pop("names") }}',
+    "nested.txt.jinja": '{% include "popper.include" %}',
+    "fail.txt.jinja": '{% error "boom" %}',
+}
+
+
+@unittest.skipUnless(RenderScheduler.can_fork(), "workers are forked")
+class TestRenderScheduler(unittest.TestCase):
+    """Test that parallel renders produce what serial renders do."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.template_dir = os.path.join(self.temp_dir.name, "templates")
+        os.makedirs(self.template_dir)
+        for name, source in TEMPLATES.items():
+            with open(os.path.join(self.template_dir, name), "w", encoding="utf-8") as f:
+                f.write(source)
+
+    def _renderer(self, jobs):
+        ctx = GeneratorContext(self.temp_dir.name)
+        renderer = TemplateRenderer(ctx, "Test", "py", "test", self.temp_dir.name, "", {}, [], {}, False, False, jobs=jobs)
+        return renderer, renderer.setup_jinja_env([self.template_dir])
+
+    def _render(self, jobs, names, out):
+        renderer, env = self._renderer(jobs)
+        render_jobs = [renderer.template_job("Test", "Test", "TestData", "", {"name": name}, out, f"{i:02}-{template}.txt",
+                                             env.get_template(f"{template}.txt.jinja"), {})
+                       for i, (template, name) in enumerate(names)]
+        renderer.scheduler.run(render_jobs)
+        outputs = {}
+        for file in sorted(os.listdir(out)):
+            with open(os.path.join(out, file), "r", encoding="utf-8") as f:
+                outputs[file] = f.read()
+        return renderer, outputs
+
+    def test_same_output_as_serial(self):
+        """Outputs and the pushed values match a serial run; readers see the pushes before them."""
+        names = [("greet", f"n{i}") for i in range(12)] + [("count", "")] + [("greet", "last")]
+        serial_renderer, serial = self._render(1, names, os.path.join(self.temp_dir.name, "serial"))
+        parallel_renderer, parallel = self._render(3, names, os.path.join(self.temp_dir.name, "parallel"))
+        self.assertEqual(parallel, serial)
+        self.assertEqual(parallel["12-count.txt"], "n11 was pushed last")
+        self.assertEqual(parallel_renderer.ctx.stacks.stack("names"), serial_renderer.ctx.stacks.stack("names"))
+        self.assertEqual(parallel_renderer.ctx.stacks.stack("names"), [f"n{i}" for i in range(11)] + ["last"])
+
+    def test_readers_are_found_through_includes(self):
+        """Templates reading the stacks through an include are rendered in order."""
+        renderer, env = self._renderer(2)
+        self.assertTrue(renderer.scheduler.reads_state(env.get_template("nested.txt.jinja")))
+        self.assertFalse(renderer.scheduler.reads_state(env.get_template("greet.txt.jinja")))
+
+    def test_deferred_resources_are_fetched_before_forking(self):
+        """Deferred entities the renders use are resolved once, in this process, not in every worker."""
+        calls = []
+
+        def resolve(entity):
+            calls.append(entity)
+            entity["name"] = f"n{len(calls)}"
+
+        renderer, env = self._renderer(2)
+        out = os.path.join(self.temp_dir.name, "out")
+        roots = [LazyEntity({}, resolve) for _ in range(4)]
+        render_jobs = [renderer.template_job("Test", "Test", "TestData", "", root, out, f"{i:02}-greet.txt",
+                                             env.get_template("greet.txt.jinja"), {})
+                       for i, root in enumerate(roots)]
+        renderer.scheduler.run(render_jobs)
+        self.assertEqual(len(calls), 4)
+        self.assertFalse(any(root.pending for root in roots))
+        self.assertEqual(sorted(renderer.ctx.stacks.stack("names")), ["n1", "n2", "n3", "n4"])
+
+    def test_first_failure_is_reported_in_order(self):
+        """A failing render stops the pass after the renders before it were written."""
+        out = os.path.join(self.temp_dir.name, "out")
+        names = [("greet", "a"), ("greet", "b"), ("fail", ""), ("greet", "c")]
+        with self.assertRaises(SystemExit):
+            self._render(4, names, out)
+        self.assertEqual(sorted(os.listdir(out)), ["00-greet.txt", "01-greet.txt"])
+
+
+if __name__ == '__main__':
+    unittest.main()
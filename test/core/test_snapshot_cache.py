@@ -0,0 +1,151 @@
+"""
+Unit tests for the snapshot cache of composed documents and its use by the loader.
+"""
+
+import datetime
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from xregistry.common.snapshot_cache import SnapshotCache, file_input, plain_document, remote_input
+from xregistry.generator.lazy_resources import LazyEntity
+from xregistry.generator.xregistry_loader import XRegistryLoader
+
+
+class TestSnapshotCache(unittest.TestCase):
+    """Test the snapshot store itself."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.cache = SnapshotCache(os.path.join(self.temp_dir.name, "snapshots"), ttl=60)
+        self.source = os.path.join(self.temp_dir.name, "doc.json")
+        with open(self.source, "w", encoding="utf-8") as f:
+            f.write("{}")
+
+    def _store(self, document, inputs=None):
+        inputs = inputs if inputs is not None else {self.source: file_input(self.source)}
+        return self.cache.store("k", "load", [self.source], self.source, document, inputs)
+
+    def test_round_trip(self):
+        """Documents come back equal, in plain dicts, with shared subtrees still shared."""
+        shared = {"type": "string"}
+        document = {"a": LazyEntity({"schema": shared}, lambda entity: None), "b": shared, "c": [1, 2.5, None, True]}
+        self.assertIsNotNone(self._store(document))
+        uri, cached = self.cache.lookup("k")
+        self.assertEqual(uri, self.source)
+        self.assertEqual(cached, document)
+        self.assertIs(type(cached["a"]), dict)
+        self.assertIs(cached["a"]["schema"], cached["b"])
+
+    def test_unmarshallable_documents_are_not_stored(self):
+        """Values outside the JSON data model (e.g. YAML dates) skip the cache."""
+        self.assertIsNone(self._store({"date": datetime.date(2024, 1, 1)}))
+        self.assertIsNone(self.cache.lookup("k"))
+
+    def test_changed_files_invalidate(self):
+        """A snapshot is stale once an input file changes."""
+        self._store({"a": 1})
+        with open(self.source, "w", encoding="utf-8") as f:
+            f.write('{"changed": true}')
+        self.assertIsNone(self.cache.lookup("k"))
+        self.assertEqual(self.cache.prune(), 1)
+        self.assertEqual(self.cache.entries(), [])
+
+    def test_remote_inputs_expire(self):
+        """Remote inputs count as unchanged within the TTL, or always when offline."""
+        self._store({"a": 1}, {"https://example.com/reg": remote_input("abc", time.time() - 120)})
+        self.assertIsNone(self.cache.lookup("k"))
+        self.cache.offline = True
+        self.assertIsNotNone(self.cache.lookup("k"))
+
+    def test_prune_keeps_expired_remote_inputs(self):
+        """Pruning keeps snapshots whose remote inputs only expired, unless they are older than ``max_age``."""
+        self._store({"a": 1}, {"https://example.com/reg": remote_input("abc", time.time() - 120)})
+        self.assertEqual(self.cache.prune(), 0)
+        self.assertEqual([info.key for info in self.cache.entries()], ["k"])
+        self.assertEqual(self.cache.prune(max_age=0), 1)
+        self.assertEqual(self.cache.entries(), [])
+
+    def test_keys(self):
+        """Keys depend on the load options and headers."""
+        key = SnapshotCache.snapshot_key("load", ["a.json"], {"endpoint_filter": ""}, {}, "m")
+        self.assertEqual(key, SnapshotCache.snapshot_key("load", [os.path.abspath("a.json")],
+                                                         {"endpoint_filter": ""}, {}, "m"))
+        self.assertNotEqual(key, SnapshotCache.snapshot_key("load", ["a.json"], {"endpoint_filter": "x"}, {}, "m"))
+        self.assertNotEqual(key, SnapshotCache.snapshot_key("load", ["a.json"], {"endpoint_filter": ""},
+                                                            {"Authorization": "t"}, "m"))
+
+    def test_plain_document(self):
+        """Dict subclasses become dicts."""
+        self.assertIs(type(plain_document(LazyEntity({}, lambda entity: None))), dict)
+
+
+class TestSnapshotLoading(unittest.TestCase):
+    """Test loads served from snapshots."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.cache = SnapshotCache(os.path.join(self.temp_dir.name, "snapshots"), ttl=60)
+        self.schema_path = self._write("schema.json", {"type": "object"})
+        self.document_path = self._write("doc.xreg.json", {"schemagroups": {
+            "g": {"schemas": {"s": {"versions": {"1": {"format": "JsonSchema", "schemaurl": self.schema_path}}}}}}})
+
+    def _write(self, name, data):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        return path
+
+    def _load(self, lazy_resources=True):
+        loader = XRegistryLoader(snapshot_cache=self.cache, lazy_resources=lazy_resources)
+        loaded = []
+        load_core = loader._load_core
+
+        def counting_load_core(uri, *args, **kwargs):
+            loaded.append(os.path.basename(uri))
+            return load_core(uri, *args, **kwargs)
+        loader._load_core = counting_load_core
+        _, document = loader.load(self.document_path)
+        return loader, document, loaded
+
+    def test_warm_load_reads_nothing(self):
+        """The second load is served from the snapshot, with referenced resources still fetched on first use."""
+        _, cold, loaded = self._load()
+        self.assertEqual(loaded, ["doc.xreg.json"])
+        loader, warm, loaded = self._load()
+        self.assertEqual(loaded, [])
+        self.assertEqual(loader.stats.strategy, "cached")
+        version = warm["schemagroups"]["g"]["schemas"]["s"]["versions"]["1"]
+        self.assertIsInstance(version, LazyEntity)
+        self.assertTrue(version.pending)
+        self.assertEqual(version["schema"], {"type": "object"})
+        self.assertEqual(loaded, ["schema.json"])
+        self.assertEqual(warm, json.loads(json.dumps(cold)))
+
+    def test_eager_snapshots_are_complete(self):
+        """Without deferred resources, the snapshot holds them and changing them invalidates it."""
+        _, _, loaded = self._load(lazy_resources=False)
+        self.assertEqual(sorted(loaded), ["doc.xreg.json", "schema.json"])
+        _, document, loaded = self._load(lazy_resources=False)
+        self.assertEqual(loaded, [])
+        self.assertEqual(document["schemagroups"]["g"]["schemas"]["s"]["versions"]["1"]["schema"], {"type": "object"})
+        self._write("schema.json", {"type": "string", "changed": True})
+        _, document, loaded = self._load(lazy_resources=False)
+        self.assertIn("schema.json", loaded)
+        self.assertEqual(document["schemagroups"]["g"]["schemas"]["s"]["versions"]["1"]["schema"]["type"], "string")
+
+    def test_deferred_references_are_read_when_used(self):
+        """Deferred references are not part of the snapshot; they are read with their current content."""
+        self._load()
+        self._write("schema.json", {"type": "string", "changed": True})
+        _, document, loaded = self._load()
+        self.assertEqual(loaded, [])
+        self.assertEqual(document["schemagroups"]["g"]["schemas"]["s"]["versions"]["1"]["schema"]["type"], "string")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Unit tests for the caches of compiled templates.
+"""
+
+import os
+import tempfile
+import unittest
+
+import jinja2
+
+from xregistry.common.template_cache import TemplateBundleLoader, TemplateCache
+
+
+class TestTemplateCache(unittest.TestCase):
+    """Test bytecode caching and precompiled bundles."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.template_dir = os.path.join(self.temp_dir.name, "templates")
+        os.makedirs(os.path.join(self.template_dir, "src"))
+        self._write("src/hello.txt.jinja", '{%- import "names.jinja.include" as names -%}{{ names.greet(name) }}')
+        self._write("names.jinja.include", '{%- macro greet(name) %}Hello {{ name }}{% endmacro %}')
+        self.cache = TemplateCache(os.path.join(self.temp_dir.name, "cache"))
+
+    def _write(self, name, source, mtime_ns=None):
+        path = os.path.join(self.template_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(source)
+        if mtime_ns:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def _env(self):
+        return jinja2.Environment(loader=self.cache.loader([self.template_dir]), bytecode_cache=self.cache.bytecode)
+
+    def test_bytecode_is_reused_until_the_template_changes(self):
+        """Entries are written on load and keyed by the template's modification time."""
+        self.assertEqual(self._env().get_template("src/hello.txt.jinja").render(name="a"), "Hello a")
+        entries, _, _ = self.cache.usage()
+        self.assertEqual(entries, 2)
+
+        self._env().get_template("src/hello.txt.jinja")
+        self.assertEqual(self.cache.usage()[0], 2)
+
+        self._write("names.jinja.include", '{%- macro greet(name) %}Hi {{ name }}{% endmacro %}', mtime_ns=10**18)
+        self.assertEqual(self._env().get_template("src/hello.txt.jinja").render(name="a"), "Hi a")
+        self.assertEqual(self.cache.usage()[0], 3)
+
+    def test_bundles_are_used_while_current(self):
+        """Compiled bundles serve the templates until a template file changes."""
+        path, count = self.cache.compile(jinja2.Environment(), [self.template_dir])
+        self.assertEqual(count, 2)
+        self.assertTrue(path.exists())
+        env = self._env()
+        self.assertIsInstance(env.loader, jinja2.ChoiceLoader)
+        self.assertIsInstance(env.loader.loaders[0], TemplateBundleLoader)
+        self.assertEqual(env.get_template("src/hello.txt.jinja").render(name="b"), "Hello b")
+        self.assertEqual(self.cache.usage()[0], 0)
+
+        self._write("src/new.txt.jinja", "new")
+        self.assertIsInstance(self._env().loader, jinja2.FileSystemLoader)
+
+    def test_clear(self):
+        """Clearing removes bytecode entries and bundles."""
+        self.cache.compile(jinja2.Environment(), [self.template_dir])
+        self._env().get_template("src/hello.txt.jinja")
+        self._write("src/other.txt.jinja", "other")
+        self._env().get_template("src/other.txt.jinja")
+        self.assertEqual(self.cache.clear(), 2)
+        self.assertEqual(self.cache.usage(), (0, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,8 @@ edge cases and error conditions.
 import json
 import os
 import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import Mock, patch, mock_open
 import base64
@@ -169,6 +171,137 @@ class TestDependencyResolver(unittest.TestCase):
         result = self.resolver.resolve_reference("https://example.com/test", {})
         self.assertIsNone(result)
     
+    def test_resolve_references_concurrently(self):
+        """Test that references and their nested references are fetched once, in stable order."""
+        import threading
+        import time
+        documents = {
+            "https://example.com/schemagroups/a/schemas/s1": {"schemaurl": "https://example.com/schemagroups/c/schemas/s3"},
+            "https://example.com/schemagroups/b/schemas/s2": {"schemaurl": "/schemagroups/c/schemas/s3"},
+            "https://example.com/schemagroups/c/schemas/s3": {"schemaurl": "https://example.com/schemagroups/a/schemas/s1"},
+        }
+        calls = []
+        lock = threading.Lock()
+        
+        def load_core(url, headers, ignore_handled=False):
+            # Finish the first request last to make completion order differ from input order
+            time.sleep(0.05 if url.endswith("s1") else 0)
+            with lock:
+                calls.append(url)
+            return url, documents.get(url)
+        
+        self.mock_loader._load_core.side_effect = load_core
+        resolver = DependencyResolver(self.mock_model, self.mock_loader, max_concurrency=4)
+        resolver.resolve_references(
+            ["https://example.com/schemagroups/a/schemas/s1", "/schemagroups/b/schemas/s2", "https://example.com/schemagroups/x/schemas/missing"],
+            {}, "https://example.com")
+        
+        self.assertEqual(sorted(calls), sorted(documents.keys()) + ["https://example.com/schemagroups/x/schemas/missing"])
+        self.assertEqual(list(resolver.resolved_resources.keys()), list(documents.keys()))
+        self.assertIn("https://example.com/schemagroups/x/schemas/missing", resolver.unresolvable)
+        self.assertEqual(resolver.pending_resolution, set())
+    
+    def _registry_groups(self):
+        return {
+            "a": {"schemagroupid": "a", "schemas": {"s1": {"schemaid": "s1"}, "s2": {"schemaid": "s2"}}},
+            "b": {"schemagroupid": "b", "schemas": {"s3": {"schemaid": "s3", "versions": {"1": {"versionid": "1"}}}}},
+        }
+    
+    def test_fetch_batches_groups_with_filter(self):
+        """Test that references into several groups of one type are fetched with one filtered request."""
+        groups = self._registry_groups()
+        self.mock_loader._load_from_url.side_effect = lambda url, headers, optional=False: (url, groups)
+        
+        fetched = self.resolver._fetch_all([
+            "https://example.com/schemagroups/a",
+            "https://example.com/schemagroups/a/schemas/s1",
+            "https://example.com/schemagroups/b/schemas/s3/versions/1",
+            "https://example.com/schemagroups/b",
+            "https://example.com/schemagroups/a/schemas/missing",
+        ], {})
+        
+        self.mock_loader._load_from_url.assert_called_once_with(
+            "https://example.com/schemagroups?inline=%2A&filter=schemagroupid%3Da&filter=schemagroupid%3Db", {}, optional=True)
+        self.assertEqual(fetched["https://example.com/schemagroups/a"], groups["a"])
+        self.assertEqual(fetched["https://example.com/schemagroups/a/schemas/s1"], {"schemaid": "s1"})
+        self.assertEqual(fetched["https://example.com/schemagroups/b/schemas/s3/versions/1"], {"versionid": "1"})
+        # Entities missing from the group document are fetched on their own
+        self.mock_loader._load_core.assert_called_once_with(
+            "https://example.com/schemagroups/a/schemas/missing", {}, ignore_handled=True)
+        self.assertIn("https://example.com/schemagroups/b", self.resolver.group_documents)
+    
+    def test_fetch_falls_back_when_filter_is_rejected(self):
+        """Test that groups are fetched one by one if the server rejects the filter."""
+        groups = self._registry_groups()
+        self.mock_loader._load_from_url.side_effect = lambda url, headers, optional=False: (url, None)
+        self.mock_loader._load_core.side_effect = lambda url, headers, ignore_handled=False: (
+            url, groups.get(url.rsplit("/", 1)[-1]))
+        
+        refs = ["https://example.com/schemagroups/a/schemas/s1", "https://example.com/schemagroups/a/schemas/s2",
+                "https://example.com/schemagroups/b", "https://example.com/schemagroups/b/schemas/s3"]
+        fetched = self.resolver._fetch_all(refs, {})
+        
+        self.assertEqual(sorted(call.args[0] for call in self.mock_loader._load_core.call_args_list),
+                         ["https://example.com/schemagroups/a", "https://example.com/schemagroups/b"])
+        self.assertEqual(fetched["https://example.com/schemagroups/a/schemas/s2"], {"schemaid": "s2"})
+        self.assertEqual(fetched["https://example.com/schemagroups/b/schemas/s3"], groups["b"]["schemas"]["s3"])
+        
+        # The rejection is remembered; later batches skip the filtered request
+        self.resolver.group_documents.clear()
+        self.resolver._fetch_all(refs, {})
+        self.assertEqual(self.mock_loader._load_from_url.call_count, 1)
+    
+    def test_estimate_fan_out(self):
+        """Test that fan-out counts the distinct groups referenced from outside the entry group."""
+        entry = {"messages": {
+            "m1": {"dataschemauri": "/schemagroups/a/schemas/s1"},
+            "m2": {"dataschemauri": "https://example.com/schemagroups/a/schemas/s2"},
+            "m3": {"dataschemauri": "/schemagroups/b/schemas/s3", "basemessageurl": "/messagegroups/mg/messages/m1"},
+        }}
+        self.assertEqual(self.resolver.estimate_fan_out(
+            "https://example.com/messagegroups/mg", entry, "https://example.com"), 2)
+    
+    def test_prefetch_registry_serves_references(self):
+        """Test that references are served from a prefetched registry snapshot."""
+        snapshot = {"schemagroups": self._registry_groups()}
+        self.mock_loader._load_from_url.side_effect = lambda url, headers, optional=False: (url, snapshot)
+        
+        self.assertTrue(self.resolver.prefetch_registry("https://example.com", {}))
+        fetched = self.resolver._fetch_all([
+            "https://example.com/schemagroups/a/schemas/s1",
+            "https://example.com/schemagroups/b/schemas/s3/versions/1",
+        ], {})
+        
+        self.mock_loader._load_from_url.assert_called_once_with("https://example.com?inline=*", {}, optional=True)
+        self.mock_loader._load_core.assert_not_called()
+        self.assertEqual(fetched["https://example.com/schemagroups/a/schemas/s1"], {"schemaid": "s1"})
+        self.assertEqual(fetched["https://example.com/schemagroups/b/schemas/s3/versions/1"], {"versionid": "1"})
+        
+        self.mock_loader._load_from_url.side_effect = lambda url, headers, optional=False: (url, None)
+        self.assertFalse(self.resolver.prefetch_registry("https://other.example.com", {}))
+    
+    def test_scan_added_nodes(self):
+        """Test that only the given subtrees are scanned, in document order."""
+        doc = {
+            "messagegroups": {
+                "a": {"dataschemauri": "https://example.com/schemagroups/s/schemas/one"},
+                "b": {"dataschemauri": "https://example.com/schemagroups/s/schemas/two"},
+                "c": {"dataschemauri": "https://example.com/schemagroups/s/schemas/unscanned"},
+            },
+            "schemagroups": {"s": {"schemaurl": "https://example.com/schemagroups/t/schemas/three"}},
+        }
+        refs = self.resolver.scan_added_nodes(doc, [
+            ("messagegroups", "b"), ("schemagroups",), ("messagegroups", "a"),
+            ("schemagroups", "s"), ("messagegroups", "missing"), ("messagegroups", "a")])
+        
+        self.assertEqual(refs, [
+            "https://example.com/schemagroups/t/schemas/three",
+            "https://example.com/schemagroups/s/schemas/one",
+            "https://example.com/schemagroups/s/schemas/two"])
+        self.assertEqual(self.resolver.reference_index.locations("https://example.com/schemagroups/s/schemas/one"),
+                         ["/messagegroups/a/dataschemauri"])
+        self.assertEqual(self.resolver.reference_index.locations("https://example.com/schemagroups/s/schemas/unscanned"), [])
+    
     @patch('xregistry.generator.xregistry_loader.XRegistryUrlParser')
     def test_build_composed_document_registry_level(self, mock_parser_class):
         """Test building composed document from registry level."""
@@ -366,6 +499,103 @@ class TestXRegistryLoader(unittest.TestCase):
                     mock_compose.assert_called_once()
                     mock_resolve.assert_called_once()
     
+    def test_load_with_dependencies_stops_when_worklist_is_empty(self):
+        """Test that unresolvable references do not keep dependency resolution going."""
+        self.loader.model.groups = {"messagegroups": {"resources": {"messages": {"singular": "message"}}}}
+        test_data = {"messagegroups": {"mg": {"messages": {"m": {
+            "basemessageurl": "https://example.com/messagegroups/gone/messages/m"}}}}}
+        
+        with patch.object(self.loader, '_load_core') as mock_load_core:
+            mock_load_core.side_effect = lambda uri, *args, **kwargs: (
+                (uri, json.loads(json.dumps(test_data))) if uri == "test.json" else (uri, None))
+            with patch.object(self.loader.dependency_resolver, 'scan_added_nodes',
+                              wraps=self.loader.dependency_resolver.scan_added_nodes) as mock_scan:
+                _, result_data = self.loader.load_with_dependencies("test.json")
+        
+        self.assertIn("m", result_data["messagegroups"]["mg"]["messages"])
+        self.assertEqual(mock_scan.call_count, 2)
+        self.assertEqual(mock_load_core.call_count, 3)
+
+    def test_load_with_dependencies_skips_discarded_groups(self):
+        """Test that references into groups the filters discard are not fetched."""
+        self.loader.model.groups = {"messagegroups": {"resources": {"messages": {"singular": "message"}}},
+                                    "schemagroups": {"resources": {"schemas": {"singular": "schema"}}}}
+        test_data = {"messagegroups": {
+            "prod": {"messages": {"m": {"dataschemauri": "https://example.com/schemagroups/prod/schemas/s"}}},
+            "test": {"messages": {"m": {"dataschemauri": "https://example.com/schemagroups/test/schemas/s"}}},
+        }}
+        loaded = []
+
+        def load_core(uri, *args, **kwargs):
+            loaded.append(uri)
+            if uri == "test.json":
+                return uri, json.loads(json.dumps(test_data))
+            return uri, {"versions": {"1": {"schema": {}}}} if uri.endswith("/schemas/s") else {}
+
+        with patch.object(self.loader, '_load_core', side_effect=load_core):
+            _, result_data = self.loader.load_with_dependencies("test.json", messagegroup_filter="prod")
+
+        self.assertEqual(loaded, ["test.json", "https://example.com/schemagroups/prod/schemas/s"])
+        self.assertEqual(list(result_data["messagegroups"]), ["prod"])
+        self.assertEqual(list(result_data["schemagroups"]), ["prod"])
+        self.assertEqual(self.loader.dependency_resolver.load_filter.active, False)
+
+    def test_load_with_dependencies_prefetches_on_large_fan_out(self):
+        """Test that the registry snapshot is only fetched above the fan-out threshold."""
+        self.loader.model.groups = {"messagegroups": {}, "schemagroups": {}}
+        entry = {"messages": {"m1": {"dataschemauri": "/schemagroups/a/schemas/s1"},
+                              "m2": {"dataschemauri": "/schemagroups/b/schemas/s2"}}}
+        resolver = self.loader.dependency_resolver
+        
+        for threshold, strategy in ((3, "walk"), (2, "snapshot"), (0, "walk")):
+            self.loader.prefetch_threshold = threshold
+            with patch.object(self.loader, 'discover_registry_root', return_value="https://example.com"), \
+                 patch.object(self.loader, '_load_core', return_value=("https://example.com/messagegroups/mg", entry)), \
+                 patch.object(resolver, 'build_composed_document', return_value={}), \
+                 patch.object(resolver, 'prefetch_registry', return_value=True) as mock_prefetch:
+                self.loader.load_with_dependencies("https://example.com/messagegroups/mg")
+            self.assertEqual(self.loader.stats.strategy, strategy)
+            self.assertEqual(mock_prefetch.call_count, 1 if strategy == "snapshot" else 0)
+        self.assertEqual(self.loader.stats.to_dict()["fan_out"], 2)
+    
+    def test_discover_registry_root_prefers_shallowest(self):
+        """Test that probes run for every path prefix above the group type and the shallowest answer wins."""
+        import requests
+        self.loader.model.groups = {"messagegroups": {}}
+        probed = []
+        
+        def get(url, headers=None, **kwargs):
+            probed.append((url, kwargs.get("timeout")))
+            response = Mock()
+            if url == "https://example.com/capabilities":
+                response.raise_for_status.side_effect = requests.HTTPError("404")
+            return response
+        
+        with patch.object(self.loader.transport, 'get', side_effect=get):
+            root = self.loader.discover_registry_root("https://example.com/api/registry/messagegroups/mg")
+        
+        self.assertEqual(root, "https://example.com/api")
+        self.assertEqual(sorted(probed), [
+            ("https://example.com/api/capabilities", self.loader.discovery_timeout),
+            ("https://example.com/api/registry/capabilities", self.loader.discovery_timeout),
+            ("https://example.com/capabilities", self.loader.discovery_timeout),
+        ])
+    
+    def test_discovered_registry_root_is_persisted(self):
+        """Test that later loaders reuse a root recorded in the HTTP cache without probing."""
+        from xregistry.common.http_cache import HttpResponseCache
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.loader.http_cache = HttpResponseCache(cache_dir, ttl=60)
+            with patch.object(self.loader.transport, 'get') as mock_get:
+                self.assertEqual(self.loader.discover_registry_root("https://example.com/x"), "https://example.com")
+                self.assertEqual(mock_get.call_count, 1)
+            
+            with patch('xregistry.generator.xregistry_loader.Model'):
+                later = XRegistryLoader(http_cache=HttpResponseCache(cache_dir, ttl=60))
+            with patch.object(later.transport, 'get') as mock_get:
+                self.assertEqual(later.discover_registry_root("https://example.com/y/z"), "https://example.com")
+                mock_get.assert_not_called()
+    
     def test_load_from_file(self):
         """Test loading from local file."""
         test_data = {"test": "data"}
@@ -390,47 +620,67 @@ class TestXRegistryLoader(unittest.TestCase):
         self.assertEqual(result_uri, "/nonexistent/file.json")
         self.assertIsNone(result_data)
     
-    @patch('urllib.request.urlopen')
-    def test_load_from_url(self, mock_urlopen):
+    def test_load_from_url(self):
         """Test loading from HTTP URL."""
         from unittest.mock import MagicMock
         test_data = {"test": "data"}
-        test_json = json.dumps(test_data)
         
-        # Mock HTTP response - use MagicMock to support context manager protocol
-        mock_response = MagicMock()
-        mock_response.read.return_value = test_json.encode('utf-8')
-        mock_response.__enter__.return_value = mock_response
-        mock_response.__exit__.return_value = None
-        mock_urlopen.return_value = mock_response
+        # Mock HTTP response returned by the shared transport
+        mock_response = MagicMock(status_code=200, headers={})
+        mock_response.content = json.dumps(test_data).encode('utf-8')
         
-        result_uri, result_data = self.loader._load_from_url("https://example.com/test.json", {})
+        with patch.object(self.loader.transport, 'get', return_value=mock_response):
+            result_uri, result_data = self.loader._load_from_url("https://example.com/test.json", {})
         
         self.assertEqual(result_uri, "https://example.com/test.json")
         self.assertEqual(result_data, test_data)
     
-    @patch('urllib.request.urlopen')
-    def test_load_from_url_with_headers(self, mock_urlopen):
+    def test_load_from_url_with_headers(self):
         """Test loading from HTTP URL with custom headers."""
         from unittest.mock import MagicMock
         test_data = {"test": "data"}
-        test_json = json.dumps(test_data)
         
-        # Mock HTTP response - use MagicMock to support context manager protocol
-        mock_response = MagicMock()
-        mock_response.read.return_value = test_json.encode('utf-8')
-        mock_response.__enter__.return_value = mock_response
-        mock_response.__exit__.return_value = None
-        mock_urlopen.return_value = mock_response
+        mock_response = MagicMock(status_code=200, headers={})
+        mock_response.content = json.dumps(test_data).encode('utf-8')
         
         headers = {"Authorization": "Bearer token", "Content-Type": "application/json"}
         
-        with patch('urllib.request.Request') as mock_request:
-            result_uri, result_data = self.loader._load_from_url("https://example.com/test.json", headers)
+        with patch.object(self.loader.transport, 'get', return_value=mock_response) as mock_get:
+            self.loader._load_from_url("https://example.com/test.json", headers)
             
-            # Verify headers were added to request
-            mock_request_instance = mock_request.return_value
-            self.assertEqual(mock_request_instance.add_header.call_count, 2)
+            # Verify headers were passed to the transport
+            self.assertEqual(mock_get.call_args[0][1], headers)
+    
+    def test_sniff_format(self):
+        """Test that the format is taken from the extension or the first non-whitespace byte."""
+        import io
+        cases = [("a.json", b"name: x"), ("a.yaml", b"\n  {\"a\": 1}"), ("a.xreg", b"\xef\xbb\xbf[1]"),
+                 ("a.yml", b"name: x"), ("a", b"  \n")]
+        formats = []
+        for path, content in cases:
+            stream = io.BytesIO(content)
+            formats.append(self.loader._sniff_format(path, stream))
+            self.assertEqual(stream.tell(), 0)
+        self.assertEqual(formats, ["json", "json", "json", "yaml", "yaml"])
+    
+    def test_yaml_file_is_parsed_once(self):
+        """Test that YAML files skip the JSON attempt."""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
+            f.write("messagegroups:\n  mg:\n    messagegroupid: mg\n")
+            temp_path = f.name
+        try:
+            with patch('xregistry.generator.xregistry_loader.json.loads') as mock_loads:
+                _, document = self.loader._load_from_file(temp_path)
+            mock_loads.assert_not_called()
+            self.assertEqual(document, {"messagegroups": {"mg": {"messagegroupid": "mg"}}})
+        finally:
+            os.unlink(temp_path)
+    
+    def test_parse_bytes_content(self):
+        """Test parsing JSON and YAML directly from bytes."""
+        self.assertEqual(self.loader._parse_content('{"name": "caf\u00e9"}'.encode('utf-8')), {"name": "caf\u00e9"})
+        self.assertEqual(self.loader._parse_content('{"n": 1}'.encode('utf-16')), {"n": 1})
+        self.assertEqual(self.loader._parse_content(b"name: test\nitems:\n  - 1\n"), {"name": "test", "items": [1]})
     
     def test_parse_json_content(self):
         """Test parsing JSON content."""
@@ -514,6 +764,67 @@ class TestXRegistryLoader(unittest.TestCase):
         self.assertIsNone(self.loader.current_url)
 
 
+class TestAsyncLoader(unittest.IsolatedAsyncioTestCase):
+    """Test the async loader API."""
+    
+    def _loader(self):
+        with patch('xregistry.generator.xregistry_loader.Model'):
+            return XRegistryLoader()
+    
+    async def test_aload_with_dependencies_does_not_block_the_loop(self):
+        """Test that the event loop keeps running while a load is in progress."""
+        import asyncio
+        import time
+        loader = self._loader()
+        ticks = []
+        
+        def load_with_dependencies(uri, headers, messagegroup_filter, endpoint_filter):
+            time.sleep(0.2)
+            return uri, {"messagegroups": {}, "filter": messagegroup_filter}
+        
+        async def ticker():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0.01)
+        
+        with patch.object(loader, 'load_with_dependencies', side_effect=load_with_dependencies):
+            task = asyncio.create_task(ticker())
+            result = await loader.aload_with_dependencies("https://example.com/messagegroups/mg", messagegroup_filter="mg")
+            task.cancel()
+        
+        self.assertEqual(result, ("https://example.com/messagegroups/mg", {"messagegroups": {}, "filter": "mg"}))
+        self.assertGreater(len(ticks), 5)
+    
+    async def test_loaders_run_concurrently_and_serialize_per_loader(self):
+        """Test that separate loaders load in parallel while one loader runs one load at a time."""
+        import asyncio
+        import threading
+        import time
+        first, second = self._loader(), self._loader()
+        # Both loads must be in flight at the same time to pass the barrier
+        barrier = threading.Barrier(2, timeout=5)
+        
+        def load(uri, *args):
+            barrier.wait()
+            return uri, {}
+        
+        with patch.object(first, 'load', side_effect=load), patch.object(second, 'load', side_effect=load):
+            results = await asyncio.gather(first.aload("a.json"), second.aload("b.json"))
+        self.assertEqual(results, [("a.json", {}), ("b.json", {})])
+        
+        active = []
+        def load_stacked(uris, *args):
+            active.append(1)
+            concurrent = len(active)
+            time.sleep(0.05)
+            active.pop()
+            return uris[0], {"concurrent": concurrent}
+        
+        with patch.object(first, 'load_stacked', side_effect=load_stacked):
+            results = await asyncio.gather(first.aload_stacked(["a.json"]), first.aload_stacked(["b.json"]))
+        self.assertEqual([doc["concurrent"] for _, doc in results], [1, 1])
+
+
 class TestIntegration(unittest.TestCase):
     """Integration tests for the complete loader system."""
     
@@ -851,6 +1162,25 @@ class TestDocumentStacking(unittest.TestCase):
         result_uri, result_data = self.loader.load_stacked([self.base_file, self.overlay_file])
         
         self.assertEqual(result_data["specversion"], "0.6")
+    
+    def test_load_stacked_loads_layers_in_parallel(self):
+        """Test that stacked documents are loaded concurrently and merged in the given order."""
+        barrier = threading.Barrier(2, timeout=5)
+        load_core = self.loader._load_core
+        
+        def concurrent_load_core(uri, *args, **kwargs):
+            # Loading the overlay first must not change the stacking order
+            if uri == self.base_file:
+                time.sleep(0.05)
+            barrier.wait()
+            return load_core(uri, *args, **kwargs)
+        
+        with patch.object(self.loader, '_load_core', side_effect=concurrent_load_core):
+            result_uri, result_data = self.loader.load_stacked([self.base_file, self.overlay_file])
+        
+        self.assertEqual(result_uri, self.overlay_file)
+        messages = result_data["messagegroups"]["test.base"]["messages"]
+        self.assertEqual(messages["BaseMessage"]["description"], "OVERRIDDEN: Base message was shadowed")
 
 
 if __name__ == '__main__':
@@ -1,2 +1,4 @@
+import sys
+
 from .cli import main
-main()
\ No newline at end of file
+sys.exit(main())
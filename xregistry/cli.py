@@ -8,6 +8,7 @@ import sys
 
 from xregistry.commands import catalog
 from xregistry.commands.catalog import CatalogSubcommands, ManifestSubcommands
+from xregistry.commands.cache import add_cache_subcommands
 from xregistry.commands.config import add_config_subcommands
 
 logging.basicConfig(level=logging.DEBUG if sys.gettrace() is not None else logging.ERROR, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -16,6 +17,8 @@ logger = logging.getLogger(__name__)
 from .commands.validate_definitions import validate_definition
 from .commands.generate_code import generate_code
 from .commands.list_templates import list_templates
+from .commands.mirror import mirror_registry
+from .commands.templates import add_templates_subcommands
 #from .commands.manifest import ManifestSubcommands
 
 def main():
@@ -37,7 +40,7 @@ def main():
     #  validate: validates an definition
     #  list: lists the available templates
 
-    subparsers_parser = parser.add_subparsers(dest="command", help="The command to execute: generate, validate or list")
+    subparsers_parser = parser.add_subparsers(dest="command", help="The command to execute: generate, validate, list or mirror")
     subparsers_parser.default = "generate"
     generate_parser = subparsers_parser.add_parser("generate", help="Generate code.")
     generate_parser.set_defaults(func=generate_code)
@@ -45,8 +48,14 @@ def main():
     validate_parser.set_defaults(func=validate_definition)
     list_parser = subparsers_parser.add_parser("list", help="List available templates")
     list_parser.set_defaults(func=list_templates)
+    mirror_parser = subparsers_parser.add_parser("mirror", help="Mirror a remote registry into a local definitions file")
+    mirror_parser.set_defaults(func=mirror_registry)
     config_parser = subparsers_parser.add_parser("config", help="Manage configuration")
     add_config_subcommands(config_parser)
+    cache_parser = subparsers_parser.add_parser("cache", help="Inspect and prune the local caches")
+    add_cache_subcommands(cache_parser)
+    templates_parser = subparsers_parser.add_parser("templates", help="Precompile templates and report what generated files depend on")
+    add_templates_subcommands(templates_parser)
     manifest_parser = subparsers_parser.add_parser("manifest", help="Manage the manifest file")
     ManifestSubcommands.add_parsers(manifest_parser)
     subparsers_parser.required = True
@@ -65,10 +74,28 @@ def main():
     generate_parser.add_argument("--template-args", nargs="*", dest="template_args", required=False, help="Extra template arguments to pass to the code generator in the form 'key=value")
     generate_parser.add_argument("--messagegroup", dest="messagegroup", required=False, help="Limit the generation to a specific message group")
     generate_parser.add_argument("--endpoint", dest="endpoint", required=False, help="Limit the generation to a specific endpoint")
+    generate_parser.add_argument("--offline", dest="offline", action="store_true", required=False, help="Serve remote definitions from the local HTTP cache only, never contacting the registry")
+    generate_parser.add_argument("--no-cache", dest="no_cache", action="store_true", required=False, help="Do not use the local caches (HTTP responses, snapshots of composed definitions, compiled templates)")
+    generate_parser.add_argument("--max-concurrency", dest="max_concurrency", type=int, default=8, required=False, help="Maximum number of concurrent requests when resolving remote dependencies (default: 8)")
+    generate_parser.add_argument("--prefetch-threshold", dest="prefetch_threshold", type=int, default=10, required=False, help="Fetch the whole registry in one request when the definitions reference at least this many groups; 0 disables (default: 10)")
+    generate_parser.add_argument("--full", dest="full", action="store_true", required=False, help="Render every template again instead of skipping those whose inputs are unchanged since the last generation into the output directory")
+    generate_parser.add_argument("--jobs", "-j", dest="jobs", type=int, default=1, required=False, help="Number of processes rendering templates; 0 uses all CPUs (default: 1)")
+    generate_parser.add_argument("--stats", dest="stats", action="store_true", required=False, help="Print the loading strategy and the request, byte and cache counts after generating")
+    generate_parser.add_argument("--watch", dest="watch", action="store_true", required=False, help="Keep running and generate again whenever a local definitions file or template changes, keeping the loaded definitions and compiled templates in memory")
+    generate_parser.add_argument("--watch-interval", dest="watch_interval", type=float, default=0.5, required=False, help="Seconds between checks for changes in watch mode (default: 0.5)")
 
     # specify the arguments for the validate command
     validate_parser.add_argument("--definitions", "-d", "-f", dest="definitions_files", nargs="+", required=True, help="One or more files or URLs containing the definitions. Files are loaded in order and stacked, with later files shadowing earlier ones.")
     validate_parser.add_argument("--requestheaders", nargs="*", dest="headers", required=False,help="Extra HTTP headers in the format 'key=value'")
+    validate_parser.add_argument("--offline", dest="offline", action="store_true", required=False, help="Serve remote definitions from the local HTTP cache only, never contacting the registry")
+    validate_parser.add_argument("--no-cache", dest="no_cache", action="store_true", required=False, help="Do not use the local caches (HTTP responses, snapshots of composed definitions)")
+
+    # specify the arguments for the mirror command
+    mirror_parser.add_argument("--url", dest="url", required=True, help="URL of the registry, or of a group type, group, resource or version in it")
+    mirror_parser.add_argument("--output", "-o", dest="output", required=True, help="The definitions file to write; the mirror's state is kept next to it in <output>.mirror")
+    mirror_parser.add_argument("--requestheaders", nargs="*", dest="headers", required=False, help="Extra HTTP headers in the format 'key=value'")
+    mirror_parser.add_argument("--max-concurrency", dest="max_concurrency", type=int, default=8, required=False, help="Maximum number of concurrent requests (default: 8)")
+    mirror_parser.add_argument("--full", dest="full", action="store_true", required=False, help="Fetch everything again instead of revalidating the previous mirror")
 
     # specify the arguments for the list command
     list_parser.add_argument("--templates", nargs="*", dest="template_dirs", required=False, help="Paths of extra directories containing custom templates")
@@ -80,8 +107,8 @@ def main():
         parser.print_help()
         return 1
     try:
-        args.func(args)
-        return 0
+        result = args.func(args)
+        return result if isinstance(result, int) else 0
     except ValueError as e:
         print(f"Error: {e.args[0]}")
         return 1
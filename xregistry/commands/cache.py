@@ -0,0 +1,114 @@
+"""
+Cache management commands for xregistry-cli.
+
+Provides commands to inspect, prune and clear the local caches: the
+snapshots of composed documents, the HTTP responses they were loaded from
+and the compiled templates.
+"""
+
+import argparse
+import json
+import sys
+import time
+from dataclasses import asdict
+
+from ..common.http_cache import HttpResponseCache
+from ..common.snapshot_cache import SnapshotCache
+from ..common.template_cache import TemplateCache
+
+
+def cmd_cache_info(args: argparse.Namespace) -> int:
+    """Show what the caches hold."""
+    try:
+        snapshots = SnapshotCache()
+        http_cache = HttpResponseCache()
+        entries = snapshots.entries()
+        http_entries, http_size = http_cache.usage()
+        template_cache = TemplateCache()
+        template_entries, template_bundles, template_size = template_cache.usage()
+        now = time.time()
+
+        if args.format == "json":
+            print(json.dumps({
+                "snapshots": {
+                    "directory": str(snapshots.cache_dir),
+                    "entries": [dict(asdict(info), current=snapshots.is_current(info)) for info in entries],
+                },
+                "http": {"directory": str(http_cache.cache_dir), "entries": http_entries, "bytes": http_size},
+                "templates": {"directory": str(template_cache.cache_dir), "entries": template_entries,
+                              "bundles": template_bundles, "bytes": template_size},
+            }, indent=2))
+            return 0
+
+        print("Snapshots:")
+        print(f"  directory: {snapshots.cache_dir}")
+        print(f"  entries: {len(entries)} ({sum(info.size for info in entries)} bytes)")
+        for info in entries:
+            state = "current" if snapshots.is_current(info) else "stale"
+            print(f"  - {info.key[:12]} {info.operation} {' + '.join(info.sources)}")
+            print(f"      {state}, {info.size} bytes, {len(info.inputs)} inputs, "
+                  f"taken {int(now - info.created_at)}s ago")
+        print()
+        print("HTTP responses:")
+        print(f"  directory: {http_cache.cache_dir}")
+        print(f"  entries: {http_entries} ({http_size} bytes)")
+        print()
+        print("Compiled templates:")
+        print(f"  directory: {template_cache.cache_dir}")
+        print(f"  entries: {template_entries}, bundles: {template_bundles} ({template_size} bytes)")
+        return 0
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+def cmd_cache_prune(args: argparse.Namespace) -> int:
+    """Remove stale snapshots."""
+    try:
+        pruned = SnapshotCache().prune(args.max_age)
+        print(f"Removed {pruned} snapshot(s)")
+        return 0
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+def cmd_cache_clear(args: argparse.Namespace) -> int:
+    """Remove everything from the caches."""
+    try:
+        removed = 0
+        if args.only in (None, "snapshots"):
+            removed += SnapshotCache().clear()
+        if args.only in (None, "http"):
+            removed += HttpResponseCache().clear()
+        if args.only in (None, "templates"):
+            removed += TemplateCache().clear()
+        print(f"Removed {removed} cache file(s)")
+        return 0
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+def add_cache_subcommands(parser: argparse.ArgumentParser) -> None:
+    """Add cache management subcommands to the parser."""
+    subparsers = parser.add_subparsers(dest="cache_action", help="Cache actions")
+    subparsers.required = True
+
+    # cache info
+    info_parser = subparsers.add_parser("info", help="Show the cached snapshots, HTTP responses and compiled templates")
+    info_parser.add_argument("--format", choices=["text", "json"], default="text",
+                             help="Output format (default: text)")
+    info_parser.set_defaults(func=cmd_cache_info)
+
+    # cache prune
+    prune_parser = subparsers.add_parser("prune", help="Remove snapshots whose input files changed, or that are older than --max-age")
+    prune_parser.add_argument("--max-age", dest="max_age", type=float, default=None,
+                              help="Also remove snapshots older than this many seconds")
+    prune_parser.set_defaults(func=cmd_cache_prune)
+
+    # cache clear
+    clear_parser = subparsers.add_parser("clear", help="Remove all cached snapshots, HTTP responses and compiled templates")
+    clear_parser.add_argument("--only", choices=["snapshots", "http", "templates"], default=None,
+                              help="Clear only the snapshots, the HTTP responses or the compiled templates")
+    clear_parser.set_defaults(func=cmd_cache_clear)
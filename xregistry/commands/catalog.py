@@ -25,6 +25,7 @@ from typing import Any, Dict, List, Mapping, MutableMapping, Optional, Sequence,
 
 import requests
 
+from ..common.http_transport import get_transport
 from ..common.model import Model
 import logging
 
@@ -125,7 +126,7 @@ class CatalogSubcommands(RegistrySubcommandsBase):
         full_url = f"{self.url}/{path}"
         try:
             kw.pop("singular", None)
-            response = getattr(requests, verb)(full_url, **kw)
+            response = get_transport().request(verb, full_url, **kw)
             if response.status_code >= 400:
                 response_body = response.content.decode("utf-8") if response.content else ""
                 logging.error(
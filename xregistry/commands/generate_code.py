@@ -2,13 +2,20 @@
 
 """Generate code from the given arguments. """
 
-from typing import Any, Dict, List, Union
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
 from xregistry.cli import logger
+from xregistry.generator.generation_manifest import GenerationManifest
 from xregistry.generator.generator_context import GeneratorContext
 from xregistry.generator.schema_utils import SchemaUtils
 from xregistry.generator.template_renderer import TemplateRenderer
+from xregistry.generator.xregistry_loader import DEFAULT_PREFETCH_THRESHOLD
 from xregistry.common.config import config_manager
-from .validate_definitions import validate
+from xregistry.common.file_watcher import FileWatcher
+from xregistry.common.template_cache import TemplateCache
+from .validate_definitions import create_http_cache, create_snapshot_cache, validate
 
 JsonNode = Union[Dict[str, 'JsonNode'], List['JsonNode'], str, None]
 
@@ -52,6 +59,7 @@ def generate_code(args: Any) -> int:
     suppress_code_output = args.no_code
     messagegroup_filter = args.messagegroup
     endpoint_filter = args.endpoint
+    jobs = getattr(args, 'jobs', 1)
 
     headers = {header.split("=", 1)[0]: header.split("=", 1)[1] for header in args.headers} if args.headers else {}
 
@@ -61,50 +69,229 @@ def generate_code(args: Any) -> int:
             key, value = arg.split("=", 1)
             template_args[key] = value
 
-    generator_context = GeneratorContext(output_dir, messagegroup_filter, endpoint_filter, getattr(args, 'model', None))
-
-    SchemaUtils.schema_files_collected = set()
-    generator_context.loader.reset_schemas_handled()
-    SchemaUtils.schema_references_collected = set()
-    generator_context.loader.set_current_url(None)
-
-    try:
-        # Validate definitions files if they are not URLs
-        definitions_files = args.definitions_files if isinstance(args.definitions_files, list) else [args.definitions_files]
-        non_url_files = [f for f in definitions_files if not f.startswith("http")]
-        if non_url_files:
-            if validate(non_url_files, headers, False) != 0:
-                return 1
-        
-        # Use stacked loading if multiple files, otherwise use single file
-        if len(definitions_files) > 1:
-            # Store the list in the generator context for stacked loading
-            primary_definitions_file = "|".join(definitions_files)  # Marker for stacked loading
-        else:
-            primary_definitions_file = definitions_files[0]
-        
-        renderer = TemplateRenderer(generator_context,
-            project_name, language, style, output_dir,
-            primary_definitions_file, headers, args.template_dirs, template_args,
-            suppress_code_output, suppress_schema_output
+    http_cache = create_http_cache(args)
+    snapshot_cache = create_snapshot_cache(args)
+    generator_context = GeneratorContext(output_dir, messagegroup_filter, endpoint_filter, getattr(args, 'model', None),
+                                         http_cache=http_cache, max_concurrency=getattr(args, 'max_concurrency', 8),
+                                         prefetch_threshold=getattr(args, 'prefetch_threshold', DEFAULT_PREFETCH_THRESHOLD),
+                                         snapshot_cache=snapshot_cache,
+                                         template_cache=None if getattr(args, 'no_cache', False) else TemplateCache())
+    definitions_files = args.definitions_files if isinstance(args.definitions_files, list) else [args.definitions_files]
+    watch = getattr(args, 'watch', False)
+    pipeline = GenerationPipeline(generator_context, definitions_files, headers, template_args,
+                                  project_name, language, style, output_dir, args.template_dirs,
+                                  suppress_code_output, suppress_schema_output, jobs,
+                                  full=getattr(args, 'full', False), stats=getattr(args, 'stats', False), warm=watch)
+    if watch:
+        return pipeline.watch(getattr(args, 'watch_interval', 0.5))
+    return pipeline.run()
+
+
+class GenerationPipeline:
+    """The stages of a generation: validate, load, render and write.
+
+    A pipeline runs any number of generations into the same output directory
+    with one generator context. With ``warm``, it keeps the composed
+    definitions and the Jinja environments in memory between generations, so
+    a generation after a template changed skips validating and loading, and
+    one after a definitions file changed keeps the compiled templates.
+    """
+
+    def __init__(self, ctx: GeneratorContext, definitions_files: List[str], headers: Dict[str, str],
+                 template_args: Dict[str, str], project_name: str, language: str, style: str, output_dir: str,
+                 template_dirs: Optional[List[str]], suppress_code_output: bool, suppress_schema_output: bool,
+                 jobs: int = 1, full: bool = False, stats: bool = False, warm: bool = False) -> None:
+        self.ctx = ctx
+        self.definitions_files = definitions_files
+        self.headers = headers
+        self.template_args = template_args
+        self.project_name = project_name
+        self.language = language
+        self.style = style
+        self.output_dir = output_dir
+        self.template_dirs = template_dirs
+        self.suppress_code_output = suppress_code_output
+        self.suppress_schema_output = suppress_schema_output
+        self.jobs = jobs
+        self.full = full
+        self.stats = stats
+        self.warm = warm
+        # The composed definitions and the base URI they were loaded with, while current
+        self.loaded: Optional[Tuple[str, JsonNode]] = None
+        self.base_uri: Optional[str] = None
+        # Local files the definitions were loaded from
+        self.definition_inputs: Set[str] = set()
+        # Seconds per stage of the last generation
+        self.timings: Dict[str, float] = {}
+        self.manifest: Optional[GenerationManifest] = None
+
+    def renderer(self, definitions_file: str, template_args: Dict[str, str]) -> TemplateRenderer:
+        """Create the renderer for a definitions file."""
+        return TemplateRenderer(self.ctx,
+            self.project_name, self.language, self.style, self.output_dir,
+            definitions_file, self.headers, self.template_dirs, template_args,
+            self.suppress_code_output, self.suppress_schema_output, jobs=self.jobs
         )
-        renderer.generate()
-
-        for schema in SchemaUtils.schema_files_collected:
-            renderer = TemplateRenderer(generator_context,
-                project_name, language, style, output_dir,
-                schema, headers, args.template_dirs, template_args,
-                suppress_code_output, suppress_schema_output
-            )
-            renderer.generate()
-
-        if generator_context.stacks.stack("files"):
-            for file, content in generator_context.stacks.stack("files"):
-                with open(file, "w", encoding='utf-8') as f:
-                    f.write(content)
-    except SystemExit:
-        return 1
-    except Exception as err:
-        logger.error("%s", err)
-        raise err
-    return 0
+
+    def run(self, reload_definitions: bool = True, reload_templates: bool = True) -> int:
+        """Run a generation.
+
+        Args:
+            reload_definitions: Validate and load the definitions again, even if they are kept from before
+            reload_templates: Create the Jinja environments again, even if they are kept from before
+
+        Returns:
+            0 on success, 1 if the definitions are invalid or a template exited the generation
+        """
+        ctx = self.ctx
+        manifest = self.manifest = GenerationManifest(self.output_dir, full=self.full)
+        ctx.manifest = manifest
+        self.timings = {}
+        if self.warm:
+            ctx.stacks.clear()
+            if reload_templates or ctx.template_envs is None:
+                ctx.template_envs = {}
+        if reload_definitions:
+            self.loaded = None
+            ctx.loader.dependency_resolver.reset()
+
+        SchemaUtils.schema_files_collected = set()
+        ctx.loader.reset_schemas_handled()
+        SchemaUtils.schema_references_collected = set()
+        ctx.loader.set_current_url(None)
+
+        http_cache = ctx.loader.http_cache
+        try:
+            # Use stacked loading if multiple files, otherwise use single file
+            if len(self.definitions_files) > 1:
+                # Store the list in the generator context for stacked loading
+                primary_definitions_file = "|".join(self.definitions_files)  # Marker for stacked loading
+            else:
+                primary_definitions_file = self.definitions_files[0]
+            if self.loaded is None:
+                # Validate definitions files if they are not URLs
+                with self._stage("validate"):
+                    non_url_files = [f for f in self.definitions_files if not f.startswith("http")]
+                    if non_url_files:
+                        if validate(non_url_files, self.headers, False, http_cache=ctx.loader.http_cache,
+                                    snapshot_cache=ctx.loader.snapshot_cache) != 0:
+                            return 1
+
+            # Renders add the project directories to the template arguments
+            template_args = dict(self.template_args) if self.warm else self.template_args
+            renderer = self.renderer(primary_definitions_file, template_args)
+            if self.loaded is not None:
+                ctx.base_uri = self.base_uri
+            elif self.warm:
+                with self._stage("load"):
+                    self.loaded, inputs = ctx.loader.record_inputs(renderer.load_document)
+                    self.base_uri = ctx.base_uri
+                    self.definition_inputs = {name for name in inputs if os.path.isabs(name)}
+
+            with self._stage("render"):
+                renderer.generate(self.loaded)
+                for schema in SchemaUtils.schema_files_collected:
+                    self.renderer(schema, template_args).generate()
+
+            with self._stage("write"):
+                if ctx.stacks.stack("files"):
+                    for file, content in ctx.stacks.stack("files"):
+                        manifest.write(file, content)
+                manifest.save()
+        except SystemExit:
+            self.loaded = None
+            return 1
+        except Exception as err:
+            self.loaded = None
+            logger.error("%s", err)
+            raise err
+        finally:
+            if http_cache:
+                logger.info(http_cache.stats.summary())
+            logger.info(manifest.summary())
+            if self.stats:
+                print(ctx.loader.stats.summary())
+                print(manifest.summary())
+                if http_cache:
+                    print(http_cache.stats.summary())
+        return 0
+
+    def watch(self, interval: float = 0.5) -> int:
+        """Generate, then generate again whenever a definitions file or template changes, until interrupted.
+
+        Changed definitions are validated and loaded again; changed templates
+        are compiled again. The output directory is written as in a single
+        generation, so only renders whose inputs changed run.
+        """
+        watcher = FileWatcher(interval=interval)
+        reload_definitions = reload_templates = True
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    result = self.run(reload_definitions, reload_templates)
+                except Exception:  # pylint: disable=broad-except
+                    # Logged by run; keep watching for a fix
+                    result = 1
+                print(self.report(time.perf_counter() - started, result), flush=True)
+                definition_files, template_dirs = self.watched()
+                watcher.watch(definition_files, template_dirs)
+                print(f"Watching {len(definition_files)} definitions files and {len(template_dirs)} template directories for changes. Press Ctrl+C to stop.", flush=True)
+                changed: Set[str] = set()
+                while not changed:
+                    changed = watcher.wait()
+                definitions_changed, reload_templates = self.affected(changed, template_dirs)
+                reload_definitions = definitions_changed or not self.loaded
+                for path in sorted(changed):
+                    print(f"Changed: {path}", flush=True)
+        except KeyboardInterrupt:
+            return 0
+
+    def watched(self) -> Tuple[Set[str], Set[str]]:
+        """Return the local definitions files and the template directories the last generation used."""
+        definition_files = set(self.definition_inputs)
+        definition_files.update(os.path.abspath(f) for f in self.definitions_files if not f.startswith("http"))
+        definition_files.update(os.path.abspath(f) for f in SchemaUtils.schema_files_collected if not f.startswith("http"))
+        renderer = self.renderer(self.definitions_files[0], {})
+        template_dirs: Set[str] = set()
+        try:
+            for dirs in renderer.template_directories():
+                template_dirs.update(os.path.abspath(d) for d in dirs if os.path.isdir(d))
+        except RuntimeError:
+            pass
+        for template_dir in self.template_dirs or []:
+            if os.path.isdir(template_dir):
+                template_dirs.add(os.path.abspath(template_dir))
+        return definition_files, template_dirs
+
+    @staticmethod
+    def affected(changed: Set[str], template_dirs: Set[str]) -> Tuple[bool, bool]:
+        """Tell whether changed paths are definitions, templates or both.
+
+        Paths below a template directory are templates; every other watched
+        path is a definitions file (including the schema files they reference).
+
+        Returns:
+            Whether definitions changed and whether templates changed
+        """
+        templates = {path for path in changed
+                     if any(path == directory or path.startswith(directory.rstrip(os.sep) + os.sep) for directory in template_dirs)}
+        return bool(changed - templates), bool(templates)
+
+    def report(self, elapsed: float, result: int) -> str:
+        """Summarize a generation with the time spent in each stage."""
+        stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in self.timings.items())
+        status = "Generated" if result == 0 else "Generation failed"
+        summary = f"{status} in {elapsed:.2f}s ({stages or 'no stages run'})"
+        if result == 0 and self.manifest is not None:
+            summary += f"; {self.manifest.summary()}"
+        return summary
+
+    @contextmanager
+    def _stage(self, name: str) -> Iterator[None]:
+        """Time a stage of the generation."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - started
@@ -0,0 +1,24 @@
+# pylint: disable=line-too-long
+
+""" Mirror a remote registry into a local definitions file """
+
+import sys
+
+import requests
+
+from xregistry.generator.registry_mirror import RegistryMirror
+
+
+def mirror_registry(args) -> int:
+    """Mirror a remote registry (or a subtree of it) into a self-contained local definitions file."""
+    headers = {header.split("=", 1)[0]: header.split("=", 1)[1] for header in args.headers} if args.headers else {}
+    mirror = RegistryMirror(args.output, getattr(args, 'model', None), getattr(args, 'max_concurrency', 8))
+    try:
+        result = mirror.mirror(args.url, headers, full=getattr(args, 'full', False))
+    except (requests.RequestException, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(result.summary())
+    for name in result.changed:
+        print(f"  changed: {name}")
+    return 0
@@ -0,0 +1,103 @@
+"""
+Template management commands for xregistry-cli.
+
+Provides the command to precompile the templates of a language and style
+into the template cache, so runs that follow skip compiling them, and the
+command that reports which parts of the definitions each generated file
+was rendered from.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from ..common.template_cache import TemplateCache
+from ..generator.access_tracking import READ_TREE
+from ..generator.generation_manifest import MANIFEST_NAME, GenerationManifest
+from ..generator.generator_context import GeneratorContext
+from ..generator.template_renderer import TemplateRenderer
+
+
+def cmd_templates_compile(args: argparse.Namespace) -> int:
+    """Precompile the templates of one or more styles."""
+    try:
+        template_cache = TemplateCache()
+        styles = args.styles
+        if not styles:
+            language_dir = os.path.join(os.path.dirname(__file__), "..", "templates", args.language)
+            if not os.path.isdir(language_dir):
+                raise ValueError(f"No templates for language: {args.language}")
+            styles = sorted(d for d in os.listdir(language_dir)
+                            if not d.startswith("_") and os.path.isdir(os.path.join(language_dir, d)))
+        compiled = set()
+        for style in styles:
+            renderer = TemplateRenderer(GeneratorContext(template_cache=template_cache), "", args.language, style,
+                                        "", "", {}, args.template_dirs, {}, True, True)
+            for path, count in renderer.compile_templates():
+                # Styles share the schema templates of their language
+                if path not in compiled:
+                    compiled.add(path)
+                    print(f"Compiled {count} templates of {args.language}/{style} into {path}")
+        return 0
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+def cmd_templates_dependencies(args: argparse.Namespace) -> int:
+    """Report the parts of the definitions the files in an output directory were rendered from."""
+    try:
+        manifest = GenerationManifest(args.output_dir)
+        renders = manifest.previous.get("renders")
+        if not isinstance(renders, dict):
+            raise ValueError(f"No {MANIFEST_NAME} in {args.output_dir}; generate into it first")
+        wanted = {manifest.relpath(f) if os.path.exists(f) else f.replace("\\", "/") for f in args.files or []}
+        report = {}
+        for key, record in sorted(renders.items()):
+            template = key.split("|", 1)[0]
+            for output in record.get("outputs", []):
+                if wanted and output not in wanted:
+                    continue
+                # Renders that did not record their reads depend on the whole document
+                reads = record.get("reads", {"": READ_TREE})
+                report.setdefault(output, []).append({"template": template, "reads": reads})
+        if args.listformat == "json":
+            print(json.dumps(report, indent=2))
+            return 0
+        for output, sources in report.items():
+            print(output)
+            for source in sources:
+                print(f"  {source['template']}")
+                for pointer, kind in source["reads"].items():
+                    print(f"    {kind:<6} #{pointer}")
+        return 0
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+def add_templates_subcommands(parser: argparse.ArgumentParser) -> None:
+    """Add template management subcommands to the parser."""
+    subparsers = parser.add_subparsers(dest="templates_action", help="Template actions")
+    subparsers.required = True
+
+    # templates compile
+    compile_parser = subparsers.add_parser("compile", help="Precompile the templates of a language and style into the template cache")
+    compile_parser.add_argument("--language", dest="language", required=True,
+                                help="The language of the templates")
+    compile_parser.add_argument("--style", dest="styles", nargs="+", default=None,
+                                help="The styles to compile, with their includes (default: all styles of the language)")
+    compile_parser.add_argument("--templates", nargs="*", dest="template_dirs", required=False,
+                                help="Paths of extra directories containing custom templates")
+    compile_parser.set_defaults(func=cmd_templates_compile)
+
+    # templates dependencies
+    dependencies_parser = subparsers.add_parser("dependencies", help="Report which parts of the definitions each generated file was rendered from")
+    dependencies_parser.add_argument("--output", dest="output_dir", required=True,
+                                     help="The output directory of a generation")
+    dependencies_parser.add_argument("files", nargs="*",
+                                     help="Generated files to report on (default: all)")
+    dependencies_parser.add_argument("--format", dest="listformat", choices=["text", "json"], default="text",
+                                     help="Format for the output: text or json")
+    dependencies_parser.set_defaults(func=cmd_templates_dependencies)
@@ -5,7 +5,10 @@
 import os
 import json
 import jsonschema
+from typing import Optional
 
+from xregistry.common.http_cache import HttpResponseCache
+from xregistry.common.snapshot_cache import SnapshotCache
 from xregistry.generator.xregistry_loader import XRegistryLoader
 
 
@@ -23,16 +26,35 @@ def validate_definition(args) -> int:
         headers = {}
 
     # Call the validate() function with the parsed arguments
-    return validate(definitions_files, headers, True)
+    return validate(definitions_files, headers, True, create_http_cache(args), create_snapshot_cache(args))
 
 
-def validate(definitions_uris, headers, verbose=False):
+def create_http_cache(args) -> Optional[HttpResponseCache]:
+    """Create the HTTP response cache according to the --offline/--no-cache options."""
+    offline = getattr(args, 'offline', False)
+    if getattr(args, 'no_cache', False):
+        if offline:
+            raise ValueError("--offline cannot be combined with --no-cache.")
+        return None
+    return HttpResponseCache(offline=offline)
+
+
+def create_snapshot_cache(args) -> Optional[SnapshotCache]:
+    """Create the cache of composed documents according to the --offline/--no-cache options."""
+    if getattr(args, 'no_cache', False):
+        return None
+    return SnapshotCache(offline=getattr(args, 'offline', False))
+
+
+def validate(definitions_uris, headers, verbose=False, http_cache=None, snapshot_cache=None):
     """Validate the definitions file(s) using the JSON schema in schemas/xregistry_messaging_catalog.json
     
     Args:
         definitions_uris: A single URI string or a list of URI strings to load and stack
         headers: HTTP headers for authentication
         verbose: Whether to print verbose output
+        http_cache: Optional HTTP response cache for remote definitions
+        snapshot_cache: Optional cache of composed documents from earlier runs
     
     Returns:
         0 on success, 1 on validation error, 2 on load error
@@ -42,7 +64,7 @@ def validate(definitions_uris, headers, verbose=False):
         definitions_uris = [definitions_uris]
     
     # load the definitions file(s)
-    loader = XRegistryLoader()
+    loader = XRegistryLoader(http_cache=http_cache, snapshot_cache=snapshot_cache)
     
     if len(definitions_uris) == 1:
         definitions_file, docroot = loader.load(definitions_uris[0], headers, False, True)
@@ -55,6 +77,9 @@ def validate(definitions_uris, headers, verbose=False):
         print(f"Error: could not load definitions file(s) {display_name}")
         return 2
     
+    # Validation covers the whole document, so fetch all deferred resources up front
+    loader.prefetch_resources(docroot)
+    
     try:
         basepath = os.path.realpath(
             os.path.join(os.path.dirname(__file__), ".."))
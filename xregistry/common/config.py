@@ -10,6 +10,11 @@ Provides hierarchical configuration with the following priority order:
 Configuration file location:
 - Linux/macOS: ~/.config/xregistry/config.json
 - Windows: %APPDATA%/xregistry/config.json
+
+Cached data (HTTP responses etc.) lives in the platform cache directory:
+- Linux: ~/.cache/xregistry
+- macOS: ~/Library/Caches/xregistry
+- Windows: %LOCALAPPDATA%/xregistry/xregistry/Cache
 """
 
 from __future__ import annotations
@@ -110,6 +115,7 @@ class ConfigManager:
     def __init__(self) -> None:
         self._config_dir = Path(platformdirs.user_config_dir("xregistry", "xregistry"))
         self._config_file = self._config_dir / "config.json"
+        self._cache_dir = Path(platformdirs.user_cache_dir("xregistry", "xregistry"))
         self._config: Optional[XRegistryConfig] = None
     
     @property
@@ -117,6 +123,11 @@ class ConfigManager:
         """Get the configuration file path."""
         return self._config_file
     
+    @property
+    def cache_dir(self) -> Path:
+        """Get the cache directory path."""
+        return self._cache_dir
+    
     def ensure_config_dir(self) -> None:
         """Ensure the configuration directory exists."""
         try:
@@ -0,0 +1,73 @@
+"""
+Polling for changes to files and directories.
+
+Used by ``generate --watch``. The watched files are few (the definitions
+and the templates of one style), so stat'ing them periodically is cheap and
+works the same on every platform and file system, including network shares
+and container mounts where change notifications are not delivered.
+"""
+
+import os
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+
+class FileWatcher:
+    """Reports files that were changed, added or removed since the last check."""
+
+    def __init__(self, files: Iterable[str] = (), directories: Iterable[str] = (), interval: float = 0.5) -> None:
+        """
+        Args:
+            files: Files to watch
+            directories: Directories whose files are watched, recursively
+            interval: Seconds between checks
+        """
+        self.interval = interval
+        self.files: Set[str] = set()
+        self.directories: Set[str] = set()
+        self._state: Dict[str, Tuple[int, int]] = {}
+        self.watch(files, directories)
+
+    def watch(self, files: Iterable[str] = (), directories: Iterable[str] = ()) -> None:
+        """Replace the watched files and directories, taking their current state as unchanged."""
+        self.files = {os.path.abspath(f) for f in files}
+        self.directories = {os.path.abspath(d) for d in directories}
+        self._state = self._scan()
+
+    def changes(self) -> Set[str]:
+        """Return the paths changed since the last check."""
+        state = self._scan()
+        changed = {path for path in state.keys() | self._state.keys() if state.get(path) != self._state.get(path)}
+        self._state = state
+        return changed
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """Wait for changes and return them; empty if ``timeout`` seconds passed without any.
+
+        Changes are collected until a check finds no more, so a file written
+        in several steps, or a set of files saved together, is reported once.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changed: Set[str] = set()
+        while True:
+            time.sleep(self.interval)
+            found = self.changes()
+            if not found and changed:
+                return changed
+            changed |= found
+            if not changed and deadline is not None and time.monotonic() >= deadline:
+                return changed
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        state: Dict[str, Tuple[int, int]] = {}
+        paths = set(self.files)
+        for directory in self.directories:
+            for root, _, names in os.walk(directory, followlinks=True):
+                paths.update(os.path.join(root, name) for name in names)
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            state[path] = (stat.st_mtime_ns, stat.st_size)
+        return state
@@ -0,0 +1,256 @@
+"""
+On-disk HTTP response cache for registry documents.
+
+Responses fetched by the loader are stored content-addressed below the
+platform cache directory:
+
+- ``entries/<key>.json``  – metadata per request (URL, ETag, Last-Modified,
+  epoch, time of the last successful fetch or revalidation)
+- ``blobs/<sha256>``      – the response bodies, keyed by their SHA-256 hash
+- ``roots.json``          – discovered registry root URLs and when they were
+  discovered, so later runs can skip probing for ``/capabilities``
+
+The request key is derived from the URL and the headers the request is
+sent with, including the credentials the shared transport adds for the
+configured registry (see ``XRegistryLoader.cache_headers``), so different
+credentials never share an entry. Entries younger than the
+configured TTL (``model.cache_timeout``) are served without contacting the
+server; older entries are revalidated with ``If-None-Match`` /
+``If-Modified-Since``. In offline mode, entries are served regardless of age
+and nothing is fetched.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+
+from .config import config_manager
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    """Metadata of a cached HTTP response."""
+    url: str
+    content_hash: str
+    stored_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    epoch: Optional[int] = None
+
+
+@dataclass
+class CacheStats:
+    """Counters for cache activity during a run."""
+    hits: int = 0
+    misses: int = 0
+    revalidated: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, counter: str) -> None:
+        """Increment the named counter."""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def to_dict(self) -> Dict[str, int]:
+        """Convert to dictionary representation."""
+        return {"hits": self.hits, "misses": self.misses, "revalidated": self.revalidated}
+
+    def summary(self) -> str:
+        """Return a one-line summary of the counters."""
+        return f"HTTP cache: {self.hits} hits, {self.misses} misses, {self.revalidated} revalidated"
+
+
+class HttpResponseCache:
+    """Content-addressed, conditional-GET aware response cache."""
+
+    def __init__(self, cache_dir: Optional[Path] = None, ttl: Optional[int] = None,
+                 offline: bool = False) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Root directory of the cache. Defaults to ``http`` below
+                       the platform cache directory.
+            ttl: Seconds an entry is considered fresh. Defaults to
+                 ``model.cache_timeout`` from the configuration.
+            offline: Serve entries regardless of age and never fetch.
+        """
+        self._dir = Path(cache_dir) if cache_dir else config_manager.cache_dir / "http"
+        self._ttl = ttl if ttl is not None else config_manager.load_config().model.cache_timeout
+        self.offline = offline
+        self.stats = CacheStats()
+        self._roots_lock = threading.Lock()
+
+    @property
+    def cache_dir(self) -> Path:
+        """Get the cache root directory."""
+        return self._dir
+
+    @staticmethod
+    def request_key(url: str, headers: Optional[Mapping[str, str]] = None) -> str:
+        """Compute the cache key for a request."""
+        hasher = hashlib.sha256(url.encode("utf-8"))
+        for name, value in sorted((headers or {}).items(), key=lambda kv: kv[0].lower()):
+            hasher.update(f"\n{name.lower()}:{value}".encode("utf-8"))
+        return hasher.hexdigest()
+
+    def lookup(self, url: str, headers: Optional[Mapping[str, str]] = None) -> Optional[Tuple[CacheEntry, bytes]]:
+        """Return the cached entry and body for a request, or None."""
+        entry_file = self._dir / "entries" / f"{self.request_key(url, headers)}.json"
+        try:
+            with open(entry_file, "r", encoding="utf-8") as f:
+                entry = CacheEntry(**json.load(f))
+            with open(self._dir / "blobs" / entry.content_hash, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError, TypeError):
+            return None
+        if hashlib.sha256(body).hexdigest() != entry.content_hash:
+            logger.warning(f"Discarding corrupt cache entry for {url}")
+            return None
+        return entry, body
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        """Check whether an entry can be served without revalidation."""
+        return self.offline or (time.time() - entry.stored_at) < self._ttl
+
+    @staticmethod
+    def conditional_headers(entry: CacheEntry) -> Dict[str, str]:
+        """Build the revalidation headers for a cached entry."""
+        headers: Dict[str, str] = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def store(self, url: str, headers: Optional[Mapping[str, str]], body: bytes,
+              response_headers: Optional[Mapping[str, str]] = None,
+              epoch: Optional[int] = None) -> CacheEntry:
+        """Store a response body and its validators."""
+        response_headers = response_headers or {}
+        content_hash = hashlib.sha256(body).hexdigest()
+        entry = CacheEntry(
+            url=url,
+            content_hash=content_hash,
+            stored_at=time.time(),
+            etag=response_headers.get("ETag"),
+            last_modified=response_headers.get("Last-Modified"),
+            epoch=epoch,
+        )
+        try:
+            blob_file = self._dir / "blobs" / content_hash
+            if not blob_file.exists():
+                write_atomic(blob_file, body)
+            self._write_entry(self.request_key(url, headers), entry)
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry for {url}: {e}")
+        return entry
+
+    def touch(self, url: str, headers: Optional[Mapping[str, str]], entry: CacheEntry,
+              response_headers: Optional[Mapping[str, str]] = None) -> None:
+        """Mark an entry as revalidated (HTTP 304) and refresh its validators."""
+        response_headers = response_headers or {}
+        entry.stored_at = time.time()
+        entry.etag = response_headers.get("ETag") or entry.etag
+        entry.last_modified = response_headers.get("Last-Modified") or entry.last_modified
+        try:
+            self._write_entry(self.request_key(url, headers), entry)
+        except OSError as e:
+            logger.warning(f"Failed to update cache entry for {url}: {e}")
+
+    def lookup_registry_root(self, candidates: Sequence[str]) -> Optional[str]:
+        """Return the first of ``candidates`` recorded as a registry root, unless expired.
+
+        Recorded roots expire like cached responses; in offline mode they are
+        served regardless of age.
+        """
+        roots = self._read_roots()
+        now = time.time()
+        for candidate in candidates:
+            discovered_at = roots.get(candidate.rstrip("/"))
+            if isinstance(discovered_at, (int, float)) and (self.offline or now - discovered_at < self._ttl):
+                return candidate
+        return None
+
+    def store_registry_root(self, root: str) -> None:
+        """Record a discovered registry root."""
+        with self._roots_lock:
+            roots = self._read_roots()
+            roots[root.rstrip("/")] = time.time()
+            try:
+                write_atomic(self._dir / "roots.json", json.dumps(roots, indent=1).encode("utf-8"))
+            except OSError as e:
+                logger.warning(f"Failed to record registry root {root}: {e}")
+
+    def _read_roots(self) -> Dict[str, Any]:
+        try:
+            with open(self._dir / "roots.json", "r", encoding="utf-8") as f:
+                roots = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return roots if isinstance(roots, dict) else {}
+
+    def usage(self) -> Tuple[int, int]:
+        """Return the number of cached responses and the size of their bodies in bytes."""
+        entries_dir, blobs_dir = self._dir / "entries", self._dir / "blobs"
+        entries = sum(1 for _ in entries_dir.glob("*.json")) if entries_dir.is_dir() else 0
+        size = sum(blob.stat().st_size for blob in blobs_dir.iterdir()) if blobs_dir.is_dir() else 0
+        return entries, size
+
+    def clear(self) -> int:
+        """Remove all cached responses and registry roots. Returns the number of files removed."""
+        removed = 0
+        roots_file = self._dir / "roots.json"
+        if roots_file.exists():
+            try:
+                roots_file.unlink()
+                removed += 1
+            except OSError as e:
+                logger.warning(f"Failed to remove cache file {roots_file}: {e}")
+        for sub in ("entries", "blobs"):
+            directory = self._dir / sub
+            if not directory.is_dir():
+                continue
+            for item in directory.iterdir():
+                try:
+                    item.unlink()
+                    removed += 1
+                except OSError as e:
+                    logger.warning(f"Failed to remove cache file {item}: {e}")
+        return removed
+
+    def _write_entry(self, key: str, entry: CacheEntry) -> None:
+        write_atomic(self._dir / "entries" / f"{key}.json", json.dumps(asdict(entry)).encode("utf-8"))
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """Write a file via a temporary sibling so readers never see partial content."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+
+def extract_epoch(document: Any) -> Optional[int]:
+    """Return the xRegistry ``epoch`` attribute of a document, if present."""
+    if isinstance(document, dict) and isinstance(document.get("epoch"), int):
+        return document["epoch"]
+    return None
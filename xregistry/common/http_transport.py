@@ -0,0 +1,112 @@
+"""
+Shared HTTP transport for registry access.
+
+The loader, the model fetch and the catalog commands all talk to the same
+registries. They share one pooled ``requests.Session`` so that connections
+(and their TLS sessions) are kept alive and reused across documents,
+capability probes and CRUD calls:
+
+- connections are pooled per host and capped at ``pool_maxsize``; callers
+  block for a free connection rather than opening additional ones
+- responses are requested compressed and decompressed incrementally as they
+  are read: gzip and deflate always, brotli and zstd when the optional
+  ``brotli``/``zstandard`` packages are installed
+- the configured ``registry.auth_token`` is sent as a bearer token to every
+  URL below ``registry.base_url``; explicit request headers take precedence
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Any, Dict, Mapping, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+
+from .config import config_manager
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_CONNECTIONS = 16
+DEFAULT_POOL_MAXSIZE = 8
+
+
+class HttpTransport:
+    """Pooled keep-alive HTTP client shared by all registry consumers."""
+
+    def __init__(self, pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 timeout: Optional[float] = None,
+                 auth_token: Optional[str] = None,
+                 auth_base_url: Optional[str] = None) -> None:
+        """
+        Initialize the transport.
+
+        Args:
+            pool_connections: Number of per-host connection pools to keep.
+            pool_maxsize: Maximum number of connections per host.
+            timeout: Default request timeout in seconds.
+            auth_token: Bearer token sent to URLs below ``auth_base_url``.
+            auth_base_url: URL prefix the token is scoped to.
+        """
+        self.timeout = timeout
+        self.auth_token = auth_token
+        self.auth_base_url = auth_base_url.rstrip("/") if auth_base_url else None
+        self._session = requests.Session()
+        # The encodings urllib3 can decode with the packages installed
+        self._session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                              pool_block=True)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    @property
+    def session(self) -> requests.Session:
+        """Get the underlying session."""
+        return self._session
+
+    def effective_headers(self, url: str, headers: Optional[Mapping[str, str]] = None) -> Dict[str, str]:
+        """Return the shared auth headers for ``url`` merged with ``headers``."""
+        merged: Dict[str, str] = {}
+        if self.auth_token and self.auth_base_url and (
+                url == self.auth_base_url or url.startswith(self.auth_base_url + "/")):
+            merged["Authorization"] = f"Bearer {self.auth_token}"
+        if headers:
+            if any(k.lower() == "authorization" for k in headers):
+                merged.pop("Authorization", None)
+            merged.update(headers)
+        return merged
+
+    def request(self, method: str, url: str, headers: Optional[Mapping[str, str]] = None,
+                **kwargs: Any) -> requests.Response:
+        """Send a request through the shared session."""
+        kwargs.setdefault("timeout", self.timeout)
+        return self._session.request(method.upper(), url,
+                                     headers=self.effective_headers(url, headers), **kwargs)
+
+    def get(self, url: str, headers: Optional[Mapping[str, str]] = None, **kwargs: Any) -> requests.Response:
+        """Send a GET request."""
+        return self.request("GET", url, headers, **kwargs)
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        self._session.close()
+
+
+_shared_transport: Optional[HttpTransport] = None
+_shared_lock = threading.Lock()
+
+
+def get_transport() -> HttpTransport:
+    """Return the process-wide transport, creating it from the configuration on first use."""
+    global _shared_transport  # pylint: disable=global-statement
+    with _shared_lock:
+        if _shared_transport is None:
+            registry = config_manager.load_config().registry
+            _shared_transport = HttpTransport(timeout=registry.timeout,
+                                              auth_token=registry.auth_token,
+                                              auth_base_url=registry.base_url)
+        return _shared_transport
@@ -14,15 +14,128 @@ discover groups/resources/attributes without hard-coding anything.
 """
 from __future__ import annotations
 
+import hashlib
 import json
 import logging
 import os
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List, Mapping, MutableMapping, Optional
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, List, Mapping, MutableMapping, Optional, Tuple
 from urllib.parse import urlparse
 
 import requests
 from .config import config_manager
+from .http_transport import get_transport
+
+
+@dataclass(frozen=True)
+class ResourceIndex:
+    """Precomputed names of one resource collection of a group (e.g. ``messages``)."""
+
+    plural: str
+    singular: str
+    id_attribute: str
+    url_field: str
+    base64_field: str
+    collection_url_field: str
+
+
+@dataclass(frozen=True)
+class GroupIndex:
+    """Precomputed names of one group type (e.g. ``messagegroups``) and its resource collections."""
+
+    plural: str
+    singular: str
+    id_attribute: str
+    resources: Tuple[ResourceIndex, ...]
+    collections: FrozenSet[str]
+
+    def resource(self, collection: str) -> Optional[ResourceIndex]:
+        """Return the resource collection with the given plural name, if the group has it."""
+        return next((r for r in self.resources if r.plural == collection), None)
+
+
+@dataclass(frozen=True)
+class ModelIndex:
+    """Immutable look-ups over the model's groups, built once per model.
+
+    Loader, merger and resolvers consult the index instead of walking the
+    model's ``groups`` dictionary over and over. Everything in it is a tuple,
+    frozenset or read-only mapping, so one index is safely shared between
+    threads.
+    """
+
+    groups: Tuple[GroupIndex, ...]
+    group_types: Tuple[str, ...]
+    group_plurals: FrozenSet[str]
+    singulars: FrozenSet[str]
+    id_attributes: FrozenSet[str]
+    url_fields: FrozenSet[str]
+    base64_fields: FrozenSet[str]
+    _by_plural: Mapping[str, GroupIndex] = field(repr=False, compare=False)
+
+    def group(self, plural: str) -> Optional[GroupIndex]:
+        """Return the group type with the given plural name, if the model has it."""
+        return self._by_plural.get(plural)
+
+    def collections(self, plural: str) -> FrozenSet[str]:
+        """Return the resource collection names of a group type (empty for unknown types)."""
+        group = self._by_plural.get(plural)
+        return group.collections if group is not None else frozenset()
+
+    @classmethod
+    def build(cls, groups: Mapping[str, Any]) -> 'ModelIndex':
+        """Build the index over a model's ``groups`` dictionary.
+
+        Singular names default the way the resolvers always defaulted them:
+        the plural without its last letter for groups, ``resource`` for
+        resource collections.
+        """
+        group_indexes: List[GroupIndex] = []
+        for plural, group_def in groups.items():
+            group_def = group_def if isinstance(group_def, dict) else {}
+            resource_defs = group_def.get("resources", {})
+            resources: List[ResourceIndex] = []
+            if isinstance(resource_defs, dict):
+                for collection, resource_def in resource_defs.items():
+                    singular = "resource"
+                    if isinstance(resource_def, dict) and "singular" in resource_def:
+                        singular = resource_def["singular"]
+                    resources.append(ResourceIndex(
+                        plural=collection, singular=singular, id_attribute=f"{singular}id",
+                        url_field=f"{singular}url", base64_field=f"{singular}base64",
+                        collection_url_field=f"{collection}url"))
+            singular = group_def.get("singular", plural[:-1])
+            group_indexes.append(GroupIndex(
+                plural=plural, singular=singular, id_attribute=f"{singular}id",
+                resources=tuple(resources), collections=frozenset(r.plural for r in resources)))
+
+        resource_indexes = [r for g in group_indexes for r in g.resources]
+        return cls(
+            groups=tuple(group_indexes),
+            group_types=tuple(g.plural for g in group_indexes),
+            group_plurals=frozenset(g.plural for g in group_indexes),
+            singulars=frozenset([g.singular for g in group_indexes] + [r.singular for r in resource_indexes]),
+            id_attributes=frozenset([g.id_attribute for g in group_indexes] + [r.id_attribute for r in resource_indexes]),
+            url_fields=frozenset([r.url_field for r in resource_indexes]
+                                 + [r.collection_url_field for r in resource_indexes]),
+            base64_fields=frozenset(r.base64_field for r in resource_indexes),
+            _by_plural=MappingProxyType({g.plural: g for g in group_indexes}),
+        )
+
+    @classmethod
+    def for_model(cls, model: Any) -> 'ModelIndex':
+        """Get the index of a model.
+
+        A ``Model`` builds its index once, when it is loaded. Other objects
+        with a ``groups`` dictionary (stand-ins for a model) get an index
+        built from their current groups.
+        """
+        index = getattr(model, "_index", None)
+        if isinstance(index, ModelIndex):
+            return index
+        return cls.build(model.groups)
 
 
 class Model:
@@ -55,6 +168,8 @@ class Model:
         ]
         self._group_by_plural = {g["plural"]: g for g in valid_groups}
         self._group_by_singular = {g["singular"]: g for g in valid_groups}
+        self._index = ModelIndex.build(self.groups)
+        self._fingerprint = hashlib.sha256(json.dumps(self._model, sort_keys=True).encode("utf-8")).hexdigest()
 
     # --------------------------------------------------------------------- #
     # public helpers
@@ -64,6 +179,16 @@ class Model:
     def groups(self) -> Dict[str, Any]:
         return self._model.get("groups", {})
 
+    @property
+    def fingerprint(self) -> str:
+        """SHA-256 hash of the model's content, for keying what was derived from it."""
+        return self._fingerprint
+
+    @property
+    def index(self) -> ModelIndex:
+        """The precomputed, immutable index over the groups (see ``ModelIndex``)."""
+        return self._index
+
     def group(self, name: str) -> Dict[str, Any]:
         """Return group-definition by *singular* **or** *plural* form."""
         return self._group_by_singular.get(name) or self._group_by_plural[name]
@@ -93,7 +218,7 @@ class Model:
         # Priority 2: Legacy registry URL behavior
         if self._url:
             try:
-                resp = requests.get(f"{self._url}/model", timeout=4)
+                resp = get_transport().get(f"{self._url}/model", timeout=4)
                 resp.raise_for_status()
                 self._model = resp.json()
                 return
@@ -128,7 +253,7 @@ class Model:
                     url = path
                     logger.debug(f"Fetching model directly from: {url}")
                     
-                resp = requests.get(url, timeout=10)
+                resp = get_transport().get(url, timeout=10)
                 resp.raise_for_status()
                 
                 content_type = resp.headers.get('content-type', '').lower()
@@ -0,0 +1,302 @@
+"""
+On-disk cache of composed registry documents ("snapshots").
+
+A load (``load``, ``load_stacked``, ``load_with_dependencies``) reads one or
+more source documents and everything they reference, resolves resources and
+basemessages and applies the filters. The result is stored below the
+platform cache directory, so a later run with the same inputs skips the
+load entirely:
+
+- ``snapshots/<key>.json``     – metadata: the operation and sources, when the
+  snapshot was taken, and the inputs the load read (local files with size and
+  modification time, remote documents with content hash, ETag, epoch and the
+  time they were fetched or revalidated), and the entities whose
+  URL-referenced content the load deferred (``deferred``)
+- ``snapshots/<key>.marshal``  – the document, in Python's ``marshal`` format
+
+Snapshots hold the document as loaded: resources and collections the load
+deferred until first use are stored unresolved, with their key paths and
+what they defer, and the loader defers them again when it restores the
+snapshot. Their content is not an input of the snapshot; it is fetched
+when used, like after a load.
+
+The key is derived from the operation, the sources, the load options
+(filters, styles), the request headers (with the configured registry
+credentials), the model and the tool version.
+A snapshot is used only while its inputs are unchanged: local files must
+still have the recorded size and modification time, and remote documents
+count as unchanged for as long as the HTTP cache would serve them without
+revalidation (``model.cache_timeout``; in offline mode, regardless of age).
+After that, the loader checks them again (see ``epoch_sync``) and either
+confirms the snapshot with ``refresh`` or loads again.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import marshal
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .._version import __version__
+from .config import config_manager
+from .http_cache import write_atomic
+
+
+logger = logging.getLogger(__name__)
+
+#: Version of the snapshot layout; part of every key
+SNAPSHOT_FORMAT = 1
+
+
+@dataclass
+class SnapshotInfo:
+    """Metadata of a cached snapshot."""
+    key: str
+    operation: str
+    sources: List[str]
+    uri: str
+    created_at: float
+    inputs: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    size: int = 0
+    #: Unresolved entities: ``{"paths": [<key path>, ...], "deferred": [<kind>, <name>]}``
+    deferred: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def file_input(path: str) -> Dict[str, Any]:
+    """Describe a local file read by a load, for recording as a snapshot input."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return {"missing": True}
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def remote_input(content_hash: Optional[str], fetched_at: float, etag: Optional[str] = None,
+                 epoch: Optional[int] = None, entities: Optional[Dict[str, List[Any]]] = None,
+                 members: Optional[Dict[str, List[str]]] = None) -> Dict[str, Any]:
+    """Describe a remote document read by a load (``content_hash`` None if the fetch failed).
+
+    Args:
+        entities: The versions (``[epoch, modifiedat]``) of the groups the
+                  document holds, by group URL
+        members: The IDs of the groups listed by a group type collection the
+                 document holds, by collection URL
+    """
+    recorded = {"content_hash": content_hash, "etag": etag, "epoch": epoch, "fetched_at": fetched_at}
+    if entities:
+        recorded["entities"] = entities
+    if members:
+        recorded["members"] = members
+    return recorded
+
+
+def plain_document(node: Any, memo: Optional[Dict[int, Any]] = None) -> Any:
+    """Copy a document into plain dicts and lists (e.g. ``LazyEntity`` objects).
+
+    Subtrees shared within the document stay shared in the copy. Entities
+    that are not resolved yet are copied with the members they have, without
+    resolving them.
+    """
+    if memo is None:
+        memo = {}
+    if isinstance(node, dict):
+        if id(node) not in memo:
+            copy: Dict[Any, Any] = {}
+            memo[id(node)] = copy
+            for key, value in dict.items(node):
+                copy[key] = plain_document(value, memo)
+        return memo[id(node)]
+    if isinstance(node, list):
+        if id(node) not in memo:
+            items: List[Any] = []
+            memo[id(node)] = items
+            items.extend(plain_document(item, memo) for item in node)
+        return memo[id(node)]
+    return node
+
+
+class SnapshotCache:
+    """Stores composed documents keyed by the inputs of the load that produced them."""
+
+    def __init__(self, cache_dir: Optional[Path] = None, ttl: Optional[int] = None,
+                 offline: bool = False) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Root directory of the cache. Defaults to ``snapshots``
+                       below the platform cache directory.
+            ttl: Seconds remote inputs are considered unchanged. Defaults to
+                 ``model.cache_timeout`` from the configuration.
+            offline: Consider remote inputs unchanged regardless of age.
+        """
+        self._dir = Path(cache_dir) if cache_dir else config_manager.cache_dir / "snapshots"
+        self._ttl = ttl if ttl is not None else config_manager.load_config().model.cache_timeout
+        self.offline = offline
+
+    @property
+    def cache_dir(self) -> Path:
+        """Get the cache root directory."""
+        return self._dir
+
+    @staticmethod
+    def snapshot_key(operation: str, sources: Sequence[str], options: Mapping[str, Any],
+                     headers: Optional[Mapping[str, str]], model_fingerprint: str) -> str:
+        """Compute the cache key of a load."""
+        normalized = [source if source.startswith(("http://", "https://")) else os.path.abspath(source)
+                      for source in sources]
+        material = json.dumps({
+            "format": SNAPSHOT_FORMAT,
+            "version": __version__,
+            "operation": operation,
+            "sources": normalized,
+            "options": dict(options),
+            "headers": sorted((name.lower(), value) for name, value in (headers or {}).items()),
+            "model": model_fingerprint,
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str) -> Optional[Tuple[str, Any]]:
+        """Return the URI and document of a snapshot whose inputs are unchanged, or None."""
+        info = self.info(key)
+        if info is None or not self.is_current(info):
+            return None
+        return self.read(info)
+
+    def info(self, key: str) -> Optional[SnapshotInfo]:
+        """Return the metadata of a snapshot, current or not, or None."""
+        return self._read_info(self._dir / f"{key}.json")
+
+    def read(self, info: SnapshotInfo) -> Optional[Tuple[str, Any]]:
+        """Return the URI and document of a snapshot, or None if it cannot be read."""
+        key = info.key
+        try:
+            with open(self._dir / f"{key}.marshal", "rb") as f:
+                document = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            logger.warning(f"Discarding unreadable snapshot {key}")
+            return None
+        return info.uri, document
+
+    def store(self, key: str, operation: str, sources: Sequence[str], uri: str, document: Any,
+              inputs: Mapping[str, Dict[str, Any]],
+              deferred: Optional[List[Dict[str, Any]]] = None) -> Optional[SnapshotInfo]:
+        """Store a document with the inputs it was loaded from and the entities it left unresolved.
+
+        Returns:
+            The snapshot's metadata, or None if the document could not be stored
+        """
+        try:
+            data = marshal.dumps(plain_document(document))
+        except ValueError as e:
+            # E.g. dates parsed from YAML; such documents are simply not cached
+            logger.debug(f"Not caching a snapshot of {', '.join(sources)}: {e}")
+            return None
+        info = SnapshotInfo(key=key, operation=operation, sources=list(sources), uri=uri,
+                            created_at=time.time(), inputs=dict(inputs), size=len(data),
+                            deferred=list(deferred or []))
+        try:
+            write_atomic(self._dir / f"{key}.marshal", data)
+            write_atomic(self._dir / f"{key}.json", json.dumps(asdict(info)).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"Failed to write snapshot of {', '.join(sources)}: {e}")
+            return None
+        return info
+
+    def refresh(self, info: SnapshotInfo, inputs: Mapping[str, Dict[str, Any]]) -> None:
+        """Record inputs of a snapshot as confirmed unchanged (e.g. their ``fetched_at``)."""
+        info.inputs.update(inputs)
+        try:
+            write_atomic(self._dir / f"{info.key}.json", json.dumps(asdict(info)).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"Failed to update snapshot {info.key}: {e}")
+
+    def is_current(self, info: SnapshotInfo) -> bool:
+        """Check whether the inputs of a snapshot are unchanged."""
+        return self.expired_inputs(info) == []
+
+    def expired_inputs(self, info: SnapshotInfo) -> Optional[List[str]]:
+        """List the remote inputs of a snapshot that need checking again.
+
+        Returns:
+            The names of the remote inputs older than the TTL, or None if a
+            local input file changed (the snapshot is outdated)
+        """
+        now = time.time()
+        expired: List[str] = []
+        for name, recorded in info.inputs.items():
+            if "fetched_at" in recorded:
+                if not self.offline and now - recorded["fetched_at"] >= self._ttl:
+                    expired.append(name)
+            elif file_input(name) != recorded:
+                return None
+        return expired
+
+    def entries(self) -> List[SnapshotInfo]:
+        """List the cached snapshots, most recent first."""
+        if not self._dir.is_dir():
+            return []
+        infos = [info for info in (self._read_info(path) for path in self._dir.glob("*.json")) if info]
+        return sorted(infos, key=lambda info: info.created_at, reverse=True)
+
+    def remove(self, key: str) -> int:
+        """Remove a snapshot. Returns the number of files removed."""
+        removed = 0
+        for path in (self._dir / f"{key}.json", self._dir / f"{key}.marshal"):
+            try:
+                path.unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to remove cache file {path}: {e}")
+        return removed
+
+    def prune(self, max_age: Optional[float] = None) -> int:
+        """Remove snapshots whose local input files changed, and those older than ``max_age`` seconds.
+
+        Snapshots whose remote inputs are only older than the TTL are kept;
+        the loader checks them against the registry (see ``epoch_sync``).
+
+        Returns:
+            The number of snapshots removed
+        """
+        now = time.time()
+        pruned = 0
+        for info in self.entries():
+            if self.expired_inputs(info) is None or (max_age is not None and now - info.created_at >= max_age):
+                self.remove(info.key)
+                pruned += 1
+        # Data files left behind by interrupted writes
+        if self._dir.is_dir():
+            for path in self._dir.glob("*.marshal"):
+                if not path.with_suffix(".json").exists():
+                    path.unlink(missing_ok=True)
+        return pruned
+
+    def clear(self) -> int:
+        """Remove all snapshots. Returns the number of files removed."""
+        removed = 0
+        if not self._dir.is_dir():
+            return removed
+        for item in self._dir.iterdir():
+            try:
+                item.unlink()
+                removed += 1
+            except OSError as e:
+                logger.warning(f"Failed to remove cache file {item}: {e}")
+        return removed
+
+    @staticmethod
+    def _read_info(path: Path) -> Optional[SnapshotInfo]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return SnapshotInfo(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
@@ -0,0 +1,233 @@
+"""
+On-disk caches of compiled Jinja templates.
+
+Templates are lexed, parsed and compiled to Python before they can be
+rendered. Two caches below the platform cache directory skip that work:
+
+- ``templates/bytecode/<key>.cache`` – the compiled code of single templates,
+  written as they are loaded. The key is derived from the template name, its
+  path and modification time, and the tool and Jinja versions; Jinja also
+  checks the source checksum and the Python version before using an entry.
+- ``templates/bundles/<key>.zip``   – precompiled template directories
+  (``xregistry templates compile``): one compiled Python module per template
+  and a manifest of the template files with their sizes and modification
+  times. The key is derived from the directories, the tool and Jinja
+  versions and the Python bytecode version. A bundle is
+  used only while the directories hold exactly the recorded files; templates
+  it does not hold are loaded from the directories.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import importlib.util
+import logging
+import marshal
+import os
+import struct
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import jinja2
+from jinja2.bccache import Bucket
+
+from .._version import __version__
+from .config import config_manager
+from .http_cache import write_atomic
+
+
+logger = logging.getLogger(__name__)
+
+#: Version of the cache layout; part of every key
+TEMPLATE_CACHE_FORMAT = 1
+
+
+def template_files(template_dirs: Sequence[str]) -> Dict[str, List[int]]:
+    """List the template files below the directories with their size and modification time.
+
+    Files are named by the index of their directory and their relative path.
+    """
+    files: Dict[str, List[int]] = {}
+    for index, template_dir in enumerate(template_dirs):
+        for root, _, names in os.walk(template_dir, followlinks=True):
+            for name in names:
+                if ".jinja" not in name:
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                relpath = os.path.relpath(path, template_dir).replace("\\", "/")
+                files[f"{index}/{relpath}"] = [stat.st_size, stat.st_mtime_ns]
+    return files
+
+
+class TemplateBytecodeCache(jinja2.BytecodeCache):
+    """Jinja bytecode cache keyed by template path, modification time and tool version."""
+
+    def __init__(self, cache_dir: Path) -> None:
+        self._dir = cache_dir
+
+    def get_cache_key(self, name: str, filename: Optional[str] = None) -> str:
+        mtime = None
+        if filename:
+            try:
+                mtime = os.stat(filename).st_mtime_ns
+            except OSError:
+                pass
+        material = json.dumps([TEMPLATE_CACHE_FORMAT, __version__, jinja2.__version__, name,
+                               os.path.abspath(filename) if filename else None, mtime])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def load_bytecode(self, bucket: Bucket) -> None:
+        try:
+            with open(self._dir / f"{bucket.key}.cache", "rb") as f:
+                bucket.load_bytecode(f)
+        except OSError:
+            pass
+
+    def dump_bytecode(self, bucket: Bucket) -> None:
+        data = io.BytesIO()
+        bucket.write_bytecode(data)
+        try:
+            write_atomic(self._dir / f"{bucket.key}.cache", data.getvalue())
+        except OSError as e:
+            # A cache that cannot be written only costs the compile next time
+            logger.debug(f"Failed to write template cache entry {bucket.key}: {e}")
+
+
+class TemplateBundleLoader(jinja2.ModuleLoader):
+    """Loads templates from a precompiled bundle.
+
+    Sources are read from the template directories the bundle was compiled
+    from, for the tools that analyze templates.
+    """
+
+    has_source_access = True
+
+    def __init__(self, path: str, template_dirs: Sequence[str]) -> None:
+        super().__init__(path)
+        self.files = jinja2.FileSystemLoader(list(template_dirs), followlinks=True)
+
+    def get_source(self, environment: jinja2.Environment, template: str) -> Tuple[str, Optional[str], Any]:
+        return self.files.get_source(environment, template)
+
+    def list_templates(self) -> List[str]:
+        return self.files.list_templates()
+
+
+class TemplateCache:
+    """Caches compiled templates across runs."""
+
+    def __init__(self, cache_dir: Optional[Path] = None) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Root directory of the cache. Defaults to ``templates``
+                       below the platform cache directory.
+        """
+        self._dir = Path(cache_dir) if cache_dir else config_manager.cache_dir / "templates"
+        self.bytecode = TemplateBytecodeCache(self._dir / "bytecode")
+
+    @property
+    def cache_dir(self) -> Path:
+        """Get the cache root directory."""
+        return self._dir
+
+    @staticmethod
+    def bundle_key(template_dirs: Sequence[str]) -> str:
+        """Compute the key of the bundle of a list of template directories."""
+        material = json.dumps({
+            "format": TEMPLATE_CACHE_FORMAT,
+            "version": __version__,
+            "jinja": jinja2.__version__,
+            "python": importlib.util.MAGIC_NUMBER.hex(),
+            "dirs": [os.path.realpath(d) for d in template_dirs],
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def bundle_path(self, template_dirs: Sequence[str]) -> Path:
+        """Get the path of the bundle of a list of template directories."""
+        return self._dir / "bundles" / f"{self.bundle_key(template_dirs)}.zip"
+
+    def loader(self, template_dirs: Sequence[str]) -> jinja2.BaseLoader:
+        """Create the loader for a list of template directories, using their bundle if it is current."""
+        files = jinja2.FileSystemLoader(list(template_dirs), followlinks=True)
+        path = self.bundle_path(template_dirs)
+        manifest = self._read_manifest(path)
+        if manifest is None:
+            return files
+        if manifest.get("files") != template_files(template_dirs):
+            logger.info(f"Templates changed since {path} was compiled; loading them from the directories")
+            return files
+        return jinja2.ChoiceLoader([TemplateBundleLoader(str(path), template_dirs), files])
+
+    def compile(self, env: jinja2.Environment, template_dirs: Sequence[str]) -> Tuple[Path, int]:
+        """Precompile the templates of a list of directories into their bundle.
+
+        Args:
+            env: The environment the templates are rendered with
+            template_dirs: The directories ``env`` loads templates from
+
+        Returns:
+            The path of the bundle and the number of templates it holds
+        """
+        files = template_files(template_dirs)
+        loader = jinja2.FileSystemLoader(list(template_dirs), followlinks=True)
+        data = io.BytesIO()
+        count = 0
+        with zipfile.ZipFile(data, "w", zipfile.ZIP_DEFLATED) as bundle:
+            for name in loader.list_templates():
+                if ".jinja" not in os.path.basename(name):
+                    continue
+                source, filename, _ = loader.get_source(env, name)
+                try:
+                    code = env.compile(source, name, filename, raw=True, defer_init=True)
+                except jinja2.TemplateSyntaxError as err:
+                    raise ValueError(f"{name} ({err.lineno}): {err}") from err
+                # Compiled modules, so importing them skips compiling the Python source as well
+                module = marshal.dumps(compile(code, filename or name, "exec"))
+                header = importlib.util.MAGIC_NUMBER + struct.pack("<III", 0, 0, len(code))
+                bundle.writestr(jinja2.ModuleLoader.get_module_filename(name) + "c", header + module)
+                count += 1
+            bundle.writestr("manifest.json", json.dumps({
+                "format": TEMPLATE_CACHE_FORMAT,
+                "version": __version__,
+                "dirs": [os.path.realpath(d) for d in template_dirs],
+                "files": files,
+            }, indent=1))
+        path = self.bundle_path(template_dirs)
+        write_atomic(path, data.getvalue())
+        return path, count
+
+    def usage(self) -> Tuple[int, int, int]:
+        """Return the number of bytecode entries and bundles and their size in bytes."""
+        entries = list((self._dir / "bytecode").glob("*.cache")) if (self._dir / "bytecode").is_dir() else []
+        bundles = list((self._dir / "bundles").glob("*.zip")) if (self._dir / "bundles").is_dir() else []
+        return len(entries), len(bundles), sum(item.stat().st_size for item in entries + bundles)
+
+    def clear(self) -> int:
+        """Remove all compiled templates and bundles. Returns the number of files removed."""
+        removed = 0
+        for sub, pattern in (("bytecode", "*.cache"), ("bundles", "*.zip")):
+            directory = self._dir / sub
+            if not directory.is_dir():
+                continue
+            for item in directory.glob(pattern):
+                try:
+                    item.unlink()
+                    removed += 1
+                except OSError as e:
+                    logger.warning(f"Failed to remove cache file {item}: {e}")
+        return removed
+
+    @staticmethod
+    def _read_manifest(path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with zipfile.ZipFile(path) as bundle:
+                manifest = json.loads(bundle.read("manifest.json"))
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            return None
+        return manifest if isinstance(manifest, dict) and manifest.get("format") == TEMPLATE_CACHE_FORMAT else None
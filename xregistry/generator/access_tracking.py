@@ -0,0 +1,318 @@
+""" Tracking of the document parts templates read """
+
+import copy
+import functools
+import hashlib
+import inspect
+import json
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import jinja2
+
+#: Kinds of reads, each covering the ones before it:
+#: ``value`` – the node at a pointer: a scalar's value, or only that a mapping
+#: or list is there (or that nothing is)
+#: ``keys``  – the keys of a mapping in their order, or the length of a list
+#: ``tree``  – everything below the pointer
+READ_VALUE, READ_KEYS, READ_TREE = "value", "keys", "tree"
+READ_KINDS = (READ_VALUE, READ_KEYS, READ_TREE)
+
+#: Filters that are given the tracked document and read it through the
+#: mapping and list protocols, so their reads are recorded one by one. Other
+#: filters, tests and globals get the plain document and are recorded as
+#: reading everything below the nodes passed to them.
+TRACKED_FILTERS = frozenset({
+    "length", "count", "first", "last", "default", "d", "list", "items", "dictsort", "sort",
+    "selectattr", "rejectattr", "map", "exists", "existswithout", "schema_type"})
+TRACKED_TESTS = frozenset({
+    "defined", "undefined", "none", "mapping", "sequence", "iterable", "string", "number",
+    "boolean", "true", "false", "integer", "float", "callable"})
+TRACKED_GLOBALS = frozenset({"schema_object", "latest_dict_entry"})
+
+_MISSING = object()
+
+
+def child_pointer(pointer: str, key: Any) -> str:
+    """Return the JSON pointer of a child node."""
+    return f"{pointer}/{str(key).replace('~', '~0').replace('/', '~1')}"
+
+
+def resolve(document: Any, pointer: str) -> Any:
+    """Return the node at a JSON pointer, or a marker if there is none."""
+    node = document
+    if not pointer:
+        return node
+    for token in pointer.split("/")[1:]:
+        token = token.replace("~1", "/").replace("~0", "~")
+        if isinstance(node, dict):
+            if token not in node:
+                return _MISSING
+            node = node[token]
+        elif isinstance(node, list):
+            if not token.isdigit() or int(token) >= len(node):
+                return _MISSING
+            node = node[int(token)]
+        else:
+            return _MISSING
+    return node
+
+
+def read_digest(document: Any, pointer: str, kind: str, tree_digest: Callable[[Any], bytes]) -> str:
+    """Digest what a read of a kind sees at a pointer of a document."""
+    node = resolve(document, pointer)
+    if node is _MISSING:
+        return "missing"
+    if kind == READ_TREE:
+        return tree_digest(node).hex()
+    if isinstance(node, dict):
+        if kind == READ_KEYS:
+            return hashlib.sha256(json.dumps(list(node.keys()), default=str).encode("utf-8")).hexdigest()
+        return "dict"
+    if isinstance(node, list):
+        return f"list:{len(node)}" if kind == READ_KEYS else "list"
+    return hashlib.sha256(json.dumps(node, default=repr).encode("utf-8")).hexdigest()
+
+
+class AccessRecorder:
+    """Records the reads of a render from its document, by JSON pointer relative to the document."""
+
+    def __init__(self) -> None:
+        self._reads: Dict[str, int] = {}
+        self._wrappers: Dict[Tuple[int, str], Any] = {}
+
+    def read(self, pointer: str, kind: str) -> None:
+        """Record a read. A pointer keeps the widest kind it was read with."""
+        rank = READ_KINDS.index(kind)
+        if self._reads.get(pointer, -1) < rank:
+            self._reads[pointer] = rank
+
+    def track(self, node: Any, pointer: str = "") -> Any:
+        """Wrap a document node so reads from it are recorded. Scalars are returned as they are."""
+        if isinstance(node, (TrackedDict, TrackedList)) or not isinstance(node, (dict, list)):
+            return node
+        key = (id(node), pointer)
+        wrapper = self._wrappers.get(key)
+        if wrapper is None:
+            wrapper = TrackedDict(node) if isinstance(node, dict) else TrackedList(node)
+            wrapper._tracking_node = node
+            wrapper._tracking_recorder = self
+            wrapper._tracking_pointer = pointer
+            self._wrappers[key] = wrapper
+        return wrapper
+
+    def child(self, node: Any, pointer: str) -> Any:
+        """Record the read of a child node and wrap it."""
+        self.read(pointer, READ_VALUE)
+        return self.track(node, pointer)
+
+    def reads(self) -> Dict[str, str]:
+        """Return the recorded reads, without the ones below pointers read as a whole."""
+        result: Dict[str, str] = {}
+        covered: Optional[List[str]] = None
+        for tokens in sorted(pointer.split("/") for pointer in self._reads):
+            if covered is not None and tokens[:len(covered)] == covered:
+                continue
+            pointer = "/".join(tokens)
+            kind = READ_KINDS[self._reads[pointer]]
+            result[pointer] = kind
+            if kind == READ_TREE:
+                covered = tokens
+        return result
+
+
+def untrack(value: Any) -> Any:
+    """Return the plain document for a tracked node, recording that all of it was read.
+
+    Lists, tuples and dicts holding tracked nodes are copied with plain ones.
+    """
+    if isinstance(value, (TrackedDict, TrackedList)):
+        value._tracking_recorder.read(value._tracking_pointer, READ_TREE)
+        return value._tracking_node
+    if type(value) in (list, tuple):
+        items = [untrack(item) for item in value]
+        if any(a is not b for a, b in zip(items, value)):
+            return type(value)(items)
+    elif type(value) is dict:
+        entries = {key: untrack(item) for key, item in value.items()}
+        if any(entries[key] is not item for key, item in value.items()):
+            return entries
+    return value
+
+
+def plain(value: Any) -> Any:
+    """Return the plain document node of a tracked node, without recording a read."""
+    return value._tracking_node if isinstance(value, (TrackedDict, TrackedList)) else value
+
+
+def untracking(func: Callable) -> Callable:
+    """Wrap a filter, test or global to be called with plain documents."""
+    @functools.wraps(func)
+    def call(*args: Any, **kwargs: Any) -> Any:
+        return func(*[untrack(arg) for arg in args], **{key: untrack(arg) for key, arg in kwargs.items()})
+    return call
+
+
+@functools.lru_cache(maxsize=None)
+def plain_undefined(undefined: type) -> type:
+    """Return a subclass of an ``Undefined`` class that names tracked nodes by their plain types.
+
+    Errors about missing members then read ``'dict object' has no attribute``,
+    as they do for untracked renders.
+    """
+    class PlainUndefined(undefined):  # type: ignore
+        __slots__ = ()
+
+        def __init__(self, hint: Optional[str] = None, obj: Any = jinja2.utils.missing, name: Optional[str] = None,
+                     exc: type = jinja2.UndefinedError) -> None:
+            super().__init__(hint, plain(obj), name, exc)
+
+    return PlainUndefined
+
+
+def enable_tracking(env: jinja2.Environment) -> None:
+    """Make the filters, tests, globals and undefined values of an environment work with tracked documents."""
+    env.undefined = plain_undefined(env.undefined)
+    for name, func in list(env.filters.items()):
+        if name not in TRACKED_FILTERS:
+            env.filters[name] = untracking(func)
+    for name, func in list(env.tests.items()):
+        if name not in TRACKED_TESTS:
+            env.tests[name] = untracking(func)
+    for name, value in list(env.globals.items()):
+        if name not in TRACKED_GLOBALS and (inspect.isfunction(value) or inspect.ismethod(value)):
+            env.globals[name] = untracking(value)
+
+
+class TrackedDict(dict):
+    """A document mapping that records the reads from it.
+
+    It holds the entries of the mapping it wraps, so code reading it like a
+    plain dict sees the same content; values are wrapped as they are read.
+    """
+
+    __slots__ = ("_tracking_node", "_tracking_recorder", "_tracking_pointer")
+    __hash__ = None  # type: ignore
+
+    def _read(self, kind: str) -> None:
+        self._tracking_recorder.read(self._tracking_pointer, kind)
+
+    def __getitem__(self, key: Any) -> Any:
+        pointer = child_pointer(self._tracking_pointer, key)
+        if not dict.__contains__(self, key):
+            self._tracking_recorder.read(pointer, READ_VALUE)
+        return self._tracking_recorder.child(dict.__getitem__(self, key), pointer)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        if not dict.__contains__(self, key):
+            self._tracking_recorder.read(child_pointer(self._tracking_pointer, key), READ_VALUE)
+            return default
+        return self[key]
+
+    def __contains__(self, key: Any) -> bool:
+        self._tracking_recorder.read(child_pointer(self._tracking_pointer, key), READ_VALUE)
+        return dict.__contains__(self, key)
+
+    def __iter__(self) -> Iterator[Any]:
+        self._read(READ_KEYS)
+        return dict.__iter__(self)
+
+    def __reversed__(self) -> Iterator[Any]:
+        self._read(READ_KEYS)
+        return dict.__reversed__(self)
+
+    def __len__(self) -> int:
+        self._read(READ_KEYS)
+        return dict.__len__(self)
+
+    def keys(self) -> Any:
+        self._read(READ_KEYS)
+        return dict.keys(self)
+
+    def values(self) -> Any:
+        return [self[key] for key in self.keys()]
+
+    def items(self) -> Any:
+        return [(key, self[key]) for key in self.keys()]
+
+    def copy(self) -> Dict[Any, Any]:
+        return dict.copy(untrack(self))
+
+    def __copy__(self) -> Dict[Any, Any]:
+        return self.copy()
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> Dict[Any, Any]:
+        return copy.deepcopy(untrack(self), memo)
+
+    def __eq__(self, other: Any) -> bool:
+        return untrack(self) == untrack(other)
+
+    def __ne__(self, other: Any) -> bool:
+        return not self == other
+
+    def __repr__(self) -> str:
+        return repr(untrack(self))
+
+
+class TrackedList(list):
+    """A document list that records the reads from it; see ``TrackedDict``."""
+
+    __slots__ = ("_tracking_node", "_tracking_recorder", "_tracking_pointer")
+    __hash__ = None  # type: ignore
+
+    def _read(self, kind: str) -> None:
+        self._tracking_recorder.read(self._tracking_pointer, kind)
+
+    def _item(self, index: int) -> Any:
+        return self._tracking_recorder.child(list.__getitem__(self, index), child_pointer(self._tracking_pointer, index))
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [self._item(i) for i in range(*index.indices(len(self)))]
+        if not 0 <= index < list.__len__(self):
+            # Negative and out of range indexes depend on the length
+            self._read(READ_KEYS)
+            list.__getitem__(self, index)
+            index %= list.__len__(self)
+        return self._item(index)
+
+    def __iter__(self) -> Iterator[Any]:
+        self._read(READ_KEYS)
+        return (self._item(i) for i in range(list.__len__(self)))
+
+    def __reversed__(self) -> Iterator[Any]:
+        self._read(READ_KEYS)
+        return (self._item(i) for i in reversed(range(list.__len__(self))))
+
+    def __len__(self) -> int:
+        self._read(READ_KEYS)
+        return list.__len__(self)
+
+    def __contains__(self, value: Any) -> bool:
+        return untrack(value) in untrack(self)
+
+    def index(self, value: Any, *args: Any) -> int:
+        return untrack(self).index(untrack(value), *args)
+
+    def count(self, value: Any) -> int:
+        return untrack(self).count(untrack(value))
+
+    def __add__(self, other: Any) -> List[Any]:
+        return list(self) + other
+
+    def copy(self) -> List[Any]:
+        return list.copy(untrack(self))
+
+    def __copy__(self) -> List[Any]:
+        return self.copy()
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> List[Any]:
+        return copy.deepcopy(untrack(self), memo)
+
+    def __eq__(self, other: Any) -> bool:
+        return untrack(self) == untrack(other)
+
+    def __ne__(self, other: Any) -> bool:
+        return not self == other
+
+    def __repr__(self) -> str:
+        return repr(untrack(self))
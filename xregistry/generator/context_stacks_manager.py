@@ -12,6 +12,11 @@ class ContextStacksManager:
         self.current_dir: str = current_dir
         logger.debug("Initialized ContextManager")
 
+    def clear(self) -> None:
+        """Remove all stacks and saved values."""
+        self.context_stacks.clear()
+        self.context_dict.clear()
+
     def push(self, value: Any, stack_name: str) -> str:
         """Push a value onto a named stack."""
         logger.debug("Pushing value: %s onto stack: %s", value, stack_name)
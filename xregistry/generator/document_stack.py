@@ -0,0 +1,70 @@
+""" Copy-on-write stacking of xRegistry documents """
+
+from typing import Any, Dict
+
+from ..common.model import ModelIndex
+
+
+class DocumentStack:
+    """Stacks xRegistry documents, with later documents shadowing earlier ones.
+
+    Pushing a document merges it into the stacked document:
+
+    - Top-level keys of the pushed document replace those of the stack
+    - Within collections (messagegroups, schemagroups, endpoints, ...), groups
+      are merged by ID; a group present on both sides is merged key by key,
+      and within it, resource collections (messages, schemas, ...) are merged
+      by resource ID
+    - Everything else (groups new to the stack, resources, other group
+      attributes) is taken over as is
+
+    Containers (the document, collections, groups and resource collections)
+    are copied the first time a pushed document writes into them; the stack
+    writes into its own copies in place afterwards. Containers no pushed
+    document touches stay shared with the document they came from, so the
+    cost of a push scales with the pushed document, not with the stack. The
+    input documents are never modified.
+    """
+
+    def __init__(self, model_index: ModelIndex, base: Dict[str, Any]):
+        self.model_index = model_index
+        self.document = base
+        # The containers this stack created, by identity (holding them keeps the IDs unique)
+        self._owned: Dict[int, Dict[str, Any]] = {}
+
+    def _writable(self, node: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the node if the stack owns it, otherwise the stack's own copy of it."""
+        if id(node) in self._owned:
+            return node
+        copy = dict(node)
+        self._owned[id(copy)] = copy
+        return copy
+
+    def push(self, overlay: Dict[str, Any]) -> 'DocumentStack':
+        """Merge a document into the stack, shadowing what is stacked so far."""
+        result = self.document = self._writable(self.document)
+        for key, value in overlay.items():
+            if key in self.model_index.group_plurals and isinstance(value, dict) and isinstance(result.get(key), dict):
+                # This is an xRegistry collection (e.g., messagegroups, schemagroups)
+                collection = result[key] = self._writable(result[key])
+                resource_collection_names = self.model_index.collections(key)
+                for group_id, group_data in value.items():
+                    if group_id in collection and isinstance(group_data, dict) and isinstance(collection[group_id], dict):
+                        # This group exists in both - merge the group contents
+                        group = collection[group_id] = self._writable(collection[group_id])
+                        for group_key, group_value in group_data.items():
+                            if (group_key in resource_collection_names and isinstance(group_value, dict)
+                                    and isinstance(group.get(group_key), dict)):
+                                # Resource collection (e.g., messages, schemas) - merge resources by ID
+                                resources = group[group_key] = self._writable(group[group_key])
+                                resources.update(group_value)
+                            else:
+                                # Not a resource collection - replace completely
+                                group[group_key] = group_value
+                    else:
+                        # Group doesn't exist in the stack or types don't match - replace completely
+                        collection[group_id] = group_data
+            else:
+                # Not a collection or types don't match - replace completely
+                result[key] = value
+        return self
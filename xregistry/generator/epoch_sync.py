@@ -0,0 +1,162 @@
+""" Epoch-based re-synchronization of cached documents with their registries """
+
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+from ..common.snapshot_cache import SnapshotInfo
+
+if TYPE_CHECKING:
+    from .xregistry_loader import XRegistryLoader
+
+
+def entity_version(entity: Any) -> Optional[List[Any]]:
+    """Return what identifies the state of a registry entity: ``[epoch, modifiedat]``, or None."""
+    if isinstance(entity, dict) and isinstance(entity.get("epoch"), int):
+        return [entity["epoch"], entity.get("modifiedat")]
+    return None
+
+
+def split_registry_url(url: str, group_types: Sequence[str]) -> Optional[Tuple[str, Optional[str], List[str]]]:
+    """Split a registry URL into the registry root, the group type and the path below it.
+
+    The root is everything before the first path segment naming a group type,
+    so roots below a path prefix (``https://host/registry``) are kept whole.
+    Query and fragment are ignored. URLs without a group type segment are
+    registry roots. Returns None for URLs that are not HTTP(S).
+    """
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.netloc:
+        return None
+    parts = [p for p in parsed.path.split("/") if p]
+    for i, part in enumerate(parts):
+        if part in group_types:
+            root = f"{parsed.scheme}://{parsed.netloc}" + "".join("/" + p for p in parts[:i])
+            return root, part, parts[i + 1:]
+    return f"{parsed.scheme}://{parsed.netloc}" + "".join("/" + p for p in parts), None, []
+
+
+def entity_versions(request_url: str, document: Any, group_types: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    """Record the versions of the groups a fetched document holds.
+
+    - A group instance (``/messagegroups/A``) records its own version.
+    - A group type collection (``/messagegroups``) or a registry root records
+      the versions of all groups it holds, and the IDs of the groups of each
+      collection, so that added and removed groups are noticed as well.
+
+    Resources and other documents record nothing; they are checked by
+    revalidating them.
+
+    Returns:
+        Keyword arguments for ``remote_input``: ``entities`` and ``members``
+    """
+    parts = split_registry_url(request_url, group_types)
+    if parts is None or not isinstance(document, dict):
+        return {}
+    root, group_type, below = parts
+    entities: Dict[str, List[Any]] = {}
+    members: Dict[str, List[str]] = {}
+    if group_type and len(below) == 1:
+        version = entity_version(document)
+        if version is not None:
+            entities[f"{root}/{group_type}/{below[0]}"] = version
+    elif not below:
+        collections = {group_type: document} if group_type else {
+            name: document[name] for name in group_types if isinstance(document.get(name), dict)}
+        for name, groups in collections.items():
+            ids = sorted(group_id for group_id, group in groups.items() if isinstance(group, dict))
+            for group_id in ids:
+                version = entity_version(groups[group_id])
+                if version is None:
+                    # Without versions, changes cannot be told from the collection
+                    return {}
+                entities[f"{root}/{name}/{group_id}"] = version
+            members[f"{root}/{name}"] = ids
+    return {"entities": entities, "members": members} if entities or members else {}
+
+
+class EpochSync:
+    """Checks the expired remote inputs of a snapshot against the registry.
+
+    Remote inputs that hold groups (group instances, group type collections,
+    registry roots) are checked with one lightweight request per group type:
+    ``GET <root>/<grouptype>`` lists the groups with their ``epoch`` and
+    ``modifiedat`` but without their resources. An input is unchanged if
+    all groups it held still have the recorded versions (and, for
+    collections, no group was added or removed). This relies on the registry
+    increasing the epoch of a group when its resources change.
+
+    All other inputs (resources, schema documents referenced by URL) are
+    revalidated with a conditional request and compared by content hash.
+
+    Inputs found unchanged are marked fresh in the HTTP cache, so a load that
+    follows is served from the cache for them and only fetches the documents
+    of the groups that changed.
+    """
+
+    def __init__(self, loader: 'XRegistryLoader'):
+        self.loader = loader
+
+    def check(self, info: SnapshotInfo, names: Sequence[str],
+              headers: Dict[str, str]) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        """Check the given inputs of a snapshot.
+
+        Returns:
+            The unchanged inputs (as recorded, fetched now) and the names of
+            the changed ones
+        """
+        http_cache = self.loader.http_cache
+        listing_urls = sorted({url for name in names for url in self._listing_urls(info.inputs[name])})
+        revalidate = [name for name in names
+                      if "entities" not in info.inputs[name] and "members" not in info.inputs[name]]
+        requests = listing_urls + revalidate
+        fetched: Dict[str, Any] = {}
+        if requests:
+            max_workers = min(self.loader.dependency_resolver.max_concurrency, len(requests))
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                fetched = dict(zip(requests, pool.map(
+                    lambda url: self.loader._fetch_document(url, headers, optional=True), requests)))
+
+        now = time.time()
+        unchanged: Dict[str, Dict[str, Any]] = {}
+        changed: List[str] = []
+        for name in names:
+            recorded = info.inputs[name]
+            cache_headers = self.loader.cache_headers(name, headers)
+            cached = http_cache.lookup(name, cache_headers) if http_cache else None
+            content_hash = cached[0].content_hash if cached else None
+            if name in fetched:
+                current = content_hash == recorded.get("content_hash")
+            else:
+                current = (self._listed_unchanged(recorded, fetched)
+                           and (cached is None or content_hash == recorded.get("content_hash")))
+                if current and cached and http_cache:
+                    http_cache.touch(name, cache_headers, cached[0])
+            if current:
+                unchanged[name] = dict(recorded, fetched_at=now)
+            else:
+                changed.append(name)
+        return unchanged, changed
+
+    @staticmethod
+    def _listing_urls(recorded: Dict[str, Any]) -> List[str]:
+        """The group type collections that list the groups an input held."""
+        urls = [entity.rsplit("/", 1)[0] for entity in recorded.get("entities", {})]
+        return urls + list(recorded.get("members", {}))
+
+    @staticmethod
+    def _listed_unchanged(recorded: Dict[str, Any], listings: Dict[str, Any]) -> bool:
+        """Check the recorded group versions and memberships of an input against the listings."""
+        for entity, version in recorded.get("entities", {}).items():
+            listing_url, group_id = entity.rsplit("/", 1)
+            listing = listings.get(listing_url)
+            if not isinstance(listing, dict) or entity_version(listing.get(group_id)) != version:
+                return False
+        for listing_url, ids in recorded.get("members", {}).items():
+            listing = listings.get(listing_url)
+            if not isinstance(listing, dict):
+                return False
+            if sorted(group_id for group_id, group in listing.items() if isinstance(group, dict)) != ids:
+                return False
+        return True
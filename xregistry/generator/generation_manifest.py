@@ -0,0 +1,263 @@
+""" Manifest of generated files for incremental generation """
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, TypeVar, Union
+
+from xregistry.cli import logger
+from .._version import __version__
+from ..common.http_cache import write_atomic
+from ..common.snapshot_cache import file_input
+from .access_tracking import read_digest
+
+#: Name of the manifest in the output directory
+MANIFEST_NAME = ".xregistry-gen.json"
+
+#: Version of the manifest layout
+MANIFEST_FORMAT = 1
+
+T = TypeVar('T')
+
+
+class DocumentHasher:
+    """Hashes document subtrees, each shared node once.
+
+    Subtrees are hashed in their key order, since templates iterate them in
+    that order. Nodes are memoized by identity, so hashing the scopes of many
+    templates that share the same groups costs one pass over the document;
+    the hashed document must not change while the hasher is in use. The
+    hasher keeps the nodes it hashed alive, so their identities are not
+    reused.
+    """
+
+    def __init__(self) -> None:
+        self._memo: Dict[int, Tuple[Any, bytes]] = {}
+
+    def digest(self, node: Any) -> bytes:
+        """Return the hash of a node and everything below it."""
+        if isinstance(node, (dict, list, tuple)):
+            if id(node) not in self._memo:
+                # A placeholder ends cycles
+                self._memo[id(node)] = (node, b"cycle")
+                if isinstance(node, dict):
+                    h = hashlib.sha256(b"{")
+                    for key, value in node.items():
+                        h.update(json.dumps(key, default=str).encode("utf-8"))
+                        h.update(self.digest(value))
+                else:
+                    h = hashlib.sha256(b"[")
+                    for item in node:
+                        h.update(self.digest(item))
+                self._memo[id(node)] = (node, h.digest())
+            return self._memo[id(node)][1]
+        return hashlib.sha256(json.dumps(node, default=repr).encode("utf-8")).digest()
+
+
+class GenerationManifest:
+    """Records what a generation wrote into an output directory, for the next generation into it.
+
+    ``.xregistry-gen.json`` in the output directory holds:
+
+    - ``files``  – every file written, by path relative to the output
+      directory, with its content hash, size and modification time
+    - ``renders`` – every render (a template into a file, a schema
+      conversion), by key, with the fingerprint of its inputs (the template
+      sources, the arguments, the tool version), the files it wrote, the
+      local files it loaded, what it pushed onto the context stacks and the
+      parts of its document it read (``reads``, JSON pointers relative to
+      the document with the kind of read, and their combined digest)
+
+    A render whose fingerprint, loaded files and read document parts are
+    unchanged and whose output files are as they were written is not run
+    again; what it pushed is replayed instead. Renders that cannot record
+    their reads have the whole document in their fingerprint. Files are only written when their content changed,
+    so their modification times stay as they were for downstream builds.
+    """
+
+    def __init__(self, output_dir: str, full: bool = False) -> None:
+        """
+        Args:
+            output_dir: The output directory of the generation
+            full: Run every render again instead of skipping unchanged ones
+        """
+        self.output_dir = output_dir
+        self.path = Path(output_dir) / MANIFEST_NAME
+        self.hasher = DocumentHasher()
+        self._read_digests: Dict[Tuple[int, str, str], Tuple[Any, str]] = {}
+        self.previous: Dict[str, Any] = {} if full else self._read()
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.renders: Dict[str, Dict[str, Any]] = {}
+        self.skipped = 0
+        self.rendered = 0
+        self.written = 0
+        self.unchanged = 0
+
+    def fingerprint(self, *parts: Any, document: Any = None) -> Optional[str]:
+        """Fingerprint the inputs of a render: JSON-serializable parts and a document subtree.
+
+        Returns None if a part cannot be fingerprinted reliably.
+        """
+        try:
+            material = json.dumps([MANIFEST_FORMAT, __version__, list(parts)], sort_keys=True)
+        except (TypeError, ValueError):
+            return None
+        h = hashlib.sha256(material.encode("utf-8"))
+        h.update(self.hasher.digest(document))
+        return h.hexdigest()
+
+    def lookup(self, key: str, fingerprint: Optional[str], document: Any = None) -> Optional[Dict[str, Any]]:
+        """Return the recorded render if it need not run again, and keep it in this manifest."""
+        record = self.previous.get("renders", {}).get(key)
+        if fingerprint is None or not isinstance(record, dict) or record.get("fingerprint") != fingerprint:
+            return None
+        reads = record.get("reads")
+        if isinstance(reads, dict) and self.reads_digest(document, reads) != record.get("reads_digest"):
+            return None
+        if any(file_input(path) != recorded for path, recorded in record.get("inputs", {}).items()):
+            return None
+        previous_files = self.previous.get("files", {})
+        for relpath in record.get("outputs", []):
+            recorded = previous_files.get(relpath)
+            if not recorded or not self._unchanged(relpath, recorded):
+                return None
+        self.renders[key] = record
+        for relpath in record.get("outputs", []):
+            self.files[relpath] = previous_files[relpath]
+        self.skipped += 1
+        return record
+
+    def record(self, key: str, fingerprint: Optional[str], outputs: List[str],
+               effects: Optional[Dict[str, Any]] = None, inputs: Optional[Mapping[str, Dict[str, Any]]] = None,
+               reads: Optional[Dict[str, str]] = None, document: Any = None) -> None:
+        """Record a render that ran.
+
+        Renders without a fingerprint and renders that loaded remote
+        documents are recorded without one, so they run again.
+        """
+        self.rendered += 1
+        inputs = inputs or {}
+        if any(not os.path.isabs(name) for name in inputs):
+            fingerprint = None
+        record: Dict[str, Any] = {"fingerprint": fingerprint, "outputs": [self.relpath(path) for path in outputs],
+                                  "inputs": dict(inputs), "effects": effects or {}}
+        if reads is not None:
+            record["reads"] = reads
+            record["reads_digest"] = self.reads_digest(document, reads)
+        try:
+            json.dumps(record)
+        except (TypeError, ValueError):
+            # What it pushed cannot be replayed from the manifest
+            self.renders.pop(key, None)
+            return
+        self.renders[key] = record
+
+    def reads_digest(self, document: Any, reads: Mapping[str, str]) -> str:
+        """Digest what the reads of a render see in a document."""
+        h = hashlib.sha256()
+        for pointer, kind in sorted(reads.items()):
+            memo_key = (id(document), pointer, kind)
+            if memo_key not in self._read_digests:
+                self._read_digests[memo_key] = (document, read_digest(document, pointer, kind, self.hasher.digest))
+            h.update(json.dumps([pointer, kind, self._read_digests[memo_key][1]]).encode("utf-8"))
+        return h.hexdigest()
+
+    def write(self, path: str, content: Union[str, bytes]) -> bool:
+        """Write a file if its content changed. Returns whether it was written."""
+        if isinstance(content, str):
+            # As a file opened for writing text would
+            data = (content.replace("\n", os.linesep) if os.linesep != "\n" else content).encode("utf-8")
+        else:
+            data = content
+        digest = hashlib.sha256(data).hexdigest()
+        try:
+            with open(path, "rb") as f:
+                current = hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            current = None
+        if current != digest:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+            self.written += 1
+        else:
+            self.unchanged += 1
+        stat = os.stat(path)
+        self.files[self.relpath(path)] = {"sha256": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        return current != digest
+
+    def track(self, directory: str, write: Callable[[], T]) -> T:
+        """Run a tool that writes files below a directory and record the files it wrote.
+
+        Files the tool rewrote with the content they had get their previous
+        modification time back.
+        """
+        before = self._scan(directory)
+        result = write()
+        for path, (size, mtime_ns, atime_ns, digest) in self._scan(directory).items():
+            previous = before.get(path)
+            if previous is not None and previous[1] == mtime_ns:
+                continue
+            if previous is not None and previous[3] == digest:
+                os.utime(path, ns=(atime_ns, previous[1]))
+                mtime_ns = previous[1]
+                self.unchanged += 1
+            else:
+                self.written += 1
+            self.files[self.relpath(path)] = {"sha256": digest, "size": size, "mtime_ns": mtime_ns}
+        return result
+
+    def relpath(self, path: str) -> str:
+        """Name a file by its path relative to the output directory."""
+        return os.path.relpath(os.path.abspath(path), os.path.abspath(self.output_dir)).replace("\\", "/")
+
+    def save(self) -> None:
+        """Write the manifest into the output directory."""
+        write_atomic(self.path, json.dumps({
+            "format": MANIFEST_FORMAT,
+            "version": __version__,
+            "generated_at": time.time(),
+            "files": dict(sorted(self.files.items())),
+            "renders": dict(sorted(self.renders.items())),
+        }, indent=1).encode("utf-8"))
+
+    def summary(self) -> str:
+        """Return a one-line summary."""
+        return (f"Renders: {self.rendered} run, {self.skipped} skipped as unchanged; "
+                f"files: {self.written} written, {self.unchanged} unchanged")
+
+    def _unchanged(self, relpath: str, recorded: Dict[str, Any]) -> bool:
+        try:
+            stat = os.stat(os.path.join(self.output_dir, relpath))
+        except OSError:
+            return False
+        return stat.st_size == recorded.get("size") and stat.st_mtime_ns == recorded.get("mtime_ns")
+
+    @staticmethod
+    def _scan(directory: str) -> Dict[str, Tuple[int, int, int, str]]:
+        """List the files below a directory with their size, modification and access times and hash."""
+        files: Dict[str, Tuple[int, int, int, str]] = {}
+        for root, _, names in os.walk(directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                    with open(path, "rb") as f:
+                        digest = hashlib.sha256(f.read()).hexdigest()
+                except OSError:
+                    continue
+                files[path] = (stat.st_size, stat.st_mtime_ns, stat.st_atime_ns, digest)
+        return files
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(manifest, dict) or manifest.get("format") != MANIFEST_FORMAT:
+            logger.debug("Ignoring generation manifest %s of another format", self.path)
+            return {}
+        return manifest
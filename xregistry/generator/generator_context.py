@@ -1,7 +1,15 @@
 """Context for the code generator."""
 
+from typing import Dict, Optional, Tuple
+
+import jinja2
+
+from xregistry.common.http_cache import HttpResponseCache
+from xregistry.common.snapshot_cache import SnapshotCache
+from xregistry.common.template_cache import TemplateCache
 from xregistry.generator.context_stacks_manager import ContextStacksManager
-from xregistry.generator.xregistry_loader import XRegistryLoader
+from xregistry.generator.generation_manifest import GenerationManifest
+from xregistry.generator.xregistry_loader import DEFAULT_PREFETCH_THRESHOLD, XRegistryLoader
 
 
 class GeneratorContext:
@@ -14,7 +22,13 @@ class GeneratorContext:
                  language: str = "",
                  project_name: str = "",
                  style: str = "",
-                 output_directory: str = "") -> None:
+                 output_directory: str = "",
+                 http_cache: Optional[HttpResponseCache] = None,
+                 max_concurrency: int = 8,
+                 prefetch_threshold: int = DEFAULT_PREFETCH_THRESHOLD,
+                 snapshot_cache: Optional[SnapshotCache] = None,
+                 template_cache: Optional[TemplateCache] = None,
+                 manifest: Optional[GenerationManifest] = None) -> None:
         self.messagegroup_filter: str = messagegroup_filter
         self.endpoint_filter: str = endpoint_filter
         self.base_uri: str = ""
@@ -25,7 +39,13 @@ class GeneratorContext:
         self.project_name: str = project_name
         self.style: str = style
         self.output_directory: str = output_directory
-        self.loader: XRegistryLoader = XRegistryLoader(model_path)
+        self.loader: XRegistryLoader = XRegistryLoader(model_path, http_cache, max_concurrency,
+                                                        prefetch_threshold=prefetch_threshold,
+                                                        snapshot_cache=snapshot_cache)
+        self.template_cache: Optional[TemplateCache] = template_cache
+        self.manifest: Optional[GenerationManifest] = manifest
+        # Jinja environments by template directories, kept across generations in watch mode
+        self.template_envs: Optional[Dict[Tuple[str, ...], jinja2.Environment]] = None
         self.stacks: ContextStacksManager = ContextStacksManager(self.current_dir)
     
     def set_current_dir(self, current_dir: str) -> None:
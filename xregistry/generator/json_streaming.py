@@ -0,0 +1,107 @@
+""" Event-based JSON loading that skips unwanted group instances """
+
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Set, Tuple
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - optional dependency
+    ijson = None
+
+# (group type, group id) pairs
+GroupKey = Tuple[str, str]
+GroupPredicate = Callable[[str, str], bool]
+
+_START_EVENTS = ("start_map", "start_array")
+_END_EVENTS = ("end_map", "end_array")
+
+
+def is_available() -> bool:
+    """Check whether the optional ``ijson`` package is installed."""
+    return ijson is not None
+
+
+def load_groups(stream: BinaryIO, group_types: Set[str], keep: GroupPredicate) -> Tuple[Any, List[GroupKey]]:
+    """Parse a JSON document from a byte stream, building only the wanted group instances.
+
+    The document is parsed event by event. Members of the top-level group
+    collections (``group_types``) are only built if ``keep(group_type,
+    group_id)`` is true; the events of all other group instances are consumed
+    without creating any objects. Everything else is built as usual.
+
+    Returns:
+        The document and the skipped groups, in document order
+
+    Raises:
+        ValueError: If the stream does not contain valid JSON
+    """
+    try:
+        return _load_groups(ijson.basic_parse(stream, use_float=True), group_types, keep)
+    except (ijson.JSONError, StopIteration) as e:
+        raise ValueError(f"Invalid JSON: {e}") from e
+
+
+def load_members(stream: BinaryIO, prefix: str) -> Iterator[Tuple[str, Any]]:
+    """Iterate over the members of the object at ``prefix`` (e.g. ``endpoints``).
+
+    Raises:
+        ValueError: If the stream does not contain valid JSON
+    """
+    try:
+        yield from ijson.kvitems(stream, prefix, use_float=True)
+    except ijson.JSONError as e:
+        raise ValueError(f"Invalid JSON: {e}") from e
+
+
+def _load_groups(events: Iterator[Tuple[str, Any]], group_types: Set[str],
+                 keep: GroupPredicate) -> Tuple[Any, List[GroupKey]]:
+    event, value = next(events)
+    if event != "start_map":
+        return _build(event, value, events), []
+
+    document: Dict[str, Any] = {}
+    skipped: List[GroupKey] = []
+    for event, key in events:
+        if event == "end_map":
+            break
+        event, value = next(events)
+        if key not in group_types or event != "start_map":
+            document[key] = _build(event, value, events)
+            continue
+        groups: Dict[str, Any] = {}
+        document[key] = groups
+        for event, group_id in events:
+            if event == "end_map":
+                break
+            event, value = next(events)
+            if keep(key, group_id):
+                groups[group_id] = _build(event, value, events)
+            else:
+                _skip(event, events)
+                skipped.append((key, group_id))
+    return document, skipped
+
+
+def _build(event: str, value: Any, events: Iterator[Tuple[str, Any]]) -> Any:
+    if event not in _START_EVENTS:
+        return value
+    builder = ijson.ObjectBuilder()
+    builder.event(event, value)
+    depth = 1
+    while depth:
+        event, value = next(events)
+        builder.event(event, value)
+        if event in _START_EVENTS:
+            depth += 1
+        elif event in _END_EVENTS:
+            depth -= 1
+    return builder.value
+
+
+def _skip(event: str, events: Iterator[Tuple[str, Any]]) -> None:
+    depth = 1 if event in _START_EVENTS else 0
+    while depth:
+        event, _ = next(events)
+        if event in _START_EVENTS:
+            depth += 1
+        elif event in _END_EVENTS:
+            depth -= 1
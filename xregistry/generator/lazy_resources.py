@@ -0,0 +1,161 @@
+""" Lazily resolved entities for resource and collection URLs """
+
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import yaml
+
+_MISSING = object()
+
+
+class LazyEntity(dict):
+    """An entity (schema version, message, group, ...) whose URL-referenced content is fetched on first use.
+
+    The entity holds its own members right away. The members its URL
+    attributes stand for (e.g. ``schema`` for ``schemaurl``, ``messages`` for
+    ``messagesurl``) are added by the ``resolve`` callback, which runs once, the
+    first time they could be needed:
+
+    - a member that is not (yet) present is read or tested for
+      (``entity["schema"]``, ``entity.get("schema")``, ``"schema" in entity``,
+      Jinja's ``entity.schema``)
+    - the entity is enumerated, compared, copied or serialized (``items()``,
+      ``json.dumps``, ``dict(entity)``, ``copy.deepcopy``, ``yaml.dump``)
+
+    Reading members that are present does not resolve the entity. Copies and
+    pickles are plain dicts.
+
+    ``deferred`` describes what the entity defers, so it can be deferred again
+    when the document is restored from a snapshot: ``("group", <group type>)``
+    for the collections of a group, ``("resource", <resource field>)`` for the
+    resource of a version or resource (see ``ResourceResolver.defer``).
+    """
+
+    def __init__(self, entity: Dict[str, Any], resolve: Callable[['LazyEntity'], None],
+                 deferred: Optional[Tuple[str, str]] = None):
+        super().__init__(entity)
+        self._resolve: Optional[Callable[['LazyEntity'], None]] = resolve
+        self.deferred = deferred
+        self._resolving = False
+        self._lock = threading.RLock()
+
+    @property
+    def pending(self) -> bool:
+        """Check whether the content has not been resolved yet."""
+        return self._resolve is not None
+
+    def materialize(self) -> 'LazyEntity':
+        """Resolve the content unless that already happened."""
+        if self._resolve is not None:
+            with self._lock:
+                # The callback itself sees the members present so far
+                if self._resolve is not None and not self._resolving:
+                    self._resolving = True
+                    try:
+                        self._resolve(self)
+                    finally:
+                        self._resolve = None
+                        self._resolving = False
+        return self
+
+    def __missing__(self, key: Any) -> Any:
+        if self._resolve is None:
+            raise KeyError(key)
+        self.materialize()
+        return dict.__getitem__(self, key)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        value = dict.get(self, key, _MISSING)
+        if value is _MISSING and self._resolve is not None:
+            value = dict.get(self.materialize(), key, _MISSING)
+        return default if value is _MISSING else value
+
+    def __contains__(self, key: Any) -> bool:
+        return dict.__contains__(self, key) or (self._resolve is not None and dict.__contains__(self.materialize(), key))
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        if not dict.__contains__(self, key):
+            self.materialize()
+        return dict.setdefault(self, key, default)
+
+    def pop(self, key: Any, *default: Any) -> Any:
+        if not dict.__contains__(self, key):
+            self.materialize()
+        return dict.pop(self, key, *default)
+
+    def __iter__(self) -> Iterator[Any]:
+        return dict.__iter__(self.materialize())
+
+    def __len__(self) -> int:
+        return dict.__len__(self.materialize())
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, LazyEntity):
+            other.materialize()
+        return dict.__eq__(self.materialize(), other)
+
+    def __ne__(self, other: Any) -> bool:
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return dict.__repr__(self.materialize())
+
+    def keys(self):  # type: ignore[override]
+        return dict.keys(self.materialize())
+
+    def values(self):  # type: ignore[override]
+        return dict.values(self.materialize())
+
+    def items(self):  # type: ignore[override]
+        return dict.items(self.materialize())
+
+    def copy(self) -> Dict[str, Any]:  # type: ignore[override]
+        return dict(self.items())
+
+    def __reduce__(self) -> Any:
+        return dict, (dict(self.items()),)
+
+
+def pending_entities(data: Any) -> List[LazyEntity]:
+    """List the unresolved entities in a document without resolving any of them."""
+    pending: List[LazyEntity] = []
+    stack: List[Any] = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if isinstance(node, LazyEntity) and node.pending:
+                pending.append(node)
+            stack.extend(dict.values(node))
+        elif isinstance(node, list):
+            stack.extend(node)
+    return pending
+
+
+def deferred_entities(data: Any) -> List[Tuple[LazyEntity, List[List[Union[str, int]]]]]:
+    """List the unresolved entities in a document with the key paths they occur at, without resolving any of them."""
+    found: Dict[int, Tuple[LazyEntity, List[List[Union[str, int]]]]] = {}
+
+    def walk(node: Any, path: List[Union[str, int]], ancestors: Set[int]) -> None:
+        if not isinstance(node, (dict, list)) or id(node) in ancestors:
+            return
+        if isinstance(node, LazyEntity) and node.pending:
+            found.setdefault(id(node), (node, []))[1].append(path)
+        ancestors.add(id(node))
+        children = dict.items(node) if isinstance(node, dict) else enumerate(node)
+        for key, value in children:
+            walk(value, path + [key], ancestors)
+        ancestors.discard(id(node))
+
+    walk(data, [], set())
+    return list(found.values())
+
+
+def _represent_lazy_entity(dumper: yaml.BaseDumper, data: LazyEntity) -> Any:
+    return dumper.represent_dict(data)
+
+
+yaml.add_representer(LazyEntity, _represent_lazy_entity)
+yaml.add_representer(LazyEntity, _represent_lazy_entity, Dumper=yaml.SafeDumper)
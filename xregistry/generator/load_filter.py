@@ -0,0 +1,136 @@
+""" Pushdown of the --messagegroup/--endpoint filters into loading and resolution """
+
+import re
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+# (group type, group id) pairs
+GroupKey = Tuple[str, str]
+
+# Group types the message group and endpoint filters select from
+FILTERED_GROUP_TYPES = ("messagegroups", "schemagroups")
+
+
+def endpoint_messagegroup_ids(endpoints: Dict[str, Any]) -> Set[str]:
+    """Collect the IDs of the message groups the given endpoints reference."""
+    referenced_messagegroups = set()
+    for endpoint_data in endpoints.values():
+        if isinstance(endpoint_data, dict):
+            # Check for messagegroups at top level
+            messagegroups = endpoint_data.get("messagegroups", [])
+            if isinstance(messagegroups, list):
+                for mg_ref in messagegroups:
+                    if isinstance(mg_ref, str):
+                        # Handle both direct IDs and #/messagegroups/... references
+                        mg_id = mg_ref.split("/")[-1] if "/" in mg_ref else mg_ref
+                        referenced_messagegroups.add(mg_id)
+
+            # Also check for messagegroups in config (alternative structure)
+            config = endpoint_data.get("config", {})
+            if isinstance(config, dict):
+                config_messagegroups = config.get("messagegroups", [])
+                if isinstance(config_messagegroups, list):
+                    for mg_ref in config_messagegroups:
+                        if isinstance(mg_ref, str):
+                            mg_id = mg_ref.split("/")[-1] if "/" in mg_ref else mg_ref
+                            referenced_messagegroups.add(mg_id)
+    return referenced_messagegroups
+
+
+class LoadFilter:
+    """The ``--messagegroup``/``--endpoint`` filters, compiled into a group predicate.
+
+    The loader applies the filters to the finished document
+    (``_apply_messagegroup_filter``/``_apply_endpoint_filter``). This class
+    predicts their outcome per group instance, so that the loader and the
+    resolvers can leave out the groups that would be discarded anyway:
+
+    - ``keeps``: the filters keep the group
+    - ``includes``: the group is kept, or a kept message derives from one of
+      its messages; basemessages are merged before filtering, so these groups
+      must be loaded and resolved as well
+
+    The outcome depends on the document (whether it has message groups and
+    endpoints, and which message groups the selected endpoints reference), so
+    ``bind`` must be called again after groups have been added.
+    """
+
+    def __init__(self, group_types: Sequence[str], messagegroup_filter: str = "", endpoint_filter: str = ""):
+        self.messagegroup_filter = messagegroup_filter or ""
+        self.endpoint_filter = endpoint_filter or ""
+        alternatives = "|".join(re.escape(g) for g in sorted(group_types, key=len, reverse=True))
+        self._group_pattern = re.compile(f"(?:^|/)({alternatives})/([^/#?]+)") if alternatives else None
+        self._messagegroups_filtered = False
+        self._endpoints_filtered = False
+        self._endpoint_messagegroups: Set[str] = set()
+        self._required: Set[GroupKey] = set()
+
+    @property
+    def active(self) -> bool:
+        """Check whether any filter is set."""
+        return bool(self.messagegroup_filter or self.endpoint_filter)
+
+    def bind(self, document: Any) -> None:
+        """Evaluate the filters against the document as loaded so far."""
+        if not self.active or not isinstance(document, dict):
+            return
+        self._messagegroups_filtered = bool(self.messagegroup_filter) and "messagegroups" in document
+        endpoints = document.get("endpoints")
+        self._endpoints_filtered = bool(self.endpoint_filter) and isinstance(endpoints, dict)
+        self._endpoint_messagegroups = set()
+        if self._endpoints_filtered:
+            self._endpoint_messagegroups = endpoint_messagegroup_ids(
+                {endpoint_id: endpoint for endpoint_id, endpoint in endpoints.items() if self.endpoint_filter in endpoint_id})
+
+        # Follow the basemessage chains of kept messages into discarded groups
+        self._required = set()
+        pending: List[GroupKey] = [(group_type, group_id) for group_type in ("messagegroups", "endpoints")
+                                   if isinstance(document.get(group_type), dict)
+                                   for group_id in document[group_type] if self.keeps(group_type, group_id)]
+        seen = set(pending)
+        while pending:
+            group_type, group_id = pending.pop()
+            group = document.get(group_type, {}).get(group_id) if isinstance(document.get(group_type), dict) else None
+            messages = group.get("messages") if isinstance(group, dict) else None
+            if not isinstance(messages, dict):
+                continue
+            for message in messages.values():
+                base = self.group_of(message.get("basemessageurl")) if isinstance(message, dict) else None
+                if base and base not in seen:
+                    seen.add(base)
+                    pending.append(base)
+                    if not self.keeps(*base):
+                        self._required.add(base)
+
+    def keeps(self, group_type: str, group_id: str) -> bool:
+        """Check whether the filters keep a group."""
+        if group_type in FILTERED_GROUP_TYPES:
+            if self._messagegroups_filtered and self.messagegroup_filter not in group_id:
+                return False
+            if self._endpoint_messagegroups and group_id not in self._endpoint_messagegroups:
+                return False
+        elif group_type == "endpoints" and self._endpoints_filtered:
+            return self.endpoint_filter in group_id
+        return True
+
+    def includes(self, group_type: str, group_id: str) -> bool:
+        """Check whether a group must be loaded and resolved."""
+        return self.keeps(group_type, group_id) or (group_type, group_id) in self._required
+
+    def includes_path(self, path: Sequence[Any]) -> bool:
+        """Check whether a key path of the document lies in a group that must be loaded.
+
+        Paths above the group level (e.g. a whole group collection) are included.
+        """
+        return len(path) < 2 or not isinstance(path[1], str) or self.includes(path[0], path[1])
+
+    def includes_reference(self, ref: Any) -> bool:
+        """Check whether the target of a reference lies in a group that must be loaded."""
+        group = self.group_of(ref)
+        return group is None or self.includes(*group)
+
+    def group_of(self, ref: Any) -> Optional[GroupKey]:
+        """Return the group a reference (URL, path or fragment) points into."""
+        if not isinstance(ref, str) or self._group_pattern is None:
+            return None
+        match = self._group_pattern.search(ref.lstrip("#"))
+        return (match.group(1), match.group(2)) if match else None
@@ -0,0 +1,223 @@
+""" Reference scanning and indexing for composed xRegistry documents """
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from ..common.model import Model, ModelIndex
+from .lazy_resources import LazyEntity
+
+JsonNode = Union[Dict[str, 'JsonNode'], List['JsonNode'], str, bool, int, float, None]
+JsonPath = Tuple[Union[str, int], ...]
+
+# Keys whose values are indexed regardless of their type, so that consumers
+# (basemessage resolution, schema normalization, schema collection) can find
+# them without walking the document
+TRACKED_KEYS = frozenset(["basemessageurl", "dataschemauri", "dataschema", "schema", "schemaurl"])
+
+
+class ReferenceScanner:
+    """Finds xRegistry references in documents.
+
+    A reference is a string that points into one of the model's group types
+    (e.g. ``/schemagroups/``) and is not a fragment (``#...``). Inside objects,
+    only values of reference-like keys count (keys ending in ``uri`` or ``url``,
+    or containing ``ref``); inside arrays, every string counts.
+
+    Scanners are compiled once per set of group types; use ``for_model``.
+    """
+
+    def __init__(self, group_types: Sequence[str]):
+        self.group_types = tuple(group_types)
+        # One alternation over all group paths instead of a substring test per group type
+        alternatives = "|".join(re.escape(g) for g in sorted(self.group_types, key=len, reverse=True))
+        self._pattern = re.compile(f"/(?:{alternatives})/") if alternatives else None
+
+    @staticmethod
+    def for_model(model: Model) -> 'ReferenceScanner':
+        """Get the scanner for a model's group types."""
+        return _scanner_for_group_types(ModelIndex.for_model(model).group_types)
+
+    def is_reference(self, value: Any) -> bool:
+        """Check whether a string points into one of the group types."""
+        return (isinstance(value, str) and self._pattern is not None
+                and not value.startswith("#") and self._pattern.search(value) is not None)
+
+    @staticmethod
+    def is_reference_key(key: Any) -> bool:
+        """Check whether an object member with this key may hold a reference."""
+        return isinstance(key, str) and (key.endswith("uri") or key.endswith("url") or "ref" in key.lower())
+
+    def references(self, data: JsonNode) -> List[str]:
+        """List the references in ``data`` in document order, including duplicates.
+
+        This is the lean variant of ``scan`` for callers that only need the
+        references: no paths are recorded. Reference strings are pushed onto the
+        walk stack next to the containers so they come out in document order.
+        """
+        references: List[str] = []
+        if self._pattern is None:
+            return references
+        search = self._pattern.search
+        stack: List[Any] = [data] if isinstance(data, (dict, list)) else []
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                references.append(node)
+                continue
+            children: List[Any] = []
+            if isinstance(node, dict):
+                for key, value in node.items():
+                    if isinstance(value, str):
+                        if (isinstance(key, str) and (key.endswith("uri") or key.endswith("url") or "ref" in key.lower())
+                                and not value.startswith("#") and search(value)):
+                            children.append(value)
+                    elif isinstance(value, (dict, list)):
+                        children.append(value)
+            elif isinstance(node, list):
+                for item in node:
+                    if isinstance(item, str):
+                        if not item.startswith("#") and search(item):
+                            children.append(item)
+                    elif isinstance(item, (dict, list)):
+                        children.append(item)
+            children.reverse()
+            stack.extend(children)
+        return references
+
+    def scan(self, data: JsonNode, base_path: JsonPath = (), skip_pending: bool = False) -> 'ReferenceIndex':
+        """Walk ``data`` once and index its references and tracked keys.
+
+        With ``skip_pending``, entities whose content is not fetched yet
+        (see ``LazyEntity``) are left out instead of being resolved.
+        """
+        index = ReferenceIndex(self)
+        index._entries.update(self._walk(data, base_path, skip_pending))
+        return index
+
+    def _walk(self, data: JsonNode, base_path: JsonPath,
+              skip_pending: bool = False) -> Iterable[Tuple[JsonPath, Tuple[Optional[str], Any, bool]]]:
+        """Yield ``(path, (key, value, is_reference))`` entries in document (pre-)order."""
+        # The start node is an object member or array item if its path says so
+        last = base_path[-1] if base_path else None
+        stack: List[Tuple[JsonPath, Any, Any, bool]] = [(base_path, last, data, isinstance(last, str))]
+        while stack:
+            path, key, node, is_member = stack.pop()
+            if skip_pending and isinstance(node, LazyEntity) and node.pending:
+                continue
+            if is_member:
+                if key in TRACKED_KEYS:
+                    yield path, (key, node, self.is_reference_key(key) and self.is_reference(node))
+                elif isinstance(node, str) and self.is_reference_key(key) and self.is_reference(node):
+                    yield path, (key, node, True)
+            elif isinstance(node, str) and path and self.is_reference(node):
+                # String item of an array
+                yield path, (None, node, True)
+
+            if isinstance(node, dict):
+                stack.extend((path + (k,), k, v, True) for k, v in reversed(node.items()))
+            elif isinstance(node, list):
+                stack.extend((path + (i,), None, node[i], False) for i in range(len(node) - 1, -1, -1))
+
+
+@lru_cache(maxsize=None)
+def _scanner_for_group_types(group_types: Tuple[str, ...]) -> ReferenceScanner:
+    return ReferenceScanner(group_types)
+
+
+class ReferenceIndex:
+    """Index of the references and tracked keys of a document.
+
+    Entries are keyed by their path in the document (a tuple of object keys
+    and array indices) and kept in document order. After a subtree has been
+    changed, ``rescan`` replaces its entries.
+    """
+
+    def __init__(self, scanner: ReferenceScanner):
+        self.scanner = scanner
+        self._entries: Dict[JsonPath, Tuple[Optional[str], Any, bool]] = {}
+        self._by_key: Optional[Dict[Optional[str], List[JsonPath]]] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._entries.clear()
+        self._by_key = None
+
+    def references(self, under: JsonPath = ()) -> List[str]:
+        """List the references (below ``under``) in document order, including duplicates."""
+        return [value for path, (_, value, is_ref) in self._entries.items()
+                if is_ref and path[:len(under)] == under]
+
+    def locations(self, ref: str) -> List[str]:
+        """List the JSON pointers of all places that hold ``ref``."""
+        return [self.to_pointer(path) for path, (_, value, is_ref) in self._entries.items()
+                if is_ref and value == ref]
+
+    def reference_entries(self) -> List[Tuple[JsonPath, Optional[str], str]]:
+        """List ``(path, key, reference)`` for every reference in document order (key None for array items)."""
+        return [(path, key, value) for path, (key, value, is_ref) in self._entries.items() if is_ref]
+
+    def occurrences(self, key: str) -> List[Tuple[JsonPath, Any]]:
+        """List ``(path, value)`` for every member named ``key`` (tracked or reference-like)."""
+        if self._by_key is None:
+            self._by_key = {}
+            for path, (entry_key, _, _) in self._entries.items():
+                self._by_key.setdefault(entry_key, []).append(path)
+        return [(path, self._entries[path][1]) for path in self._by_key.get(key, [])]
+
+    def set_value(self, path: JsonPath, value: Any) -> None:
+        """Record that the member at ``path`` was changed to ``value``."""
+        key = self._entries[path][0]
+        self._entries[path] = (key, value, self.scanner.is_reference_key(key) and self.scanner.is_reference(value))
+
+    def rescan(self, doc: JsonNode, paths: Sequence[JsonPath]) -> List[str]:
+        """Replace the entries below ``paths`` by rescanning those nodes of ``doc``.
+
+        Paths nested below another given path are covered by their ancestor and
+        paths that no longer exist in ``doc`` only drop their entries. Nodes are
+        scanned in the given order.
+
+        Returns:
+            The references found in the rescanned nodes, including duplicates
+        """
+        path_set = set(paths)
+        roots = [p for p in dict.fromkeys(paths) if not any(p[:i] in path_set for i in range(len(p)))]
+        if not roots:
+            return []
+        root_set = set(roots)
+        if self._entries:
+            self._entries = {path: entry for path, entry in self._entries.items()
+                             if not any(path[:i] in root_set for i in range(1, len(path) + 1))}
+        self._by_key = None
+
+        references: List[str] = []
+        for root in roots:
+            node = self.node_at(doc, root)
+            if node is None:
+                continue
+            for path, entry in self.scanner._walk(node, root):
+                self._entries[path] = entry
+                if entry[2]:
+                    references.append(entry[1])
+        return references
+
+    @staticmethod
+    def node_at(doc: JsonNode, path: JsonPath) -> JsonNode:
+        """Return the node at ``path``, or None if it does not exist."""
+        node = doc
+        for step in path:
+            if isinstance(node, dict) and step in node:
+                node = node[step]
+            elif isinstance(node, list) and isinstance(step, int) and 0 <= step < len(node):
+                node = node[step]
+            else:
+                return None
+        return node
+
+    @staticmethod
+    def to_pointer(path: JsonPath) -> str:
+        """Convert a path to a JSON pointer (RFC 6901)."""
+        return "".join("/" + str(step).replace("~", "~0").replace("/", "~1") for step in path)
@@ -0,0 +1,203 @@
+""" Self-contained local mirrors of remote registries """
+
+import hashlib
+import json
+import time
+import urllib.parse
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..common.http_cache import HttpResponseCache, write_atomic
+from ..common.snapshot_cache import plain_document
+from .reference_index import ReferenceIndex
+from .xregistry_loader import JsonNode, XRegistryLoader, XRegistryUrlParser
+
+#: Version of the sidecar layout
+MIRROR_FORMAT = 1
+
+
+@dataclass
+class MirrorResult:
+    """Outcome of mirroring a registry."""
+    source: str
+    bundle: str
+    # Remote documents the bundle was composed from
+    documents: int = 0
+    # Documents that were added, changed (content or epoch) or dropped since the last mirror
+    changed: List[str] = field(default_factory=list)
+    requests: int = 0
+    revalidated: int = 0
+    # Whether the bundle file was (re)written; unchanged bundles are left alone
+    written: bool = False
+
+    def summary(self) -> str:
+        """Return a one-line summary."""
+        state = "updated" if self.written else "unchanged"
+        return (f"Mirrored {self.source} to {self.bundle} ({state}): {self.documents} documents, "
+                f"{len(self.changed)} changed, {self.requests} requests ({self.revalidated} not modified)")
+
+
+class RegistryMirror:
+    """Mirrors a remote registry, or a subtree of it, into one local definitions file.
+
+    The bundle is the composed document ``generate`` would load from the URL:
+    the entry point with everything it references, resources and collections
+    referenced by URL (``schemaurl``, ``resourceurl``, ``messagesurl``, ...)
+    fetched and inlined, and basemessages resolved. References into the bundle
+    are rewritten to JSON pointers (``#/schemagroups/...``), so loading the
+    bundle is a plain local file load that never contacts the registry.
+
+    Next to the bundle, a sidecar directory (``<bundle>.mirror``) holds
+    the responses the bundle was composed from with their ETags and epochs,
+    and the list of documents. Mirroring again revalidates every response
+    with ``If-None-Match``; unchanged documents are answered with 304 and not
+    downloaded again, and if no document changed (by content hash or epoch),
+    the bundle file is not rewritten (so its modification time, and what
+    was cached for it, stays valid).
+    """
+
+    def __init__(self, bundle_path: str, model_path: Optional[str] = None, max_concurrency: int = 8):
+        self.bundle_path = bundle_path
+        self.sidecar_dir = Path(bundle_path + ".mirror")
+        self.model_path = model_path
+        self.max_concurrency = max_concurrency
+
+    @staticmethod
+    def entry_url(url: str) -> str:
+        """Return the URL to mirror for a registry URL, by its entry type.
+
+        Registry roots and group type collections are fetched with their
+        collections inlined; collections of resources or versions are mirrored
+        through the group or resource that holds them.
+        """
+        parser = XRegistryUrlParser(url)
+        if not parser.parsed.scheme.startswith("http") or not parser.parsed.netloc:
+            raise ValueError(f"Only HTTP(S) registry URLs can be mirrored: {url}")
+        entry_type = parser.get_entry_type()
+        if entry_type in ("registry", "group_type"):
+            query = urllib.parse.parse_qs(parser.parsed.query)
+            if "inline" in query:
+                return url
+            separator = '&' if parser.parsed.query else '?'
+            return f"{url}{separator}inline=*"
+        if entry_type in ("resource_collection", "version_collection"):
+            return urllib.parse.urlunparse(parser.parsed._replace(path=parser.parsed.path.rstrip("/").rsplit("/", 1)[0]))
+        if entry_type in ("group_instance", "resource", "version"):
+            return url
+        raise ValueError(f"Cannot tell what {url} points to in the registry")
+
+    def mirror(self, url: str, headers: Optional[Dict[str, str]] = None, full: bool = False) -> MirrorResult:
+        """Mirror a registry URL into the bundle, incrementally if it was mirrored before.
+
+        Args:
+            url: A registry root, group type, group, resource or version URL
+            headers: HTTP headers for authentication
+            full: Fetch everything again instead of revalidating the previous mirror
+
+        Returns:
+            What was mirrored
+        """
+        headers = headers or {}
+        entry_url = self.entry_url(url)
+        previous = self._read_sidecar()
+        if previous is not None and (full or previous.get("source") != entry_url):
+            previous = None
+        http_cache = HttpResponseCache(self.sidecar_dir / "http", ttl=0)
+        if previous is None:
+            http_cache.clear()
+
+        loader = XRegistryLoader(self.model_path, http_cache, self.max_concurrency)
+        registry_root = loader.discover_registry_root(entry_url, headers) or XRegistryUrlParser(entry_url).get_base_url()
+
+        def load_complete() -> Tuple[str, Optional[JsonNode]]:
+            uri, document = loader.load_with_dependencies(entry_url, headers)
+            if document is not None:
+                loader.prefetch_resources(document)
+            return uri, document
+
+        (_, document), inputs = loader.record_inputs(load_complete)
+        if not isinstance(document, dict):
+            raise ValueError(f"Could not load {url} for mirroring")
+
+        document = plain_document(document)
+        self.localize_references(loader, document, registry_root)
+        data = json.dumps(document, indent=2).encode("utf-8")
+        bundle_hash = hashlib.sha256(data).hexdigest()
+
+        documents = {name: {"content_hash": recorded.get("content_hash"), "etag": recorded.get("etag"),
+                            "epoch": recorded.get("epoch")}
+                     for name, recorded in sorted(inputs.items()) if recorded.get("content_hash")}
+        previous_documents = previous.get("documents", {}) if previous else {}
+        changed = sorted(name for name in set(documents) | set(previous_documents)
+                         if self._version(documents.get(name)) != self._version(previous_documents.get(name)))
+
+        result = MirrorResult(source=url, bundle=self.bundle_path, documents=len(documents), changed=changed,
+                              requests=loader.stats.requests, revalidated=http_cache.stats.revalidated)
+        if self._file_hash(self.bundle_path) != bundle_hash:
+            write_atomic(Path(self.bundle_path), data)
+            result.written = True
+        write_atomic(self.sidecar_dir / "mirror.json", json.dumps({
+            "format": MIRROR_FORMAT,
+            "source": entry_url,
+            "registry_root": registry_root,
+            "mirrored_at": time.time(),
+            "bundle_hash": bundle_hash,
+            "documents": documents,
+        }, indent=1).encode("utf-8"))
+        return result
+
+    @staticmethod
+    def localize_references(loader: XRegistryLoader, document: Dict[str, Any], registry_root: str) -> int:
+        """Rewrite references to entities in the document into JSON pointers.
+
+        References held by ``...url`` attributes stay as they are: they name
+        where content came from (``schemaurl``, ``messagesurl``, ...), and that
+        content is inlined next to them.
+
+        Returns:
+            The number of references rewritten
+        """
+        root = registry_root.rstrip("/")
+        rewritten = 0
+        for path, key, ref in loader.dependency_resolver.scanner.scan(document).reference_entries():
+            if key is not None and key.endswith("url"):
+                continue
+            parsed = urllib.parse.urlparse(ref)
+            if parsed.query or parsed.fragment:
+                continue
+            if ref.startswith("/"):
+                local = ref
+            elif ref.startswith(root + "/"):
+                local = urllib.parse.urlparse(ref[len(root):]).path
+            else:
+                continue
+            target = tuple(urllib.parse.unquote(step) for step in local.strip("/").split("/"))
+            if ReferenceIndex.node_at(document, target) is None:
+                continue
+            container = ReferenceIndex.node_at(document, path[:-1])
+            if isinstance(container, (dict, list)):
+                container[path[-1]] = "#/" + "/".join(target)
+                rewritten += 1
+        return rewritten
+
+    def _read_sidecar(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.sidecar_dir / "mirror.json", "r", encoding="utf-8") as f:
+                sidecar = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return sidecar if isinstance(sidecar, dict) and sidecar.get("format") == MIRROR_FORMAT else None
+
+    @staticmethod
+    def _file_hash(path: str) -> Optional[str]:
+        try:
+            with open(path, "rb") as f:
+                return hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return None
+
+    @staticmethod
+    def _version(document: Optional[Dict[str, Any]]) -> Optional[Tuple[Any, Any]]:
+        """What identifies the state of a mirrored document."""
+        return (document.get("content_hash"), document.get("epoch")) if document else None
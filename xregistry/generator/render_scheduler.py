@@ -0,0 +1,313 @@
+""" Scheduling of template renders onto a process pool """
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, TypeVar
+
+import jinja2
+from jinja2 import Template, meta, nodes
+
+from xregistry.cli import logger
+from .access_tracking import AccessRecorder
+from .context_stacks_manager import ContextStacksManager
+from .schema_utils import SchemaUtils
+
+if TYPE_CHECKING:
+    from .template_renderer import TemplateRenderer
+    from .xregistry_loader import XRegistryLoader
+
+T = TypeVar('T')
+
+#: Template globals that read the context stacks. Templates using them see
+#: what the templates rendered before them pushed, so they are rendered in order.
+STATE_READERS = frozenset({"pop", "stack"})
+
+
+@dataclass
+class RenderJob:
+    """One template render: the template, its arguments and the file it renders into."""
+    template: Template
+    args: Dict[str, Any]
+    output_path: str
+    suppress_output: bool = False
+
+
+@dataclass
+class RenderEffects:
+    """What a render added to the generator state, for replaying it elsewhere or later."""
+    pushes: List[Tuple[str, List[Any]]] = field(default_factory=list)
+    saves: Dict[str, Any] = field(default_factory=dict)
+    schema_references: Set[str] = field(default_factory=set)
+    # Files and URLs the render loaded (see ``XRegistryLoader.record_inputs``)
+    inputs: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # What the render read from its document, by JSON pointer (see ``AccessRecorder``)
+    reads: Optional[Dict[str, str]] = None
+
+    @staticmethod
+    def capture(stacks: ContextStacksManager, loader: Optional['XRegistryLoader'],
+                render: Callable[[], T]) -> Tuple[T, 'RenderEffects']:
+        """Run a render and record, then undo, what it pushed and saved."""
+        lengths = {name: len(items) for name, items in stacks.context_stacks.items()}
+        saved = dict(stacks.context_dict)
+        references = set(SchemaUtils.schema_references_collected)
+        try:
+            if loader is not None:
+                rendered, inputs = loader.record_inputs(render)
+            else:
+                rendered, inputs = render(), {}
+            effects = RenderEffects(
+                pushes=[(name, items[lengths.get(name, 0):]) for name, items in stacks.context_stacks.items()
+                        if len(items) > lengths.get(name, 0)],
+                saves={key: value for key, value in stacks.context_dict.items()
+                       if key not in saved or saved[key] != value},
+                schema_references=SchemaUtils.schema_references_collected - references,
+                inputs=dict(inputs))
+        finally:
+            for name, items in stacks.context_stacks.items():
+                del items[lengths.get(name, 0):]
+            stacks.context_dict.clear()
+            stacks.context_dict.update(saved)
+            SchemaUtils.schema_references_collected.intersection_update(references)
+        return rendered, effects
+
+    def apply(self, stacks: ContextStacksManager) -> None:
+        """Replay the effects onto the generator state."""
+        for name, items in self.pushes:
+            stacks.stack(name).extend(items)
+        stacks.context_dict.update(self.saves)
+        SchemaUtils.schema_references_collected.update(self.schema_references)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the effects to replay, for the generation manifest."""
+        return {"pushes": [[name, list(items)] for name, items in self.pushes], "saves": dict(self.saves),
+                "schema_references": sorted(self.schema_references)}
+
+    @staticmethod
+    def from_dict(recorded: Dict[str, Any]) -> 'RenderEffects':
+        """Restore effects recorded in the generation manifest."""
+        return RenderEffects(
+            pushes=[(name, [tuple(item) if name == "files" else item for item in items])
+                    for name, items in recorded.get("pushes", [])],
+            saves=dict(recorded.get("saves", {})),
+            schema_references=set(recorded.get("schema_references", [])))
+
+
+def track_job(job: RenderJob) -> Tuple[RenderJob, Optional[AccessRecorder]]:
+    """Prepare a job to record what it reads from its document (``root``), if that is a mapping or list."""
+    root = job.args.get("root")
+    if not isinstance(root, (dict, list)):
+        return job, None
+    recorder = AccessRecorder()
+    return replace(job, args={**job.args, "root": recorder.track(root)}), recorder
+
+
+# The jobs of the current run; forked workers inherit them, so only indexes
+# and results cross the process boundary.
+_WORKER_JOBS: List[RenderJob] = []
+_WORKER_RENDERER: Optional['TemplateRenderer'] = None
+
+
+def _render_in_worker(index: int) -> Tuple[int, Optional[str], Optional[RenderEffects]]:
+    """Render one job in a worker process. Failures are reported as ``None`` and reproduced by the parent."""
+    job, recorder = _WORKER_JOBS[index], None
+    try:
+        assert _WORKER_RENDERER is not None
+        ctx = _WORKER_RENDERER.ctx
+        if ctx.manifest is not None:
+            job, recorder = track_job(job)
+        rendered, effects = RenderEffects.capture(ctx.stacks, ctx.loader, lambda: job.template.render(job.args))
+        if recorder is not None:
+            effects.reads = recorder.reads()
+        return index, rendered, effects
+    except BaseException:  # pylint: disable=broad-except
+        return index, None, None
+
+
+class RenderScheduler:
+    """Renders the jobs of a template pass, on a process pool when more than one job is allowed.
+
+    Results are written in job order, so the output is the same as rendering
+    the jobs one after the other:
+
+    - Workers are forked from the generator after the document is loaded and
+      the templates are compiled, so jobs are not pickled; each worker
+      returns the rendered text and what the render pushed onto the context
+      stacks, which the parent replays in order before writing the file.
+    - Templates that read the context stacks (``pop``, ``stack``), directly
+      or through the templates they include or import, depend on the renders
+      before them and are rendered by the parent at their position.
+    - A job that fails in a worker is rendered again by the parent when its
+      turn comes, so the first failing job in order reports its error
+      exactly as a serial run would, after the jobs before it were written.
+
+    Where processes cannot be forked, the jobs are rendered serially.
+
+    With a generation manifest (``ctx.manifest``), jobs whose inputs are
+    unchanged since the last generation into the output directory are not
+    rendered; what they pushed is replayed from the manifest. Templates that
+    read the context stacks are always rendered. Renders record what they
+    read from their document, and only changes to those parts of the
+    document render them again.
+    """
+
+    def __init__(self, renderer: 'TemplateRenderer', jobs: int = 1):
+        self.renderer = renderer
+        self.jobs = jobs
+        self._parsed: Dict[Tuple[int, str], Optional[Tuple[str, nodes.Template]]] = {}
+        self._closures: Dict[Tuple[int, str], Optional[List[str]]] = {}
+
+    @staticmethod
+    def can_fork() -> bool:
+        """Whether workers can be forked on this platform."""
+        return "fork" in multiprocessing.get_all_start_methods()
+
+    def run(self, jobs: List[RenderJob]) -> None:
+        """Render the jobs and write their outputs in order."""
+        manifest = self.renderer.ctx.manifest
+        recorded: Dict[int, Dict[str, Any]] = {}
+        fingerprints: Dict[int, Optional[str]] = {}
+        parallel: List[int] = []
+        for index, job in enumerate(jobs):
+            if manifest is None and self.jobs == 1:
+                continue
+            if self.reads_state(job.template):
+                continue
+            if manifest is not None:
+                fingerprints[index] = self.fingerprint(job)
+                record = manifest.lookup(self.render_key(job), fingerprints[index], job.args.get("root"))
+                if record is not None:
+                    recorded[index] = record
+                    continue
+            parallel.append(index)
+
+        workers = min(self.jobs if self.jobs > 0 else os.cpu_count() or 1, len(parallel))
+        if workers < 2 or not self.can_fork():
+            for index, job in enumerate(jobs):
+                self._run_job(job, recorded.get(index), fingerprints.get(index))
+            return
+
+        # Resolve deferred resources before forking; each worker would fetch them
+        # again, on connections it shares with this process
+        self.renderer.ctx.loader.prefetch_resources([jobs[index].args for index in parallel])
+        global _WORKER_JOBS, _WORKER_RENDERER  # pylint: disable=global-statement
+        _WORKER_JOBS, _WORKER_RENDERER = jobs, self.renderer
+        logger.debug("Rendering %d templates with %d workers", len(parallel), workers)
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+        try:
+            results: Iterator[Tuple[int, Optional[str], Optional[RenderEffects]]] = pool.map(
+                _render_in_worker, parallel, chunksize=max(1, len(parallel) // (workers * 4)))
+            in_workers = set(parallel)
+            for index, job in enumerate(jobs):
+                if index not in in_workers:
+                    self._run_job(job, recorded.get(index), fingerprints.get(index))
+                    continue
+                _, rendered, effects = next(results)
+                if rendered is None or effects is None:
+                    self._run_job(job, None, fingerprints.get(index))
+                    continue
+                self._finish(job, fingerprints.get(index), rendered, effects)
+        finally:
+            # After a failure, the renders still queued are not needed
+            pool.shutdown(wait=True, cancel_futures=True)
+            _WORKER_JOBS, _WORKER_RENDERER = [], None
+
+    def _run_job(self, job: RenderJob, record: Optional[Dict[str, Any]], fingerprint: Optional[str]) -> None:
+        """Replay a recorded job or render it here."""
+        ctx = self.renderer.ctx
+        if record is not None:
+            RenderEffects.from_dict(record.get("effects", {})).apply(ctx.stacks)
+            return
+        if ctx.manifest is None:
+            rendered = self.renderer.render_job(job)
+            self.renderer.write_output(job, rendered)
+            return
+        tracked, recorder = track_job(job)
+        rendered, effects = RenderEffects.capture(ctx.stacks, ctx.loader, lambda: self.renderer.render_job(tracked))
+        if recorder is not None:
+            effects.reads = recorder.reads()
+        self._finish(job, fingerprint, rendered, effects)
+
+    def _finish(self, job: RenderJob, fingerprint: Optional[str], rendered: Optional[str],
+                effects: RenderEffects) -> None:
+        """Apply the effects of a rendered job, write its output and record it."""
+        effects.apply(self.renderer.ctx.stacks)
+        outputs = self.renderer.write_output(job, rendered)
+        manifest = self.renderer.ctx.manifest
+        if manifest is not None:
+            manifest.record(self.render_key(job), fingerprint, outputs, effects.to_dict(), effects.inputs,
+                            effects.reads, job.args.get("root"))
+
+    def render_key(self, job: RenderJob) -> str:
+        """Name a job in the generation manifest by its template and output file."""
+        manifest = self.renderer.ctx.manifest
+        output = manifest.relpath(job.output_path) if manifest is not None else job.output_path
+        return f"{job.template.name}|{output}"
+
+    def fingerprint(self, job: RenderJob) -> Optional[str]:
+        """Fingerprint the inputs of a job: template sources, arguments and output.
+
+        The document is part of the fingerprint only if its reads are not tracked.
+        """
+        manifest = self.renderer.ctx.manifest
+        if manifest is None:
+            return None
+        sources = self.template_sources(job.template)
+        if sources is None:
+            return None
+        args = {key: value for key, value in job.args.items() if key not in ("root", "uuid")}
+        root = job.args.get("root")
+        return manifest.fingerprint(sources, args, job.output_path, job.suppress_output,
+                                    document=None if isinstance(root, (dict, list)) else root)
+
+    def template_sources(self, template: Template) -> Optional[List[str]]:
+        """Return the sources of a template and the templates it includes, imports or extends.
+
+        Returns None if the template refers to templates by a computed name,
+        or a template cannot be loaded.
+        """
+        env = template.environment
+        if template.name is None:
+            return None
+        key = (id(env), template.name)
+        if key not in self._closures:
+            names = [template.name]
+            sources: Optional[List[str]] = []
+            for name in names:
+                parsed = self._parse(env, name)
+                if parsed is None or sources is None:
+                    sources = None
+                    break
+                sources.extend([name, parsed[0]])
+                for referenced in meta.find_referenced_templates(parsed[1]):
+                    if referenced is None:
+                        sources = None
+                        break
+                    if referenced not in names:
+                        names.append(referenced)
+            self._closures[key] = sources
+        return self._closures[key]
+
+    def reads_state(self, template: Template) -> bool:
+        """Check whether a template, or a template it includes or imports, reads the context stacks."""
+        sources = self.template_sources(template)
+        if sources is None:
+            return True
+        env = template.environment
+        for name in sources[::2]:
+            parsed = self._parse(env, name)
+            if parsed is None or any(node.name in STATE_READERS for node in parsed[1].find_all(nodes.Name)):
+                return True
+        return False
+
+    def _parse(self, env: jinja2.Environment, name: str) -> Optional[Tuple[str, nodes.Template]]:
+        key = (id(env), name)
+        if key not in self._parsed:
+            try:
+                source = env.loader.get_source(env, name)[0] if env.loader else None
+                self._parsed[key] = (source, env.parse(source)) if source is not None else None
+            except jinja2.TemplateError:
+                # Templates that fail to load report their error where they are rendered
+                self._parsed[key] = None
+        return self._parsed[key]
@@ -211,14 +211,14 @@ class SchemaProcessor(ResourceProcessor):
         # Get format
         schema_format = schema_version.get("dataschemaformat") or schema_version.get("format", "")
         
-        # Get content
-        if "schemaurl" in schema_version:
+        # Get content; external schemas the loader resolved from schemaurl come first
+        if "schema" in schema_version:
+            return schema_format, schema_version["schema"]
+        elif "schemaurl" in schema_version:
             # External schema - load it
             schema_url = schema_version["schemaurl"]
             _, external_schema = self.ctx.loader.load(schema_url, {})
             return schema_format, external_schema
-        elif "schema" in schema_version:
-            return schema_format, schema_version["schema"]
         
         return schema_format, None
 
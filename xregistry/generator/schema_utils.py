@@ -5,6 +5,7 @@ from typing import Any, Dict, List, Optional, Set, Union
 import jsonpointer
 
 from xregistry.cli import logger
+from xregistry.generator.access_tracking import plain
 from xregistry.generator.generator_context import GeneratorContext
 from xregistry.generator.jinja_filters import JinjaFilters
 
@@ -22,7 +23,7 @@ class SchemaUtils:
         logger.debug("Getting JSON pointer to node in JSON document")
 
         def find_path(current: JsonNode, target: JsonNode, path: List[str]) -> Optional[List[str]]:
-            if current is target:
+            if plain(current) is plain(target):
                 return path
             elif isinstance(current, dict):
                 for k, v in current.items():
@@ -167,13 +168,14 @@ class SchemaUtils:
             if not "format" in schema_version or not isinstance(schema_version["format"], str) or schema_format != schema_version["format"]:
                 raise RuntimeError(f"Schema format mismatch: {schema_format} != {str(schema_version['format']) if 'format' in schema_version else ''}")
             schema_format = schema_version["format"].lower().split("/")[0]
-            if "schemaurl" in schema_version:
+            if "schema" in schema_version:
+                # Includes schemas the loader resolved from schemaurl (fetched once, on first use)
+                schema_obj = schema_version["schema"]
+            elif "schemaurl" in schema_version:
                 external_schema_url = str(schema_version["schemaurl"])
                 _, schema_obj = ctx.loader.load(external_schema_url, {}, True)
                 if not schema_obj:
                     raise RuntimeError(f"Schema not found: {external_schema_url}")
-            elif "schema" in schema_version:
-                schema_obj = schema_version["schema"]
             else:
                 raise RuntimeError(f"Schema not found: {schema_ref}")
         else:
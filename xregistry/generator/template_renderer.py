@@ -11,7 +11,7 @@ import sys
 import tempfile
 import uuid
 import xml.etree.ElementTree as ET
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 import toml
 
 import avrotize
@@ -22,9 +22,11 @@ import urllib
 import urllib.parse
 
 from xregistry.cli import logger
+from xregistry.generator.access_tracking import enable_tracking
 from xregistry.generator.generator_context import GeneratorContext
 from xregistry.generator.jinja_extensions import JinjaExtensions, TemplateError
 from xregistry.generator.jinja_filters import JinjaFilters
+from xregistry.generator.render_scheduler import RenderJob, RenderScheduler
 from xregistry.generator.schema_utils import SchemaUtils
 from xregistry.generator.url_utils import URLUtils
 
@@ -47,7 +49,7 @@ class TemplateRenderer:
 
     def __init__(self, ctx: GeneratorContext, project_name: str, language: str, style: str, output_dir: str,
                  xreg_file_arg: str, headers: Dict[str, str], template_dirs: List[str], template_args: Dict[str, Any],
-                 suppress_code_output: bool, suppress_schema_output: bool) -> None:
+                 suppress_code_output: bool, suppress_schema_output: bool, jobs: int = 1) -> None:
         self.ctx = ctx
         self.project_name = project_name
         self.language = language
@@ -69,13 +71,14 @@ class TemplateRenderer:
 
         # Add resource handling for the refactoring
         self.handled_resources: set[str] = set()
+        self.scheduler = RenderScheduler(self, jobs)
 
         self.ctx.uses_avro = False
         self.ctx.uses_protobuf = False
         logger.debug("Initialized TemplateRenderer")
 
-    def generate(self) -> None:
-        """Generate code and schemas from templates."""
+    def load_document(self) -> Tuple[str, JsonNode]:
+        """Load and compose the definitions, and set the base URI for resolving references in them."""
 
         self.ctx.base_uri = self.xreg_file_arg
         
@@ -121,7 +124,16 @@ class TemplateRenderer:
                     self.xreg_file_arg, self.headers, self.style == "schema", 
                     messagegroup_filter=self.ctx.messagegroup_filter, 
                     endpoint_filter=self.ctx.endpoint_filter)
-        
+        return xreg_file, xregistry_document
+
+    def generate(self, loaded: Optional[Tuple[str, JsonNode]] = None) -> None:
+        """Generate code and schemas from templates.
+
+        Args:
+            loaded: The definitions loaded by ``load_document`` before, if they are still current
+        """
+        xreg_file, xregistry_document = loaded if loaded is not None else self.load_document()
+
         if not xreg_file or not xregistry_document:
             raise RuntimeError(
                 f"Definitions file not found or invalid {self.xreg_file_arg}")
@@ -157,26 +169,7 @@ class TemplateRenderer:
 
         self.ctx.set_current_dir(project_dir)
 
-        code_template_dirs = [code_template_dir]
-        code_template_and_include_dirs = [code_template_dir, os.path.join(
-            pt, "templates", self.language, "_common")]
-        schema_template_dirs = [os.path.join(
-            pt, "templates", self.language, "_schemas")]
-
-        for template_dir in self.template_dirs if self.template_dirs else []:
-            template_dir = os.path.join(os.path.curdir, template_dir)
-            if not os.path.isdir(template_dir):
-                raise RuntimeError(
-                    f"Template directory not found {template_dir}")
-            code_template_dir = os.path.join(
-                template_dir, self.language, self.style)
-            if os.path.exists(code_template_dir) and os.path.isdir(code_template_dir):
-                code_template_dirs = [code_template_dir]
-                code_template_and_include_dirs = [code_template_dir, os.path.join(
-                    pt, "templates", self.language, "_common")]
-                schema_template_dirs = [os.path.join(
-                    pt, "templates", self.language, "_schemas")]
-                break
+        code_template_dirs, code_template_and_include_dirs, schema_template_dirs = self.template_directories()
 
         code_env = self.setup_jinja_env(code_template_and_include_dirs)
         schema_env = self.setup_jinja_env(schema_template_dirs)
@@ -239,32 +232,11 @@ class TemplateRenderer:
             if len(merged_schema) == 1:
                 merged_schema = merged_schema[0]
 
-            if self.language == "py":
-                avrotize.convert_avro_schema_to_python(
-                    merged_schema, project_data_dir, package_name=self.data_project_name,
-                    dataclasses_json_annotation=json_enabled, avro_annotation=avro_enabled
-                )
-            elif self.language == "cs":
-                avrotize.convert_avro_schema_to_csharp(
-                    merged_schema, project_data_dir, base_namespace=JinjaFilters.pascal(self.data_project_name),
-                    pascal_properties=True, system_text_json_annotation=json_enabled, avro_annotation=avro_enabled
-                )
-            elif self.language == "java":
-                # Java: use lowercase package name to match Maven artifact conventions
-                java_package_name = self.data_project_name.lower().replace('-', '_')
-                avrotize.convert_avro_schema_to_java(
-                    merged_schema, project_data_dir, package_name=java_package_name,
-                    jackson_annotation=json_enabled, avro_annotation=avro_enabled
-                )
-            elif self.language == "js":
-                avrotize.convert_avro_schema_to_javascript(
-                    merged_schema, project_data_dir, package_name=self.data_project_name, avro_annotation=avro_enabled
-                )
-            elif self.language == "ts":
-                avrotize.convert_avro_schema_to_typescript(
-                    merged_schema, project_data_dir, package_name=self.data_project_name,
-                    avro_annotation=avro_enabled, typedjson_annotation=json_enabled
-                )
+            if self.ctx.manifest is not None:
+                self.ctx.manifest.track(project_data_dir, lambda: self.convert_with_avrotize(
+                    merged_schema, project_data_dir, avro_enabled, json_enabled))
+            else:
+                self.convert_with_avrotize(merged_schema, project_data_dir, avro_enabled, json_enabled)
         self.render_code_templates(
             self.project_name, self.main_project_name, self.data_project_name, self.style, project_dir, xregistry_document,
             code_template_dirs, code_env, True, self.template_args, self.suppress_code_output
@@ -346,6 +318,36 @@ class TemplateRenderer:
                 os.unlink(avro_file.name)
         return schema_root
 
+    def convert_with_avrotize(self, merged_schema: JsonNode, project_data_dir: str, avro_enabled: bool,
+                              json_enabled: bool) -> None:
+        """Generate the data classes of Avro schemas with avrotize."""
+        if self.language == "py":
+            avrotize.convert_avro_schema_to_python(
+                merged_schema, project_data_dir, package_name=self.data_project_name,
+                dataclasses_json_annotation=json_enabled, avro_annotation=avro_enabled
+            )
+        elif self.language == "cs":
+            avrotize.convert_avro_schema_to_csharp(
+                merged_schema, project_data_dir, base_namespace=JinjaFilters.pascal(self.data_project_name),
+                pascal_properties=True, system_text_json_annotation=json_enabled, avro_annotation=avro_enabled
+            )
+        elif self.language == "java":
+            # Java: use lowercase package name to match Maven artifact conventions
+            java_package_name = self.data_project_name.lower().replace('-', '_')
+            avrotize.convert_avro_schema_to_java(
+                merged_schema, project_data_dir, package_name=java_package_name,
+                jackson_annotation=json_enabled, avro_annotation=avro_enabled
+            )
+        elif self.language == "js":
+            avrotize.convert_avro_schema_to_javascript(
+                merged_schema, project_data_dir, package_name=self.data_project_name, avro_annotation=avro_enabled
+            )
+        elif self.language == "ts":
+            avrotize.convert_avro_schema_to_typescript(
+                merged_schema, project_data_dir, package_name=self.data_project_name,
+                avro_annotation=avro_enabled, typedjson_annotation=json_enabled
+            )
+
     def render_code_templates(
             self, code_project_name: str, main_project_name: str, data_project_name: str,
             style: str, output_dir: str, xregistry_document: JsonNode,
@@ -354,6 +356,24 @@ class TemplateRenderer:
         """Render code templates."""
         logger.debug(
             "Rendering code templates for project: %s, style: %s", code_project_name, style)
+        jobs: List[RenderJob] = []
+        try:
+            for job in self.code_template_jobs(code_project_name, main_project_name, data_project_name, output_dir,
+                                               xregistry_document, code_template_dirs, env, post_process,
+                                               template_args, suppress_output):
+                jobs.append(job)
+        except BaseException:
+            # Render what was collected before the failure, as rendering along the walk would have
+            self.scheduler.run(jobs)
+            raise
+        self.scheduler.run(jobs)
+
+    def code_template_jobs(
+            self, code_project_name: str, main_project_name: str, data_project_name: str,
+            output_dir: str, xregistry_document: JsonNode, code_template_dirs: List[str],
+            env: jinja2.Environment, post_process: bool, template_args: Dict[str, Any],
+            suppress_output: bool = False) -> Iterator[RenderJob]:
+        """Walk the code template directories and yield the renders they call for, in walk order."""
         if not isinstance(xregistry_document, dict):
             raise RuntimeError("Document root is not a dictionary")
         class_name = None
@@ -441,7 +461,7 @@ class TemplateRenderer:
                                         class_name = f'{package_name}.{file_name}'
                                 if not class_name:
                                     raise RuntimeError("Class name not found")
-                                self.render_template(
+                                yield self.template_job(
                                     code_project_name, main_project_name, data_project_name,
                                     class_name, subscope, file_dir, file_name, template, template_args, suppress_output)
                         continue
@@ -463,9 +483,9 @@ class TemplateRenderer:
                     else:
                         file_dir = file_dir_base if not has_rootdir else self.output_dir
 
-                    self.render_template(code_project_name, main_project_name, data_project_name,
-                                         class_name, scope, file_dir,
-                                         file_name, template, template_args, suppress_output)
+                    yield self.template_job(code_project_name, main_project_name, data_project_name,
+                                            class_name, scope, file_dir,
+                                            file_name, template, template_args, suppress_output)
 
     def render_schema_templates(
             self, schema_type: Optional[str], schema_project_name: str, class_name: Optional[str], language: str,
@@ -580,23 +600,34 @@ class TemplateRenderer:
             class_name: str, scope: JsonNode, file_dir: str, file_name: str,
             template: Template, template_args: Dict[str, Any], suppress_output: bool = False) -> None:
         """Render a template."""
+        self.scheduler.run([self.template_job(template_project_name, main_project_name, data_project_name,
+                                              class_name, scope, file_dir, file_name, template, template_args,
+                                              suppress_output)])
 
+    def template_job(
+            self, template_project_name: str, main_project_name: str, data_project_name: str,
+            class_name: str, scope: JsonNode, file_dir: str, file_name: str,
+            template: Template, template_args: Dict[str, Any], suppress_output: bool = False) -> RenderJob:
+        """Prepare the render of a template into a file."""
+        args = template_args.copy() if template_args is not None else {}
+        args["uuid"] = uuid.uuid4
+        args["root"] = scope
+        args["project_name"] = template_project_name
+        args["main_project_name"] = main_project_name
+        args["data_project_name"] = data_project_name
+        args["class_name"] = class_name
+        args["self.ctx.uses_avro"] = self.ctx.uses_avro
+        args["self.ctx.uses_protobuf"] = self.ctx.uses_protobuf
+        return RenderJob(template, args, os.path.join(os.getcwd(), file_dir, file_name), suppress_output)
+
+    def render_job(self, job: RenderJob) -> Optional[str]:
+        """Render a prepared template. Returns None if the template rendered nothing for its scope."""
+        template, args, output_path, suppress_output = job.template, job.args, job.output_path, job.suppress_output
         try:
-            output_path = os.path.join(os.getcwd(), file_dir, file_name)
-
             if not suppress_output and not os.path.exists(os.path.dirname(output_path)):
                 os.makedirs(os.path.dirname(output_path))
             try:
                 self.ctx.current_dir = os.path.dirname(output_path)
-                args = template_args.copy() if template_args is not None else {}
-                args["uuid"] = uuid.uuid4
-                args["root"] = scope
-                args["project_name"] = template_project_name
-                args["main_project_name"] = main_project_name
-                args["data_project_name"] = data_project_name
-                args["class_name"] = class_name
-                args["self.ctx.uses_avro"] = self.ctx.uses_avro
-                args["self.ctx.uses_protobuf"] = self.ctx.uses_protobuf
                 try:
                     rendered = template.render(args)
                 except Exception as render_err:
@@ -612,13 +643,10 @@ class TemplateRenderer:
                     print("\nFull traceback:", file=sys.stderr)
                     traceback.print_exc()
                     raise
-                if not suppress_output:
-                    with open(output_path, "w", encoding='utf-8') as f:
-                        f.write(rendered)
+                return rendered
             except TypeError as err:
                 if "Undefined found" in str(err):
-                    if not suppress_output and os.path.exists(output_path):
-                        os.remove(output_path)
+                    return None
                 else:
                     logger.error("%s: %s", template.name, err)
                     exit(1)
@@ -633,6 +661,26 @@ class TemplateRenderer:
             logger.error("%s: %s", template.name, err)
             logger.error("Full traceback:\n%s", traceback.format_exc())
             exit(1)
+        return None
+
+    def write_output(self, job: RenderJob, rendered: Optional[str]) -> List[str]:
+        """Write the output of a rendered template, or remove it if nothing was rendered.
+
+        Returns the paths of the files written."""
+        self.ctx.current_dir = os.path.dirname(job.output_path)
+        if job.suppress_output:
+            return []
+        if rendered is None:
+            if os.path.exists(job.output_path):
+                os.remove(job.output_path)
+            return []
+        if self.ctx.manifest is not None:
+            self.ctx.manifest.write(job.output_path, rendered)
+        else:
+            os.makedirs(os.path.dirname(job.output_path), exist_ok=True)
+            with open(job.output_path, "w", encoding='utf-8') as f:
+                f.write(rendered)
+        return [job.output_path]
 
     @staticmethod
     def resolve_string(template: str, replacements: Dict[str, str]):
@@ -759,13 +807,71 @@ class TemplateRenderer:
             raise ValueError(
                 f"Dependency '{dependency_name}' not found in runtime version '{runtime_version}' for language '{language}'.")
 
+    def template_directories(self) -> Tuple[List[str], List[str], List[str]]:
+        """Get the directories of the code templates, the code templates with their includes, and the schema templates.
+
+        A directory for the language and style in one of the extra template
+        directories takes the place of the built-in one.
+        """
+        pt = os.path.realpath(os.path.join(os.path.dirname(__file__), ".."))
+        code_template_dir = os.path.join(
+            pt, "templates", self.language, self.style)
+        code_template_dirs = [code_template_dir]
+        code_template_and_include_dirs = [code_template_dir, os.path.join(
+            pt, "templates", self.language, "_common")]
+        schema_template_dirs = [os.path.join(
+            pt, "templates", self.language, "_schemas")]
+
+        for template_dir in self.template_dirs if self.template_dirs else []:
+            template_dir = os.path.join(os.path.curdir, template_dir)
+            if not os.path.isdir(template_dir):
+                raise RuntimeError(
+                    f"Template directory not found {template_dir}")
+            code_template_dir = os.path.join(
+                template_dir, self.language, self.style)
+            if os.path.exists(code_template_dir) and os.path.isdir(code_template_dir):
+                code_template_dirs = [code_template_dir]
+                code_template_and_include_dirs = [code_template_dir, os.path.join(
+                    pt, "templates", self.language, "_common")]
+                schema_template_dirs = [os.path.join(
+                    pt, "templates", self.language, "_schemas")]
+                break
+        return code_template_dirs, code_template_and_include_dirs, schema_template_dirs
+
+    def compile_templates(self) -> List[Tuple[str, int]]:
+        """Precompile the code and schema templates of the language and style into the template cache.
+
+        Returns:
+            The paths of the bundles written and the number of templates in each
+        """
+        if self.ctx.template_cache is None:
+            raise ValueError("Templates can only be compiled into the template cache")
+        _, code_template_and_include_dirs, schema_template_dirs = self.template_directories()
+        if not os.path.isdir(code_template_and_include_dirs[0]):
+            raise ValueError(f"Code template directory not found: {code_template_and_include_dirs[0]}")
+        bundles = []
+        for template_dirs in (code_template_and_include_dirs, schema_template_dirs):
+            template_dirs = [d for d in template_dirs if os.path.isdir(d)]
+            if not template_dirs:
+                continue
+            path, count = self.ctx.template_cache.compile(self.setup_jinja_env(template_dirs), template_dirs)
+            bundles.append((str(path), count))
+        return bundles
+
     def setup_jinja_env(self, template_dirs: List[str]) -> jinja2.Environment:
         """Create the Jinja environment and load extensions."""
         logger.debug(
             "Setting up Jinja environment with template dirs: %s", template_dirs)
-        loader = jinja2.FileSystemLoader(template_dirs, followlinks=True)
+        if self.ctx.template_envs is not None and tuple(template_dirs) in self.ctx.template_envs:
+            return self.ctx.template_envs[tuple(template_dirs)]
+        template_cache = self.ctx.template_cache
+        if template_cache is not None:
+            loader = template_cache.loader(template_dirs)
+        else:
+            loader = jinja2.FileSystemLoader(template_dirs, followlinks=True)
         env = jinja2.Environment(loader=loader, extensions=[
-                                 JinjaExtensions.ExitExtension, JinjaExtensions.TimeExtension, JinjaExtensions.ErrorExtension])
+                                 JinjaExtensions.ExitExtension, JinjaExtensions.TimeExtension, JinjaExtensions.ErrorExtension],
+                                 bytecode_cache=template_cache.bytecode if template_cache is not None else None)
         env.filters['regex_search'] = JinjaFilters.regex_search
         env.filters['regex_replace'] = JinjaFilters.regex_replace
         env.filters['pascal'] = JinjaFilters.pascal
@@ -800,6 +906,10 @@ class TemplateRenderer:
         env.globals['geturlport'] = URLUtils.get_url_port
         env.globals['geturlscheme'] = URLUtils.get_url_scheme
         env.globals['dependency'] = self.dependency
+        if self.ctx.manifest is not None:
+            enable_tracking(env)
+        if self.ctx.template_envs is not None:
+            self.ctx.template_envs[tuple(template_dirs)] = env
         return env
 
     def is_proto_doc(self, xregistry_document: JsonNode) -> bool:
@@ -824,30 +934,29 @@ class TemplateRenderer:
     def collect_schema_references_from_document(self, document: JsonNode) -> set[str]:
         """Collect all schema references from the composed document."""
         schema_refs = set()
+        index = self.ctx.loader.build_reference_index(document)
         
-        def scan_for_schemas(obj: JsonNode, path: str = "") -> None:
-            if isinstance(obj, dict):
-                for key, value in obj.items():
-                    current_path = f"{path}/{key}" if path else key
-                    
-                    # Look for schema reference properties
-                    if key in ["dataschema", "schema", "schemaurl"] and isinstance(value, str):
-                        schema_refs.add(value)
-                    
-                    # Look for inline schemas
-                    elif key == "schema" and isinstance(value, (dict, str)):
-                        schema_pointer = f"#{path}/schema"
-                        schema_refs.add(schema_pointer)
-                    
-                    # Recursively scan nested objects
-                    scan_for_schemas(value, current_path)
-            elif isinstance(obj, list):
-                for i, item in enumerate(obj):
-                    scan_for_schemas(item, f"{path}[{i}]")
-        
-        scan_for_schemas(document)
+        # Look for schema reference properties
+        for key in ["dataschema", "schema", "schemaurl"]:
+            for path, value in index.occurrences(key):
+                if isinstance(value, str):
+                    schema_refs.add(value)
+                # Look for inline schemas
+                elif key == "schema" and isinstance(value, dict):
+                    schema_refs.add(f"#{self._schema_parent_path(path[:-1])}/schema")
         return schema_refs
 
+    @staticmethod
+    def _schema_parent_path(path: tuple) -> str:
+        """Format a document path as used in inline schema references (e.g. 'a/b[0]/c')."""
+        text = ""
+        for step in path:
+            if isinstance(step, int):
+                text += f"[{step}]"
+            else:
+                text = f"{text}/{step}" if text else str(step)
+        return text
+
     def get_unhandled_schema_references(self, document: JsonNode) -> set[str]:
         """Get schema references that haven't been marked as handled."""
         all_schemas = self.collect_schema_references_from_document(document)
@@ -1,20 +1,79 @@
 """ Core functions for the xregistry commands with dependency resolution """
 
+import asyncio
+import hashlib
 import json
 import os
-from typing import Any, Dict, List, Tuple, Union, Set, Optional
-import urllib.request
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Tuple, TypeVar, Union, Set, Optional
 import urllib.parse
-import urllib.error
 import logging
 import yaml
 import base64
-from ..common.model import Model
+import requests
+from ..common.http_cache import HttpResponseCache, extract_epoch
+from ..common.http_transport import HttpTransport, get_transport
+from ..common.snapshot_cache import SnapshotCache, SnapshotInfo, file_input, remote_input
+from ..common.model import GroupIndex, Model, ModelIndex, ResourceIndex
+from . import json_streaming
+from .document_stack import DocumentStack
+from .epoch_sync import EpochSync, entity_versions
+from .lazy_resources import LazyEntity, deferred_entities, pending_entities
+from .load_filter import LoadFilter, endpoint_messagegroup_ids
+from .reference_index import ReferenceIndex, ReferenceScanner
 
 JsonNode = Union[Dict[str, 'JsonNode'], List['JsonNode'], str, bool, int, float, None]
+T = TypeVar("T")
+# Key path of a message in a document: (groups, group id, messages, message id[, versions, version id])
+MessageKey = Tuple[str, ...]
 
 logger = logging.getLogger(__name__)
 
+# Default number of distinct referenced groups from which the whole registry is prefetched
+DEFAULT_PREFETCH_THRESHOLD = 10
+
+# Default timeout (seconds) of each /capabilities probe during registry root discovery
+DEFAULT_DISCOVERY_TIMEOUT = 5
+
+# Local JSON files from this size on are parsed event by event when filters apply
+DEFAULT_STREAM_THRESHOLD = 8 * 1024 * 1024
+
+# The libyaml-based loader is several times faster than the pure-Python one
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+@dataclass
+class LoadStats:
+    """Counters for the registry traffic of a load."""
+    strategy: str = "walk"
+    fan_out: int = 0
+    requests: int = 0
+    # Response bodies as transferred (possibly compressed) and after decoding
+    bytes_on_wire: int = 0
+    bytes_decoded: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, counter: str, amount: int = 1) -> None:
+        """Increase the named counter."""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary representation."""
+        return {"strategy": self.strategy, "fan_out": self.fan_out,
+                "requests": self.requests, "bytes_on_wire": self.bytes_on_wire,
+                "bytes_decoded": self.bytes_decoded}
+
+    def summary(self) -> str:
+        """Return a one-line summary of the counters."""
+        return (f"Registry load: strategy {self.strategy} (fan-out {self.fan_out}), "
+                f"{self.requests} requests, {self.bytes_on_wire} bytes on the wire "
+                f"({self.bytes_decoded} bytes decoded)")
+
 
 class XRegistryUrlParser:
     """Parse xRegistry URLs to determine entry point and resource paths."""
@@ -24,6 +83,7 @@ class XRegistryUrlParser:
         self.parsed = urllib.parse.urlparse(url)
         self.base_url = f"{self.parsed.scheme}://{self.parsed.netloc}"
         self.path_parts = [p for p in self.parsed.path.strip('/').split('/') if p]
+        self.registry_url = self.base_url
         
         # Track if this is a registry-level URL
         self.is_registry_root = False
@@ -41,11 +101,16 @@ class XRegistryUrlParser:
             else:
                 # /registry/something - strip registry prefix
                 self.path_parts = self.path_parts[1:]
+                self.registry_url = f"{self.base_url}/registry"
         
     def get_base_url(self) -> str:
         """Get the base registry URL."""
         return self.base_url
     
+    def get_registry_url(self) -> str:
+        """Get the URL of the registry root the URL points into."""
+        return self.registry_url
+    
     def get_entry_type(self) -> str:
         """Determine the type of entry point."""
         # Check for registry root first
@@ -86,46 +151,83 @@ class XRegistryUrlParser:
 class DependencyResolver:
     """Resolves xRegistry dependencies by following xid references."""
     
-    def __init__(self, model: Model, loader: 'XRegistryLoader'):
+    # Maximum number of groups requested with one filtered fetch
+    BATCH_SIZE = 50
+    
+    def __init__(self, model: Model, loader: 'XRegistryLoader', max_concurrency: int = 1):
         self.model = model
         self.loader = loader
+        self.max_concurrency = max(1, max_concurrency)
         self.resolved_resources: Dict[str, JsonNode] = {}
+        self.unresolvable: Set[str] = set()
         self.pending_resolution: Set[str] = set()
+        # References and tracked keys of the composed document being resolved
+        self.reference_index = ReferenceIndex(self.scanner)
+        # Group instances fetched as a whole (with inline resources), by group URL
+        self.group_documents: Dict[str, JsonNode] = {}
+        # (registry URL, group type) pairs whose server rejected filtered fetches
+        self._filter_unsupported: Set[Tuple[str, str]] = set()
+        # Groups of the current load that need resolving (see XRegistryLoader._set_load_filter)
+        self.load_filter = LoadFilter(())
         self.logger = logging.getLogger(__name__ + ".DependencyResolver")
     
+    def reset(self) -> None:
+        """Forget what earlier loads resolved, so the next load fetches current content."""
+        self.resolved_resources.clear()
+        self.unresolvable.clear()
+        self.pending_resolution.clear()
+        self.group_documents.clear()
+        self._filter_unsupported.clear()
+        self.reference_index = ReferenceIndex(self.scanner)
+    
+    @property
+    def scanner(self) -> ReferenceScanner:
+        """Get the compiled reference scanner for the model's group types."""
+        return ReferenceScanner.for_model(self.model)
+    
     def find_xid_references(self, data: JsonNode, group_type: str) -> List[str]:
         """Find all external xid references in the given data structure."""
-        references = []
-        
-        # Get group types dynamically from model
-        model_groups = self.model.groups
-        group_patterns = [f"/{group_key}/" for group_key in model_groups.keys()]
-        
-        if isinstance(data, dict):
-            for key, value in data.items():
-                # Check for URI-like references that might point to external xRegistry resources
-                if isinstance(value, str) and (key.endswith("uri") or key.endswith("url") or "ref" in key.lower()):
-                    # Only include external URLs, not fragment references starting with #
-                    if not value.startswith("#") and any(pattern in value for pattern in group_patterns):
-                        references.append(value)
-                
-                # Recursively check nested structures
-                nested_refs = self.find_xid_references(value, group_type)
-                references.extend(nested_refs)
-                
-        elif isinstance(data, list):
-            for item in data:
-                # Check if list item is a string that looks like an xRegistry URL
-                if isinstance(item, str):
-                    # Only include external URLs, not fragment references starting with #
-                    if not item.startswith("#") and any(pattern in item for pattern in group_patterns):
-                        references.append(item)
-                else:
-                    # Recursively check nested structures
-                    nested_refs = self.find_xid_references(item, group_type)
-                    references.extend(nested_refs)
+        return self.scanner.references(data)
+    
+    def scan_added_nodes(self, doc: Dict[str, Any], paths: List[Tuple[str, ...]]) -> List[str]:
+        """Find the references in the given subtrees of a composed document.
+        
+        Only the nodes at ``paths`` are scanned; nodes nested below another listed
+        node are covered by their ancestor. The nodes are visited in document order
+        (model group order, then key order), so the result equals what a scan of the
+        whole document would report for these subtrees. The entries of the scanned
+        nodes are replaced in ``reference_index``.
         
-        return references
+        Args:
+            doc: The composed document
+            paths: Key paths of nodes added or changed since the previous scan
+            
+        Returns:
+            The references found, in document order, without duplicates
+        """
+        group_order = {group_type: i for i, group_type in enumerate(ModelIndex.for_model(self.model).group_types)}
+        unique_paths = set(p for p in paths if p and p[0] in group_order)
+        roots = [p for p in unique_paths
+                 if not any(p[:i] in unique_paths for i in range(1, len(p)))]
+        
+        key_positions: Dict[int, Dict[str, int]] = {}
+        located: List[Tuple[Tuple[int, ...], Tuple[str, ...]]] = []
+        for path in roots:
+            node: JsonNode = doc
+            position = [group_order[path[0]]]
+            for depth, key in enumerate(path):
+                if not isinstance(node, dict) or key not in node:
+                    break
+                if depth > 0:
+                    if id(node) not in key_positions:
+                        key_positions[id(node)] = {k: i for i, k in enumerate(node)}
+                    position.append(key_positions[id(node)][key])
+                node = node[key]
+            else:
+                located.append((tuple(position), path))
+        
+        ordered = [path for _, path in sorted(located, key=lambda item: item[0])]
+        return list(dict.fromkeys(self.reference_index.rescan(doc, ordered)))
     
     def _mark_inline_resources_as_resolved(self, doc: Dict[str, Any], base_url: str) -> None:
         """Mark all inline resources in the document as already resolved to prevent re-fetching.
@@ -144,13 +246,12 @@ class DependencyResolver:
             registry_root = f"{parsed.scheme}://{parsed.netloc}"
         
         # Process each group type in the document
-        model_groups = self.model.groups
-        for group_type, group_def in model_groups.items():
+        for group_index in ModelIndex.for_model(self.model).groups:
+            group_type = group_index.plural
             if group_type not in doc or not isinstance(doc[group_type], dict):
                 continue
                 
             group_collection = doc[group_type]
-            group_resources = group_def.get("resources", {})
             
             for group_id, group in group_collection.items():
                 if not isinstance(group, dict):
@@ -164,7 +265,7 @@ class DependencyResolver:
                     self.resolved_resources[full_url] = group
                 
                 # Process each resource collection type (messages, schemas, etc.)
-                for resource_collection in group_resources.keys():
+                for resource_collection in group_index.collections:
                     if resource_collection not in group or not isinstance(group[resource_collection], dict):
                         continue
                     
@@ -215,16 +316,48 @@ class DependencyResolver:
             self.logger.warning(f"Circular dependency detected for {ref_url}")
             return None
         
-        self.pending_resolution.add(ref_url)
+        self.resolve_references([ref_url], headers)
+        return self.resolved_resources.get(ref_url)
+    
+    def resolve_references(self, ref_urls: List[str], headers: Dict[str, str], base_url: Optional[str] = None) -> None:
+        """Resolve a set of xid references and their nested dependencies.
+        
+        References are resolved frontier by frontier: all references of one level are
+        fetched concurrently (up to ``max_concurrency`` at a time), then the references
+        found in the fetched documents form the next level. Results are recorded in
+        ``resolved_resources`` in the order of the input, so the outcome does not depend
+        on the order in which the fetches complete.
         
-        try:
-            self.logger.debug(f"Resolving reference: {ref_url}")
-            _, resource_data = self.loader._load_core(ref_url, headers, ignore_handled=True)
+        Args:
+            ref_urls: The reference URLs to resolve (can be relative or absolute)
+            headers: HTTP headers for authentication
+            base_url: Base URL for resolving relative references
+        """
+        frontier = [urllib.parse.urljoin(base_url, ref) if base_url and ref.startswith("/") else ref
+                    for ref in ref_urls]
+        while frontier:
+            to_fetch = [ref for ref in dict.fromkeys(frontier)
+                        if ref not in self.resolved_resources
+                        and ref not in self.unresolvable
+                        and ref not in self.pending_resolution]
+            if not to_fetch:
+                break
             
-            if resource_data is not None:
+            self.pending_resolution.update(to_fetch)
+            try:
+                fetched = self._fetch_all(to_fetch, headers)
+            finally:
+                self.pending_resolution.difference_update(to_fetch)
+            
+            frontier = []
+            for ref_url in to_fetch:
+                resource_data = fetched.get(ref_url)
+                if resource_data is None:
+                    self.unresolvable.add(ref_url)
+                    continue
                 self.resolved_resources[ref_url] = resource_data
                 
-                # Find and resolve nested dependencies
+                # Find nested dependencies for the next level
                 parser = XRegistryUrlParser(ref_url)
                 group_type = parser.get_group_type() or "unknown"
                 nested_refs = self.find_xid_references(resource_data, group_type)
@@ -236,28 +369,221 @@ class DependencyResolver:
                     nested_base_url = f"{parsed.scheme}://{parsed.netloc}"
                 
                 for nested_ref in nested_refs:
-                    self.resolve_reference(nested_ref, headers, nested_base_url)
-                
-                return resource_data
-            
+                    if nested_base_url and nested_ref.startswith("/"):
+                        nested_ref = urllib.parse.urljoin(nested_base_url, nested_ref)
+                    frontier.append(nested_ref)
+    
+    def estimate_fan_out(self, entry_url: str, entry_data: JsonNode, registry_root: str) -> int:
+        """Count the distinct groups the entry document references, other than its own."""
+        entry_parser = XRegistryUrlParser(entry_url)
+        own_group = (entry_parser.get_group_type(), entry_parser.get_group_id())
+        groups: Set[Tuple[str, str, str]] = set()
+        group_plurals = ModelIndex.for_model(self.model).group_plurals
+        for ref in self.scanner.references(entry_data):
+            parser = XRegistryUrlParser(urllib.parse.urljoin(registry_root, ref) if ref.startswith("/") else ref)
+            group_type = parser.get_group_type()
+            group_id = parser.get_group_id()
+            if group_type in group_plurals and group_id and (group_type, group_id) != own_group:
+                groups.add((parser.get_registry_url(), group_type, group_id))
+        return len(groups)
+
+    def prefetch_registry(self, registry_root: str, headers: Dict[str, str]) -> bool:
+        """Fetch the whole registry with one ``?inline=*`` request.
+
+        The group instances of the snapshot are recorded in ``group_documents``,
+        so the references resolved afterwards are served from the snapshot
+        instead of being fetched. Only what is reachable from the entry point
+        ends up in the composed document.
+
+        Returns:
+            Whether the snapshot could be fetched
+        """
+        root = registry_root.rstrip("/")
+        snapshot = self._fetch(f"{root}?inline=*", headers, optional=True)
+        if not isinstance(snapshot, dict):
+            self.logger.info(f"Could not prefetch {root}, resolving references one by one")
+            return False
+        for group_type in ModelIndex.for_model(self.model).group_types:
+            groups = snapshot.get(group_type)
+            if not isinstance(groups, dict):
+                continue
+            for group_id, group in groups.items():
+                if not isinstance(group, dict):
+                    continue
+                # Key the group the way references into it are keyed (see _fetch_batched)
+                registry_url = XRegistryUrlParser(urllib.parse.urljoin(registry_root, f"/{group_type}/{group_id}")).get_registry_url()
+                self.group_documents.setdefault(f"{registry_url}/{group_type}/{group_id}", group)
+        return True
+
+    def _fetch_all(self, ref_urls: List[str], headers: Dict[str, str]) -> Dict[str, Optional[JsonNode]]:
+        """Fetch several documents, batching references that belong to the same group.
+        
+        References into a group are served from the group instance fetched with
+        ``?inline=*`` when the group itself is requested, several of its resources
+        are requested, or the group has been fetched before. Groups of the same
+        type are fetched together with one filtered request (see ``_fetch_groups``).
+        Everything else, and anything a batch did not deliver, is fetched one by one.
+        """
+        fetched: Dict[str, Optional[JsonNode]] = {}
+        remaining = self._fetch_batched(ref_urls, headers, fetched)
+        if remaining:
+            fetched.update(self._fetch_each(remaining, headers))
+        return {ref_url: fetched.get(ref_url) for ref_url in ref_urls}
+    
+    def _fetch_batched(self, ref_urls: List[str], headers: Dict[str, str],
+                       fetched: Dict[str, Optional[JsonNode]]) -> List[str]:
+        """Serve references from whole-group fetches. Returns the references left to fetch."""
+        remaining: List[str] = []
+        group_plurals = ModelIndex.for_model(self.model).group_plurals
+        by_group: Dict[Tuple[str, str, str], List[Tuple[str, XRegistryUrlParser]]] = {}
+        for ref_url in ref_urls:
+            parser = XRegistryUrlParser(ref_url)
+            group_type = parser.get_group_type()
+            group_id = parser.get_group_id()
+            if (not ref_url.startswith(("http://", "https://")) or parser.parsed.query
+                    or parser.get_entry_type() not in ("group_instance", "resource", "version")
+                    or not group_type or not group_id or group_type not in group_plurals):
+                remaining.append(ref_url)
+                continue
+            by_group.setdefault((parser.get_registry_url(), group_type, group_id), []).append((ref_url, parser))
+        
+        # Decide which groups to fetch as a whole
+        groups: Dict[Tuple[str, str, str], Optional[JsonNode]] = {}
+        to_fetch: Dict[Tuple[str, str], List[str]] = {}
+        for key, members in by_group.items():
+            registry_url, group_type, group_id = key
+            group_url = f"{registry_url}/{group_type}/{group_id}"
+            if group_url in self.group_documents:
+                groups[key] = self.group_documents[group_url]
+            elif len(members) > 1 or any(parser.get_entry_type() == "group_instance" for _, parser in members):
+                to_fetch.setdefault((registry_url, group_type), []).append(group_id)
+            else:
+                remaining.extend(ref_url for ref_url, _ in members)
+        groups.update(self._fetch_groups(to_fetch, headers))
+        
+        # Pick the requested entities out of the group documents
+        for key, members in by_group.items():
+            if key not in groups:
+                continue
+            group = groups[key]
+            for ref_url, parser in members:
+                if parser.get_entry_type() == "group_instance":
+                    # The group fetch was the request for this reference, successful or not
+                    fetched[ref_url] = group
+                    continue
+                entity = self._select_from_group(group, parser)
+                if entity is None:
+                    remaining.append(ref_url)
+                else:
+                    fetched[ref_url] = entity
+        return remaining
+    
+    def _fetch_groups(self, to_fetch: Dict[Tuple[str, str], List[str]],
+                      headers: Dict[str, str]) -> Dict[Tuple[str, str, str], Optional[JsonNode]]:
+        """Fetch group instances with their inline resources.
+        
+        Several groups of one type are requested together as
+        ``GET /<grouptype>?inline=*&filter=<singular>id=A&filter=<singular>id=B...``
+        (filters are OR-ed). If the server rejects the filter, or a group is missing
+        from the response, the group is fetched on its own with ``?inline=*``.
+        """
+        results: Dict[Tuple[str, str, str], Optional[JsonNode]] = {}
+        single: List[Tuple[str, str, str]] = []
+        batches: Dict[str, Tuple[str, str, List[str]]] = {}
+        model_index = ModelIndex.for_model(self.model)
+        for (registry_url, group_type), group_ids in to_fetch.items():
+            if len(group_ids) < 2 or (registry_url, group_type) in self._filter_unsupported:
+                single.extend((registry_url, group_type, group_id) for group_id in group_ids)
+                continue
+            id_attribute = model_index.group(group_type).id_attribute
+            for i in range(0, len(group_ids), self.BATCH_SIZE):
+                chunk = group_ids[i:i + self.BATCH_SIZE]
+                query = urllib.parse.urlencode([("inline", "*")] + [("filter", f"{id_attribute}={group_id}") for group_id in chunk])
+                batches[f"{registry_url}/{group_type}?{query}"] = (registry_url, group_type, chunk)
+        
+        responses = self._fetch_each(list(batches.keys()), headers, optional=True)
+        for batch_url, (registry_url, group_type, chunk) in batches.items():
+            response = responses.get(batch_url)
+            if not isinstance(response, dict):
+                if (registry_url, group_type) not in self._filter_unsupported:
+                    self.logger.info(f"Filtered fetch of {group_type} not supported by {registry_url}, fetching groups one by one")
+                    self._filter_unsupported.add((registry_url, group_type))
+                single.extend((registry_url, group_type, group_id) for group_id in chunk)
+                continue
+            for group_id in chunk:
+                group = response.get(group_id)
+                if isinstance(group, dict):
+                    results[(registry_url, group_type, group_id)] = group
+                else:
+                    single.append((registry_url, group_type, group_id))
+        
+        group_urls = {f"{registry_url}/{group_type}/{group_id}": (registry_url, group_type, group_id)
+                      for registry_url, group_type, group_id in single}
+        for group_url, group in self._fetch_each(list(group_urls.keys()), headers).items():
+            results[group_urls[group_url]] = group
+        
+        for (registry_url, group_type, group_id), group in results.items():
+            if group is not None:
+                self.group_documents[f"{registry_url}/{group_type}/{group_id}"] = group
+        return results
+    
+    @staticmethod
+    def _select_from_group(group: JsonNode, parser: XRegistryUrlParser) -> Optional[JsonNode]:
+        """Pick the resource or version a URL points to out of an inlined group instance."""
+        node = group
+        for key in parser.path_parts[2:]:
+            if not isinstance(node, dict) or key not in node:
+                return None
+            node = node[key]
+        return node if isinstance(node, dict) else None
+    
+    def _fetch_each(self, ref_urls: List[str], headers: Dict[str, str],
+                    optional: bool = False) -> Dict[str, Optional[JsonNode]]:
+        """Fetch documents one request each, concurrently if permitted."""
+        if not ref_urls:
+            return {}
+        if self.max_concurrency == 1 or len(ref_urls) == 1:
+            return {ref_url: self._fetch(ref_url, headers, optional) for ref_url in ref_urls}
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(ref_urls))) as pool:
+            return dict(zip(ref_urls, pool.map(lambda ref_url: self._fetch(ref_url, headers, optional), ref_urls)))
+    
+    def _fetch(self, ref_url: str, headers: Dict[str, str], optional: bool = False) -> Optional[JsonNode]:
+        """Fetch a single referenced document."""
+        try:
+            self.logger.debug(f"Resolving reference: {ref_url}")
+            if optional:
+                _, resource_data = self.loader._load_from_url(ref_url, headers, optional=True)
+            else:
+                _, resource_data = self.loader._load_core(ref_url, headers, ignore_handled=True)
+            return resource_data
         except Exception as e:
             self.logger.error(f"Failed to resolve reference {ref_url}: {e}")
-        
-        finally:
-            self.pending_resolution.discard(ref_url)        
-        return None
+            return None
     
-    def _normalize_schema_references(self, doc: Dict[str, Any]) -> None:
+    def _normalize_schema_references(self, doc: Dict[str, Any], index: Optional[ReferenceIndex] = None) -> None:
         """Convert relative URI schema references to JSON pointers.
         
         After loading all dependencies, messages may reference schemas using relative URIs
         like '/schemagroups/Contoso.ERP/schemas/SchemaName'. These should be normalized
         to JSON pointers like '#/schemagroups/Contoso.ERP/schemas/SchemaName' so they can
         be resolved within the composed document.
+        
+        If a reference index of the document is given, the dataschemauri attributes are
+        looked up in it (and updated there) instead of walking the message groups.
         """
         if not isinstance(doc, dict):
             return
         
+        if index is not None:
+            for path, schema_uri in index.occurrences("dataschemauri"):
+                if (len(path) == 5 and path[0] == "messagegroups" and path[2] == "messages"
+                        and isinstance(schema_uri, str) and schema_uri.startswith("/")):
+                    msg = ReferenceIndex.node_at(doc, path[:-1])
+                    if isinstance(msg, dict) and msg.get("dataschemauri") == schema_uri:
+                        msg["dataschemauri"] = "#" + schema_uri
+                        index.set_value(path, msg["dataschemauri"])
+            return
+        
         # Process all message groups
         if "messagegroups" in doc and isinstance(doc["messagegroups"], dict):
             for mg_id, mg in doc["messagegroups"].items():
@@ -377,9 +703,7 @@ class DependencyResolver:
           # Override entry_type detection based on document content
         if isinstance(entry_data, dict):
             # If the document contains top-level xRegistry collections, treat it as a full registry
-            model_groups = self.model.groups
-            xreg_collections = set(model_groups.keys())
-            if any(key in entry_data for key in xreg_collections):
+            if any(key in entry_data for key in ModelIndex.for_model(self.model).group_types):
                 entry_type = "registry"
         
         # Add the entry data based on its type
@@ -418,7 +742,9 @@ class DependencyResolver:
         
         # Find and resolve all dependencies
         group_type = parser.get_group_type() or "unknown"
-        all_refs = self.find_xid_references(composed_doc, group_type)
+        self.load_filter.bind(composed_doc)
+        all_refs = [ref for ref in self.find_xid_references(composed_doc, group_type)
+                    if self.load_filter.includes_reference(ref)]
         
         # Use the provided registry_root for resolving relative references
         # If not provided, fall back to extracting from entry_url
@@ -427,6 +753,8 @@ class DependencyResolver:
             parsed = urllib.parse.urlparse(entry_url)
             base_url = f"{parsed.scheme}://{parsed.netloc}"
         
+        # Fetch all references concurrently, then merge them in document order
+        self.resolve_references(all_refs, headers, base_url)
         for ref_url in all_refs:
             resolved_resource = self.resolve_reference(ref_url, headers, base_url)
             if resolved_resource is not None:
@@ -438,8 +766,13 @@ class DependencyResolver:
         
         return composed_doc
     
-    def _add_resource_to_document(self, doc: Dict[str, Any], resource_url: str, resource_data: JsonNode) -> None:
-        """Add a resolved resource to the composed document."""
+    def _add_resource_to_document(self, doc: Dict[str, Any], resource_url: str,
+                                  resource_data: JsonNode) -> Optional[Tuple[str, ...]]:
+        """Add a resolved resource to the composed document.
+        
+        Returns:
+            The key path of the node that was written, or None if nothing was added
+        """
         parser = XRegistryUrlParser(resource_url)
         group_type = parser.get_group_type()
         group_id = parser.get_group_id()
@@ -447,7 +780,7 @@ class DependencyResolver:
         version_id = parser.get_version_id()
         
         if not group_type or not isinstance(resource_data, dict):
-            return
+            return None
         
         # Ensure group type exists in document
         if group_type not in doc:
@@ -469,7 +802,7 @@ class DependencyResolver:
                 
                 if not resource_collection:
                     self.logger.warning(f"Could not determine resource collection from URL: {resource_url}")
-                    return
+                    return None
                 
                 if not isinstance(doc[group_type][group_id], dict):
                     doc[group_type][group_id] = {}
@@ -485,6 +818,7 @@ class DependencyResolver:
                         if "versions" not in doc[group_type][group_id][resource_collection][resource_id]:
                             doc[group_type][group_id][resource_collection][resource_id]["versions"] = {}
                         doc[group_type][group_id][resource_collection][resource_id]["versions"][version_id] = resource_data
+                    return (group_type, group_id, resource_collection, resource_id, "versions", version_id)
                 else:
                     # Add resource (might contain versions)
                     # If the resource already exists, merge the data instead of replacing it
@@ -500,14 +834,18 @@ class DependencyResolver:
                     else:
                         # Resource doesn't exist, add it
                         doc[group_type][group_id][resource_collection][resource_id] = resource_data
+                    return (group_type, group_id, resource_collection, resource_id)
             else:
                 # Add group data
                 if isinstance(doc[group_type][group_id], dict) and isinstance(resource_data, dict):
                     doc[group_type][group_id].update(resource_data)
+                return (group_type, group_id)
         else:
             # Add to group type level
             if isinstance(doc[group_type], dict) and isinstance(resource_data, dict):
                 doc[group_type].update(resource_data)
+            return (group_type,)
+        return None
 
 
 class ResourceResolver:
@@ -515,6 +853,10 @@ class ResourceResolver:
     
     def __init__(self, loader: 'XRegistryLoader'):
         self.loader = loader
+        # Groups of the current load that need resolving (see XRegistryLoader._set_load_filter)
+        self.load_filter = LoadFilter(())
+        # Fetch URL-referenced resources and collections on first use (see LazyEntity)
+        self.lazy = False
         self.logger = logging.getLogger(__name__ + ".ResourceResolver")
     
     def resolve_resource(self, entity: Dict[str, Any], headers: Dict[str, str], 
@@ -615,95 +957,152 @@ class ResourceResolver:
                 except Exception as e:
                     self.logger.error(f"Error decoding legacy resourcebase64 resource: {e}")
     
-    def resolve_collection_urls(self, xreg_doc: JsonNode, headers: Dict[str, str]) -> None:
-        """Resolve collection URL references (like messagesurl, schemasurl) in group instances."""
-        if not isinstance(xreg_doc, dict):
-            return
+    def resolve_collection_urls(self, xreg_doc: JsonNode, headers: Dict[str, str]) -> List[Tuple[str, ...]]:
+        """Resolve collection URL references (like messagesurl, schemasurl) in group instances.
         
-        # Get model groups to process dynamically
-        model_groups = self.loader.model.groups
+        Returns:
+            The key paths of the collections that were added
+        """
+        added: List[Tuple[str, ...]] = []
+        if not isinstance(xreg_doc, dict):
+            return added
         
-        for group_type, group_def in model_groups.items():
+        for group_index in ModelIndex.for_model(self.loader.model).groups:
+            group_type = group_index.plural
             if group_type in xreg_doc and isinstance(xreg_doc[group_type], dict):
                 group_collection = xreg_doc[group_type]
-                if not isinstance(group_collection, dict):
-                    continue
-                    
-                # Get resource collections for this group type
-                group_resources = group_def.get("resources", {})
-                if not isinstance(group_resources, dict):
-                    continue
-                
                 for group_id, group in group_collection.items():
-                    if not isinstance(group, dict):
+                    if not isinstance(group, dict) or not self.load_filter.includes(group_type, group_id):
                         continue
                     
                     # Check for collection URL references (e.g., messagesurl, schemasurl)
-                    for resource_collection, resource_def in group_resources.items():
-                        collection_url_field = f"{resource_collection}url"
-                        
-                        # If the collection is not present but a URL reference exists, fetch it
-                        if collection_url_field in group and resource_collection not in group:
-                            collection_url = group[collection_url_field]
-                            if isinstance(collection_url, str):
-                                try:
-                                    self.logger.debug(f"Fetching collection from {collection_url_field}: {collection_url}")
-                                    _, collection_data = self.loader._load_core(collection_url, headers, ignore_handled=True)
-                                    if collection_data is not None and isinstance(collection_data, dict):
-                                        group[resource_collection] = collection_data
-                                        self.logger.debug(f"Successfully resolved collection from {collection_url_field}: {collection_url}")
-                                    else:
-                                        self.logger.warning(f"Failed to fetch collection from {collection_url_field}: {collection_url}")
-                                except Exception as e:
-                                    self.logger.error(f"Error fetching collection from {collection_url_field} {collection_url}: {e}")
-    
-    def resolve_all_resources(self, xreg_doc: JsonNode, headers: Dict[str, str]) -> None:
-        """Recursively resolve all resource references in an xRegistry document."""
-        if not isinstance(xreg_doc, dict):
-            return
+                    added.extend((group_type, group_id, resource_collection) for resource_collection
+                                 in self._fetch_collections(group, group_index, headers))
+        return added
+    
+    def _fetch_collections(self, group: Dict[str, Any], group_index: GroupIndex,
+                           headers: Dict[str, str]) -> List[str]:
+        """Fetch the collections of a group that are only referenced by URL (e.g. messagesurl).
+        
+        Returns:
+            The names of the collections that were added
+        """
+        added: List[str] = []
+        for resource_index in self._collection_urls(group, group_index):
+            resource_collection = resource_index.plural
+            collection_url_field = resource_index.collection_url_field
+            collection_url = group[collection_url_field]
+            try:
+                self.logger.debug(f"Fetching collection from {collection_url_field}: {collection_url}")
+                _, collection_data = self.loader._load_core(collection_url, headers, ignore_handled=True)
+                if collection_data is not None and isinstance(collection_data, dict):
+                    group[resource_collection] = collection_data
+                    added.append(resource_collection)
+                    self.logger.debug(f"Successfully resolved collection from {collection_url_field}: {collection_url}")
+                else:
+                    self.logger.warning(f"Failed to fetch collection from {collection_url_field}: {collection_url}")
+            except Exception as e:
+                self.logger.error(f"Error fetching collection from {collection_url_field} {collection_url}: {e}")
+        return added
+    
+    @staticmethod
+    def _collection_urls(group: Dict[str, Any], group_index: GroupIndex) -> List[ResourceIndex]:
+        """List the collections of a group that are not present but referenced by URL."""
+        return [resource_index for resource_index in group_index.resources
+                if resource_index.plural not in group and isinstance(group.get(resource_index.collection_url_field), str)]
+    
+    def resolve_all_resources(self, xreg_doc: JsonNode, headers: Dict[str, str]) -> List[Tuple[str, ...]]:
+        """Recursively resolve all resource references in an xRegistry document.
         
-        # First resolve collection URLs (like messagesurl, schemasurl)
-        self.resolve_collection_urls(xreg_doc, headers)
+        Returns:
+            The key paths of the collections that were added from collection URLs
+        """
+        if not isinstance(xreg_doc, dict):
+            return []
         
-        # Get model groups to process dynamically
-        model_groups = self.loader.model.groups
+        # First resolve collection URLs (like messagesurl, schemasurl); lazily, they
+        # are fetched when their group is first used instead
+        added = [] if self.lazy else self.resolve_collection_urls(xreg_doc, headers)
         
-        for group_type, group_def in model_groups.items():
+        for group_index in ModelIndex.for_model(self.loader.model).groups:
+            group_type = group_index.plural
             if group_type in xreg_doc and isinstance(xreg_doc[group_type], dict):
                 group_collection = xreg_doc[group_type]
-                if not isinstance(group_collection, dict):
-                    continue
-                    
-                # Get resource collections for this group type
-                group_resources = group_def.get("resources", {})
-                if not isinstance(group_resources, dict):
-                    continue
-                
                 for group_id, group in group_collection.items():
-                    if isinstance(group, dict):                        # Process each resource collection type in this group
-                        for resource_collection, resource_def in group_resources.items():
-                            if resource_collection in group and isinstance(group[resource_collection], dict):
-                                resource_collection_data = group[resource_collection]
-                                if not isinstance(resource_collection_data, dict):
-                                    continue
-                                    
-                                # Get the singular name for this resource type from the model
-                                resource_field_name = "resource"  # default fallback
-                                if isinstance(resource_def, dict) and "singular" in resource_def:
-                                    resource_field_name = resource_def["singular"]
-                                
-                                for resource_id, resource in resource_collection_data.items():
-                                    if isinstance(resource, dict):
-                                        # Handle resource versions
-                                        if "versions" in resource and isinstance(resource["versions"], dict):
-                                            versions = resource["versions"]
-                                            if isinstance(versions, dict):
-                                                for version_id, version in versions.items():
-                                                    if isinstance(version, dict):
-                                                        self.resolve_resource(version, headers, resource_field_name)
-                                        else:
-                                            # Handle direct resource (no versions)
-                                            self.resolve_resource(resource, headers, resource_field_name)
+                    if not isinstance(group, dict) or not self.load_filter.includes(group_type, group_id):
+                        continue
+                    if isinstance(group, LazyEntity):
+                        continue
+                    if self.lazy and self._collection_urls(group, group_index):
+                        group_collection[group_id] = self.defer(group, ("group", group_type), headers)
+                    else:
+                        self._resolve_group_resources(group, group_index, headers)
+        return added
+    
+    def defer(self, entity: Dict[str, Any], deferred: Tuple[str, str], headers: Dict[str, str]) -> LazyEntity:
+        """Wrap an entity so what it references by URL is fetched on first use.
+        
+        Args:
+            entity: The group, or the resource or version
+            deferred: ``("group", <group type>)`` to defer the collections of a
+                      group, ``("resource", <resource field>)`` to defer the
+                      resource of a resource or version (see ``LazyEntity``)
+            headers: HTTP headers for fetching
+        """
+        kind, name = deferred
+        if kind == "group":
+            group_index = next(index for index in ModelIndex.for_model(self.loader.model).groups if index.plural == name)
+            
+            def resolve(group: Dict[str, Any]) -> None:
+                self._fetch_collections(group, group_index, headers)
+                self._resolve_group_resources(group, group_index, headers)
+            return LazyEntity(entity, resolve, deferred)
+        return LazyEntity(entity, lambda target: self.resolve_resource(target, headers, name), deferred)
+    
+    def _resolve_group_resources(self, group: Dict[str, Any], group_index: GroupIndex,
+                                 headers: Dict[str, str]) -> None:
+        """Resolve the resources (or their versions) in the collections of a group."""
+        # Process each resource collection type in this group
+        for resource_index in group_index.resources:
+            resource_collection = resource_index.plural
+            if resource_collection in group and isinstance(group[resource_collection], dict):
+                resource_collection_data = group[resource_collection]
+                resource_field_name = resource_index.singular
+                
+                for resource_id, resource in resource_collection_data.items():
+                    if isinstance(resource, dict):
+                        # Handle resource versions
+                        if "versions" in resource and isinstance(resource["versions"], dict):
+                            versions = resource["versions"]
+                            if isinstance(versions, dict):
+                                for version_id, version in versions.items():
+                                    if isinstance(version, dict):
+                                        versions[version_id] = self._resolve_entity(version, headers, resource_field_name)
+                        else:
+                            # Handle direct resource (no versions)
+                            resource_collection_data[resource_id] = self._resolve_entity(resource, headers, resource_field_name)
+    
+    def _resolve_entity(self, entity: Dict[str, Any], headers: Dict[str, str],
+                        resource_field_name: str) -> Dict[str, Any]:
+        """Resolve the resource of an entity, or defer fetching it from its URL until first use.
+        
+        Returns:
+            The entity, or the LazyEntity that replaces it
+        """
+        if isinstance(entity, LazyEntity):
+            return entity
+        if self.lazy and self._resource_url(entity, resource_field_name):
+            return self.defer(entity, ("resource", resource_field_name), headers)
+        self.resolve_resource(entity, headers, resource_field_name)
+        return entity
+    
+    @staticmethod
+    def _resource_url(entity: Dict[str, Any], resource_field_name: str) -> Optional[str]:
+        """Return the URL ``resolve_resource`` would fetch the entity's resource from, if any."""
+        if resource_field_name in entity or ("resource" in entity and resource_field_name != "resource"):
+            return None
+        url = entity[f"{resource_field_name}url"] if f"{resource_field_name}url" in entity else entity.get("resourceurl")
+        return url if isinstance(url, str) else None
 
 
 class MessageResolver:
@@ -711,6 +1110,8 @@ class MessageResolver:
     
     def __init__(self, loader: 'XRegistryLoader'):
         self.loader = loader
+        # Groups of the current load that need resolving (see XRegistryLoader._set_load_filter)
+        self.load_filter = LoadFilter(())
         self.logger = logging.getLogger(__name__ + ".MessageResolver")
     
     def _deep_merge(self, base: Dict[str, Any], overlay: Dict[str, Any]) -> Dict[str, Any]:
@@ -735,180 +1136,243 @@ class MessageResolver:
         
         return result
     
-    def _resolve_basemessage_chain(self, message: Dict[str, Any], xreg_doc: Dict[str, Any], 
-                                   visited: Set[str]) -> Optional[Dict[str, Any]]:
+    def _resolve_basemessage_chain(self, key: MessageKey, message: Dict[str, Any], xreg_doc: Dict[str, Any],
+                                   resolved: Dict[MessageKey, Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
         """Resolve the basemessage chain for a message definition.
         
+        The chain is followed up to the first message without a base, a base
+        that cannot be found, or a message resolved before, and then flattened
+        top-down: each message is merged over its resolved base. Every message
+        on the way is recorded in ``resolved``, so shared ancestors are
+        flattened once per document and descendants merge over the same
+        result; the merge only copies the objects it changes.
+        
         Args:
+            key: Key path of the message (see ``_message_key``)
             message: The message definition to resolve
             xreg_doc: The full xRegistry document for resolving references
-            visited: Set of visited message XID/URLs to detect circular references
+            resolved: Resolved messages by key path, shared by the messages of one document
             
         Returns:
             The fully resolved message with all base messages merged, or None if circular reference detected
         """
-        # Check for basemessageurl reference
-        base_ref = message.get('basemessageurl')
-        if not base_ref:
-            # No base message - return as-is
-            return dict(message)
-        
-        # Check for circular reference
-        if base_ref in visited:
-            self.logger.error(f"Circular basemessage reference detected: {base_ref}")
-            return None
-        
-        visited.add(base_ref)
-        
-        # Find the base message in the document
-        base_message = self._find_message_by_ref(base_ref, xreg_doc)
-        if not base_message:
-            self.logger.warning(f"Base message not found: {base_ref}")
-            # Per spec: "If the referenced message can not be found then an error MUST NOT be generated"
-            # Return current message without base, but remove basemessageurl
-            result = dict(message)
-            if 'basemessageurl' in result:
-                del result['basemessageurl']
-            return result
-        
-        # Recursively resolve the base message's chain
-        resolved_base = self._resolve_basemessage_chain(base_message, xreg_doc, visited)
+        if key in resolved:
+            return resolved[key]
+        
+        # Walk up to the first message whose resolution is known
+        chain: List[Tuple[MessageKey, Dict[str, Any]]] = [(key, message)]
+        on_chain = {key}
+        top: Optional[Dict[str, Any]]
+        while True:
+            _, current = chain[-1]
+            base_ref = current.get('basemessageurl')
+            if not base_ref:
+                # No base message - return as-is
+                top = dict(current)
+                break
+            base_key = self._message_key(base_ref)
+            if base_key is None:
+                self.logger.warning(f"Invalid message reference format: {base_ref.lstrip('#')}")
+            elif base_key in on_chain:
+                self.logger.error(f"Circular basemessage reference detected: {base_ref}")
+                top = None
+                break
+            elif base_key in resolved:
+                top = self._merge_basemessage(resolved[base_key], current)
+                break
+            base_message = self._message_at(base_key, xreg_doc) if base_key is not None else None
+            if not base_message:
+                self.logger.warning(f"Base message not found: {base_ref}")
+                # Per spec: "If the referenced message can not be found then an error MUST NOT be generated"
+                # Return current message without base, but remove basemessageurl
+                top = dict(current)
+                top.pop('basemessageurl', None)
+                break
+            chain.append((base_key, base_message))
+            on_chain.add(base_key)
+        
+        # Flatten top-down: each message is merged over its resolved base
+        value = top
+        resolved[chain[-1][0]] = value
+        for current_key, current in reversed(chain[:-1]):
+            value = self._merge_basemessage(value, current)
+            resolved[current_key] = value
+        return value
+    
+    def _merge_basemessage(self, resolved_base: Optional[Dict[str, Any]],
+                           message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Merge a message over its resolved base message, without the basemessageurl of either."""
         if resolved_base is None:
             # Circular reference in base chain
             return None
-        
-        # Remove basemessageurl from both before merging
-        current = dict(message)
-        if 'basemessageurl' in current:
-            del current['basemessageurl']
-        if 'basemessageurl' in resolved_base:
-            del resolved_base['basemessageurl']
-        
-        # Merge: base first, then overlay with current message
-        merged = self._deep_merge(resolved_base, current)
-        
+        merged = self._deep_merge(resolved_base, message)
+        merged.pop('basemessageurl', None)
         return merged
     
-    def _find_message_by_ref(self, ref: str, xreg_doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Find a message definition by XID or URL reference.
+    @staticmethod
+    def _message_key(ref: str) -> Optional[MessageKey]:
+        """Parse a message reference into the key path of the message or version it points to.
         
         Args:
             ref: The XID or URL reference (e.g., "/messagegroups/group1/messages/msg1")
-            xreg_doc: The xRegistry document to search in
             
         Returns:
-            The message definition, or None if not found
+            ``(groups, group id, messages, message id)``, followed by ``("versions", version id)``
+            for a version, or None if the reference is too short
         """
-        # Parse the reference - handle both absolute and fragment identifiers
-        ref = ref.lstrip('#')  # Remove fragment prefix if present
-        
         # Handle XID format: /messagegroups/{groupid}/messages/{messageid}[/versions/{versionid}]
-        parts = [p for p in ref.split('/') if p]
-        
+        parts = [p for p in ref.lstrip('#').split('/') if p]
         if len(parts) < 4:
-            self.logger.warning(f"Invalid message reference format: {ref}")
-            return None
-        
-        # Extract path components
-        group_collection = parts[0]  # e.g., "messagegroups"
-        group_id = parts[1]
-        resource_collection = parts[2]  # e.g., "messages"
-        message_id = parts[3]
-        
-        # Navigate to the message
-        if group_collection not in xreg_doc:
             return None
-        
-        groups = xreg_doc[group_collection]
-        if not isinstance(groups, dict) or group_id not in groups:
-            return None
-        
-        group = groups[group_id]
-        if not isinstance(group, dict) or resource_collection not in group:
-            return None
-        
-        messages = group[resource_collection]
-        if not isinstance(messages, dict) or message_id not in messages:
+        if len(parts) >= 6 and parts[4] == "versions":
+            return tuple(parts[:6])
+        return tuple(parts[:4])
+    
+    @staticmethod
+    def _message_at(key: MessageKey, xreg_doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Look up the message (or version) at a key path from ``_message_key``."""
+        node: Any = xreg_doc
+        for part in key[:4]:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        if not isinstance(node, dict):
             return None
-        
-        message = messages[message_id]
-        if not isinstance(message, dict):
+        if len(key) == 6:
+            versions = node.get("versions")
+            if isinstance(versions, dict) and key[5] in versions:
+                return versions[key[5]]
             return None
+        return node
+    
+    def _find_message_by_ref(self, ref: str, xreg_doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Find a message definition by XID or URL reference.
         
-        # Check if specific version is requested
-        if len(parts) >= 6 and parts[4] == "versions":
-            version_id = parts[5]
-            if "versions" in message and isinstance(message["versions"], dict):
-                if version_id in message["versions"]:
-                    return message["versions"][version_id]
+        Args:
+            ref: The XID or URL reference (e.g., "/messagegroups/group1/messages/msg1")
+            xreg_doc: The xRegistry document to search in
+            
+        Returns:
+            The message definition, or None if not found
+        """
+        key = self._message_key(ref)
+        if key is None:
+            self.logger.warning(f"Invalid message reference format: {ref.lstrip('#')}")
             return None
-        
-        return message
+        return self._message_at(key, xreg_doc)
     
-    def resolve_all_basemessages(self, xreg_doc: Dict[str, Any]) -> None:
+    def resolve_all_basemessages(self, xreg_doc: Dict[str, Any],
+                                 index: Optional[ReferenceIndex] = None) -> List[Tuple[str, ...]]:
         """Resolve all basemessage references in an xRegistry document.
         
         This processes both messagegroups and endpoints (which can contain embedded messages).
+        Base messages shared by several messages are resolved once.
         
         Args:
             xreg_doc: The xRegistry document to process
+            index: Reference index of the document; if given, the messages with a
+                   basemessageurl are looked up in it instead of walking the groups
+            
+        Returns:
+            The key paths of the messages that were replaced by their resolved version
         """
+        replaced: List[Tuple[str, ...]] = []
         if not isinstance(xreg_doc, dict):
-            return
-        
-        # Process messagegroups
-        if "messagegroups" in xreg_doc and isinstance(xreg_doc["messagegroups"], dict):
-            for group_id, group in xreg_doc["messagegroups"].items():
-                if isinstance(group, dict) and "messages" in group:
-                    messages = group["messages"]
-                    if isinstance(messages, dict):
-                        self._resolve_messages_in_collection(messages, xreg_doc)
-        
-        # Process endpoints (which can have embedded messages)
-        if "endpoints" in xreg_doc and isinstance(xreg_doc["endpoints"], dict):
-            for endpoint_id, endpoint in xreg_doc["endpoints"].items():
-                if isinstance(endpoint, dict) and "messages" in endpoint:
-                    messages = endpoint["messages"]
-                    if isinstance(messages, dict):
-                        self._resolve_messages_in_collection(messages, xreg_doc)
-    
-    def _resolve_messages_in_collection(self, messages: Dict[str, Any], xreg_doc: Dict[str, Any]) -> None:
-        """Resolve basemessage references for all messages in a collection.
+            return replaced
+        resolved: Dict[MessageKey, Optional[Dict[str, Any]]] = {}
+        
+        if index is not None:
+            # Messagegroups first, then endpoints, each in document order
+            candidates = [path[:-1] for path, _ in index.occurrences("basemessageurl")
+                          if len(path) == 5 and path[0] in ("messagegroups", "endpoints") and path[2] == "messages"
+                          and self.load_filter.includes_path(path)]
+            candidates.sort(key=lambda path: path[0] != "messagegroups")
+            for path in candidates:
+                messages = ReferenceIndex.node_at(xreg_doc, path[:-1])
+                if isinstance(messages, dict) and self._resolve_message(messages, path, xreg_doc, resolved):
+                    replaced.append(path)
+            return replaced
+        
+        # Process messagegroups, then endpoints (which can have embedded messages)
+        for group_type in ("messagegroups", "endpoints"):
+            if group_type in xreg_doc and isinstance(xreg_doc[group_type], dict):
+                for group_id, group in xreg_doc[group_type].items():
+                    if isinstance(group, dict) and "messages" in group and self.load_filter.includes(group_type, group_id):
+                        messages = group["messages"]
+                        if isinstance(messages, dict):
+                            for message_id in list(messages.keys()):
+                                path = (group_type, group_id, "messages", message_id)
+                                if self._resolve_message(messages, path, xreg_doc, resolved):
+                                    replaced.append(path)
+        return replaced
+    
+    def _resolve_message(self, messages: Dict[str, Any], path: MessageKey, xreg_doc: Dict[str, Any],
+                         resolved: Dict[MessageKey, Optional[Dict[str, Any]]]) -> bool:
+        """Resolve the basemessage reference of one message in a collection.
         
         Args:
             messages: Dictionary of message definitions
+            path: Key path of the message in the document; its last member is the message ID
             xreg_doc: The full xRegistry document for resolving references
-        """
-        for message_id, message in list(messages.items()):
-            if not isinstance(message, dict):
-                continue
+            resolved: Resolved messages by key path, shared by the messages of one document
             
-            # Check if this message has a basemessageurl
-            if 'basemessageurl' not in message:
-                continue
-            
-            self.logger.debug(f"Resolving basemessage for message: {message_id}")
-            
-            # Resolve the basemessage chain
-            visited: Set[str] = set()
-            resolved_message = self._resolve_basemessage_chain(message, xreg_doc, visited)
-            
-            if resolved_message is not None:
-                # Replace the message with the resolved version
-                messages[message_id] = resolved_message
-                self.logger.debug(f"Successfully resolved basemessage for: {message_id}")
-            else:
-                self.logger.error(f"Failed to resolve basemessage for: {message_id} (circular reference)")
+        Returns:
+            True if the message was replaced by its resolved version
+        """
+        message_id = path[-1]
+        message = messages.get(message_id)
+        if not isinstance(message, dict):
+            return False
+        
+        # Check if this message has a basemessageurl
+        if 'basemessageurl' not in message:
+            return False
+        
+        self.logger.debug(f"Resolving basemessage for message: {message_id}")
+        
+        # Resolve the basemessage chain
+        resolved_message = self._resolve_basemessage_chain(path, message, xreg_doc, resolved)
+        
+        if resolved_message is None:
+            self.logger.error(f"Failed to resolve basemessage for: {message_id} (circular reference)")
+            return False
+        
+        # Replace the message with the resolved version
+        messages[message_id] = resolved_message
+        self.logger.debug(f"Successfully resolved basemessage for: {message_id}")
+        return True
 
 
 class XRegistryLoader:
     """Main loader class for xRegistry documents with dependency resolution."""
     
-    def __init__(self, model_path: Optional[str] = None):
+    def __init__(self, model_path: Optional[str] = None, http_cache: Optional[HttpResponseCache] = None,
+                 max_concurrency: int = 8, transport: Optional[HttpTransport] = None,
+                 prefetch_threshold: int = DEFAULT_PREFETCH_THRESHOLD, lazy_resources: bool = True,
+                 snapshot_cache: Optional[SnapshotCache] = None):
         self.model = Model(model_path)
-        self.dependency_resolver = DependencyResolver(self.model, self)
+        self.http_cache = http_cache
+        # Composed documents of earlier runs; loads with unchanged inputs are served from it
+        self.snapshot_cache = snapshot_cache
+        # Files and URLs read by the load being recorded, if any (see record_inputs)
+        self._inputs: Optional[Dict[str, Dict[str, Any]]] = None
+        self.transport = transport or get_transport()
+        # Fan-out (distinct referenced groups) from which load_with_dependencies fetches
+        # the whole registry instead of walking references; 0 disables the prefetch
+        self.prefetch_threshold = prefetch_threshold
+        # Seconds to wait for each /capabilities probe during root discovery
+        self.discovery_timeout = DEFAULT_DISCOVERY_TIMEOUT
+        # Size from which filtered loads of local JSON files skip unwanted groups while parsing
+        self.stream_threshold = DEFAULT_STREAM_THRESHOLD
+        self.stats = LoadStats()
+        self.dependency_resolver = DependencyResolver(self.model, self, max_concurrency)
         self.resource_resolver = ResourceResolver(self)
+        # Resources and collections referenced by URL are fetched on first use;
+        # prefetch_resources resolves the rest
+        self.resource_resolver.lazy = lazy_resources
         self.message_resolver = MessageResolver(self)
+        # Checks expired snapshots against the epochs of the registry's groups
+        self.epoch_sync = EpochSync(self)
         self.logger = logging.getLogger(__name__ + ".XRegistryLoader")
         
         # Schema handling state for template rendering compatibility
@@ -917,12 +1381,155 @@ class XRegistryLoader:
         
         # Cache for discovered registry roots
         self._registry_roots: Dict[str, str] = {}
+        
+        # Serializes the async API's loads; the resolvers keep per-load state
+        self._load_lock = threading.Lock()
+    
+    def build_reference_index(self, document: JsonNode) -> ReferenceIndex:
+        """Index the references and schema/basemessage attributes of a document.
+        
+        Uses the reference scanner compiled for the model, so callers that need to
+        find references in a composed document can query the index instead of
+        walking the document themselves. The index covers the parts of the
+        document resolved so far: resources and collections that are still
+        deferred are left out rather than fetched (see ``prefetch_resources``
+        for callers that need the whole document).
+        """
+        return self.dependency_resolver.scanner.scan(document, skip_pending=True)
+    
+    def prefetch_resources(self, document: JsonNode) -> int:
+        """Fetch all resources and collections of a document that are still deferred.
+        
+        Loads defer resources and collections referenced by URL (``schemaurl``,
+        ``messagesurl``, ...) until first use (see ``LazyEntity``). This resolves
+        all of them, up to ``max_concurrency`` at a time, including those that
+        resolving turns up (e.g. the schema versions of a fetched collection).
+        Use it where the whole document is needed, as for validation.
+        
+        Returns:
+            The number of entities that were resolved
+        """
+        resolved = 0
+        pending = pending_entities(document)
+        while pending:
+            with ThreadPoolExecutor(max_workers=min(self.dependency_resolver.max_concurrency, len(pending))) as pool:
+                list(pool.map(LazyEntity.materialize, pending))
+            resolved += len(pending)
+            pending = [entity for node in pending for entity in pending_entities(node)]
+        return resolved
+    
+    def _load_snapshot(self, operation: str, sources: List[str], headers: Dict[str, str],
+                       options: Dict[str, Any], load: Callable[[], Tuple[str, Optional[JsonNode]]]
+                       ) -> Tuple[str, Optional[JsonNode]]:
+        """Serve a load from the snapshot cache, or run it and record its snapshot.
+        
+        While ``load`` runs, the files and URLs it reads are recorded as the
+        snapshot's inputs; loads it makes itself are part of it and are not cached
+        on their own. Resources and collections the load deferred are stored
+        unresolved and deferred again when the snapshot is served, so a
+        snapshot costs no fetches the load did not make.
+        """
+        if self.snapshot_cache is None:
+            return load()
+        # Loads below the registry the configured credentials are for read with them
+        key_headers = self.cache_headers(self.transport.auth_base_url, headers) if self.transport.auth_base_url else headers
+        key = SnapshotCache.snapshot_key(operation, sources, options, key_headers, self.model.fingerprint)
+        info = self.snapshot_cache.info(key)
+        if info is not None and self.snapshot_cache.is_current(info):
+            cached = self._read_snapshot(info, headers)
+            if cached is not None:
+                self.logger.debug(f"Serving {', '.join(sources)} from snapshot {key}")
+                self.stats.strategy = "cached"
+                return cached
+        if info is not None and self.http_cache is not None:
+            resynced = self._resync_snapshot(info, headers)
+            if resynced is not None:
+                return resynced
+        
+        (uri, document), inputs = self.record_inputs(load)
+        if document is not None:
+            deferred = [{"paths": paths, "deferred": list(entity.deferred) if entity.deferred else None}
+                        for entity, paths in deferred_entities(document)]
+            if all(entry["deferred"] and all(isinstance(key, (str, int)) for path in entry["paths"] for key in path)
+                   for entry in deferred):
+                self.snapshot_cache.store(key, operation, sources, uri, document, inputs, deferred)
+            else:
+                self.logger.debug(f"Not caching a snapshot of {', '.join(sources)}: it defers entities that cannot be restored")
+        return uri, document
+    
+    def _read_snapshot(self, info: SnapshotInfo, headers: Dict[str, str]) -> Optional[Tuple[str, Optional[JsonNode]]]:
+        """Read a snapshot and defer its unresolved entities again, or return None if it cannot be read."""
+        cached = self.snapshot_cache.read(info)
+        if cached is None:
+            return None
+        uri, document = cached
+        for entry in info.deferred:
+            try:
+                paths = entry["paths"]
+                node = document
+                for key in paths[0]:
+                    node = node[key]
+                entity = self.resource_resolver.defer(node, tuple(entry["deferred"]), headers)
+                for path in paths:
+                    parent = document
+                    for key in path[:-1]:
+                        parent = dict.__getitem__(parent, key) if isinstance(parent, dict) else parent[key]
+                    parent[path[-1]] = entity
+            except (KeyError, IndexError, TypeError, ValueError, StopIteration):
+                self.logger.warning(f"Discarding snapshot {info.key} with entities that cannot be restored")
+                return None
+        return uri, document
+    
+    def _resync_snapshot(self, info: SnapshotInfo, headers: Dict[str, str]) -> Optional[Tuple[str, Optional[JsonNode]]]:
+        """Serve a snapshot whose remote inputs expired if the registry says they are unchanged.
+        
+        The expired inputs are checked by the epochs of the groups they hold
+        (see ``EpochSync``), which takes a few lightweight requests instead of
+        loading again. If some changed, None is returned and the load runs
+        again; the inputs found unchanged are served to it from the HTTP cache,
+        so only the documents of the changed groups are fetched.
+        """
+        expired = self.snapshot_cache.expired_inputs(info)
+        if expired is None:
+            return None
+        unchanged, changed = self.epoch_sync.check(info, expired, headers)
+        if changed:
+            self.logger.debug(f"Snapshot {info.key} is outdated: {', '.join(changed)} changed")
+            return None
+        cached = self._read_snapshot(info, headers)
+        if cached is None:
+            return None
+        self.snapshot_cache.refresh(info, unchanged)
+        self.logger.debug(f"Serving {', '.join(info.sources)} from snapshot {info.key}, checked by epochs")
+        self.stats.strategy = "resynced"
+        return cached
+    
+    def record_inputs(self, load: Callable[[], T]) -> Tuple[T, Dict[str, Dict[str, Any]]]:
+        """Run a load and record the files and URLs it reads.
+        
+        Returns:
+            The result of ``load`` and its inputs: local files by absolute path
+            (see ``file_input``), remote documents by request URL (see ``remote_input``)
+        """
+        self._inputs = {}
+        try:
+            return load(), self._inputs
+        finally:
+            self._inputs = None
+    
+    def _record_input(self, name: str, recorded: Dict[str, Any]) -> None:
+        """Record a file or URL read by the load being recorded, if any."""
+        if self._inputs is not None:
+            self._inputs[name] = recorded
     
     def discover_registry_root(self, url: str, headers: Optional[Dict[str, str]] = None) -> Optional[str]:
         """Discover the xRegistry root by finding the /capabilities endpoint.
         
-        This method traverses the URL path from the base to find where /capabilities
-        is available, which indicates the registry root.
+        The candidates are the host root and every deeper path prefix of the URL, up
+        to the first segment naming a group type (a root cannot lie below it). Roots
+        recorded in the HTTP cache by earlier runs are used without probing. Otherwise
+        all candidates are probed concurrently, each with ``discovery_timeout``, and
+        the shallowest candidate that answers wins.
         
         Args:
             url: Any URL within an xRegistry
@@ -945,43 +1552,55 @@ class XRegistryLoader:
         
         base = f"{parsed.scheme}://{parsed.netloc}"
         
-        # Try the base URL first (most common case)
-        try:
-            caps_url = urllib.parse.urljoin(base, "/capabilities")
-            request = urllib.request.Request(caps_url)
-            for key, value in headers.items():
-                request.add_header(key, value)
-            response = urllib.request.urlopen(request)
-            response.read()  # Just check if it exists
-            self.logger.info(f"Discovered registry root: {base}")
-            self._registry_roots[url] = base
-            return base
-        except:
-            pass
-        
-        # Try progressively deeper paths
+        # The base URL first (most common case), then progressively deeper paths
+        candidates = [base]
+        group_plurals = ModelIndex.for_model(self.model).group_plurals
         path_parts = [p for p in parsed.path.split('/') if p]
-        for i in range(len(path_parts)):
-            test_path = '/' + '/'.join(path_parts[:i+1])
-            registry_candidate = urllib.parse.urljoin(base, test_path)
-            caps_url = registry_candidate + "/capabilities"
-            try:
-                request = urllib.request.Request(caps_url)
-                for key, value in headers.items():
-                    request.add_header(key, value)
-                response = urllib.request.urlopen(request)
-                response.read()
-                self.logger.info(f"Discovered registry root: {registry_candidate}")
-                self._registry_roots[url] = registry_candidate
-                return registry_candidate
-            except:
-                continue
+        for i, part in enumerate(path_parts):
+            if part in group_plurals:
+                break
+            candidates.append(urllib.parse.urljoin(base, '/' + '/'.join(path_parts[:i+1])))
+        
+        registry_root = self.http_cache.lookup_registry_root(candidates) if self.http_cache else None
+        if registry_root:
+            self.logger.debug(f"Using recorded registry root: {registry_root}")
+        elif not (self.http_cache and self.http_cache.offline):
+            registry_root = self._probe_registry_roots(candidates, headers)
+            if registry_root:
+                self.logger.info(f"Discovered registry root: {registry_root}")
+                if self.http_cache:
+                    self.http_cache.store_registry_root(registry_root)
+        if registry_root:
+            self._registry_roots[url] = registry_root
+            return registry_root
         
         # Fallback: assume base is the registry root
         self.logger.warning(f"Could not discover registry root for {url}, using base URL: {base}")
         self._registry_roots[url] = base
         return base
     
+    def _probe_registry_roots(self, candidates: List[str], headers: Dict[str, str]) -> Optional[str]:
+        """Probe ``<candidate>/capabilities`` concurrently and return the first candidate that answers."""
+        def probe(candidate: str) -> bool:
+            self.stats.record("requests")
+            try:
+                response = self.transport.get(candidate + "/capabilities", headers, timeout=self.discovery_timeout)
+                response.raise_for_status()
+            except requests.RequestException:
+                return False
+            return True
+        
+        pool = ThreadPoolExecutor(max_workers=min(self.dependency_resolver.max_concurrency, len(candidates)))
+        try:
+            futures = [pool.submit(probe, candidate) for candidate in candidates]
+            for candidate, future in zip(candidates, futures):
+                if future.result():
+                    return candidate
+            return None
+        finally:
+            # Deeper probes still in flight are not needed anymore
+            pool.shutdown(wait=False, cancel_futures=True)
+    
     def load(self, uri: str, headers: Optional[Dict[str, str]] = None, 
              is_schema_style: bool = False, expand_refs: bool = False,
              messagegroup_filter: str = "", endpoint_filter: str = "") -> Tuple[str, Optional[JsonNode]]:
@@ -1000,9 +1619,17 @@ class XRegistryLoader:
         """
         if headers is None:
             headers = {}
-        
+        if self.snapshot_cache is not None and self._inputs is None:
+            return self._load_snapshot(
+                "load", [uri], headers,
+                {"is_schema_style": is_schema_style, "expand_refs": expand_refs,
+                 "messagegroup_filter": messagegroup_filter, "endpoint_filter": endpoint_filter},
+                lambda: self.load(uri, headers, is_schema_style, expand_refs, messagegroup_filter, endpoint_filter))
+        
+        load_filter = self._set_load_filter(messagegroup_filter, endpoint_filter)
         try:
-            resolved_uri, document = self._load_core(uri, headers)
+            resolved_uri, document = self._load_core(uri, headers, messagegroup_filter=messagegroup_filter,
+                                                     endpoint_filter=endpoint_filter)
             if document is None:
                 return uri, None
             
@@ -1010,9 +1637,7 @@ class XRegistryLoader:
             # and wrap it into a proper document structure
             if isinstance(document, dict):
                 # Detect if this is a full xRegistry document or a single resource
-                model_groups = self.model.groups
-                xreg_collections = set(model_groups.keys())
-                is_full_document = any(key in document for key in xreg_collections)
+                is_full_document = any(key in document for key in ModelIndex.for_model(self.model).group_types)
                 
                 if not is_full_document:
                     # This appears to be a single resource - wrap it
@@ -1029,6 +1654,9 @@ class XRegistryLoader:
                             self.logger.debug(f"Wrapped single resource into document structure: {group_type}/{group_id}")
                             document = wrapped_doc
             
+            # Only resolve the groups the filters keep (or need for basemessages)
+            load_filter.bind(document)
+            
             # Apply basic resource resolution
             self.resource_resolver.resolve_all_resources(document, headers)
             
@@ -1049,13 +1677,16 @@ class XRegistryLoader:
         except Exception as e:
             self.logger.error(f"Failed to load document from {uri}: {e}")
             return uri, None
+        finally:
+            self._set_load_filter("", "")
     
     def load_stacked(self, uris: List[str], headers: Optional[Dict[str, str]] = None,
                      is_schema_style: bool = False, expand_refs: bool = False,
                      messagegroup_filter: str = "", endpoint_filter: str = "") -> Tuple[str, Optional[JsonNode]]:
         """Load multiple xRegistry documents and stack them with later documents shadowing earlier ones.
         
-        Documents are loaded in the order provided. When documents are stacked:
+        Documents are loaded in parallel (see ``_load_layers``) and stacked in the
+        order provided. When documents are stacked:
         - Top-level keys from later documents override those from earlier documents
         - Within collections (messagegroups, schemagroups, endpoints, etc.), items are merged by ID
         - Later items with the same ID completely replace earlier items
@@ -1077,14 +1708,19 @@ class XRegistryLoader:
         if not uris:
             self.logger.error("No URIs provided for stacking")
             return "", None
+        if self.snapshot_cache is not None and self._inputs is None:
+            return self._load_snapshot(
+                "load_stacked", uris, headers,
+                {"is_schema_style": is_schema_style, "expand_refs": expand_refs,
+                 "messagegroup_filter": messagegroup_filter, "endpoint_filter": endpoint_filter},
+                lambda: self.load_stacked(uris, headers, is_schema_style, expand_refs,
+                                          messagegroup_filter, endpoint_filter))
         
         try:
-            stacked_document: Optional[Dict[str, Any]] = None
+            stack: Optional[DocumentStack] = None
             last_resolved_uri = uris[0]
             
-            for uri in uris:
-                self.logger.debug(f"Loading document for stacking: {uri}")
-                resolved_uri, document = self._load_core(uri, headers)
+            for uri, (resolved_uri, document) in zip(uris, self._load_layers(uris, headers)):
                 last_resolved_uri = resolved_uri
                 
                 if document is None:
@@ -1095,20 +1731,20 @@ class XRegistryLoader:
                     self.logger.error(f"Document from {uri} is not a dictionary")
                     return uri, None
                 
-                # Apply basic resource resolution to this document
-                self.resource_resolver.resolve_all_resources(document, headers)
-                
-                # Stack/merge this document
-                if stacked_document is None:
-                    stacked_document = document
+                # Stack/merge this document; containers are only copied where a later document writes
+                if stack is None:
+                    stack = DocumentStack(ModelIndex.for_model(self.model), document)
                 else:
-                    stacked_document = self._merge_documents(stacked_document, document)
+                    stack.push(document)
             
-            if stacked_document is None:
+            if stack is None:
                 return uris[0], None
+            stacked_document: Optional[Dict[str, Any]] = stack.document
             
-            # Resolve basemessage references in the final stacked document
+            # Resolve basemessage references in the final stacked document, for the
+            # groups the filters keep (or need for basemessages)
             if isinstance(stacked_document, dict):
+                self._set_load_filter(messagegroup_filter, endpoint_filter).bind(stacked_document)
                 self.message_resolver.resolve_all_basemessages(stacked_document)
             
             # Apply filters to the final stacked document
@@ -1123,6 +1759,32 @@ class XRegistryLoader:
         except Exception as e:
             self.logger.error(f"Failed to stack documents: {e}")
             return uris[0], None
+        finally:
+            self._set_load_filter("", "")
+    
+    def _load_layers(self, uris: List[str], headers: Dict[str, str]) -> List[Tuple[str, Optional[JsonNode]]]:
+        """Load the documents to stack, with basic resource resolution, in parallel.
+        
+        The documents are independent of each other, so up to ``max_concurrency``
+        of them are fetched, parsed and resource-resolved at a time; only merging
+        them has to follow their order.
+        
+        Returns:
+            ``(resolved_uri, document)`` per URI, in the order of the URIs
+        """
+        def load_layer(uri: str) -> Tuple[str, Optional[JsonNode]]:
+            self.logger.debug(f"Loading document for stacking: {uri}")
+            resolved_uri, document = self._load_core(uri, headers)
+            if isinstance(document, dict):
+                # Apply basic resource resolution to this document
+                self.resource_resolver.resolve_all_resources(document, headers)
+            return resolved_uri, document
+        
+        max_workers = min(self.dependency_resolver.max_concurrency, len(uris))
+        if max_workers <= 1:
+            return [load_layer(uri) for uri in uris]
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(load_layer, uris))
     
     def _merge_documents(self, base: Dict[str, Any], overlay: Dict[str, Any]) -> Dict[str, Any]:
         """Merge two xRegistry documents with overlay shadowing base.
@@ -1136,58 +1798,12 @@ class XRegistryLoader:
             base: The base document
             overlay: The overlay document that shadows the base
             
+        Neither document is modified; see ``DocumentStack``.
+        
         Returns:
             Merged document
         """
-        result = dict(base)
-        
-        # Get model groups to identify xRegistry collections
-        model_groups = self.model.groups
-        collection_keys = set(model_groups.keys())
-        
-        for key, value in overlay.items():
-            if key in collection_keys and isinstance(value, dict) and isinstance(result.get(key), dict):
-                # This is an xRegistry collection (e.g., messagegroups, schemagroups)
-                # Merge group instances within the collection
-                merged_collection = dict(result[key])
-                
-                for group_id, group_data in value.items():
-                    if group_id in merged_collection and isinstance(group_data, dict) and isinstance(merged_collection[group_id], dict):
-                        # This group exists in both - merge the group contents
-                        merged_group = dict(merged_collection[group_id])
-                        
-                        # Get resource collection names for this group type from the model
-                        group_def = model_groups.get(key, {})
-                        resource_collections = group_def.get("resources", {})
-                        
-                        if isinstance(resource_collections, dict):
-                            resource_collection_names = set(resource_collections.keys())
-                        else:
-                            resource_collection_names = set()
-                        
-                        for group_key, group_value in group_data.items():
-                            if group_key in resource_collection_names and isinstance(group_value, dict) and isinstance(merged_group.get(group_key), dict):
-                                # This is a resource collection (e.g., messages, schemas)
-                                # Merge resources by ID within the collection
-                                merged_resources = dict(merged_group[group_key])
-                                for resource_id, resource_data in group_value.items():
-                                    merged_resources[resource_id] = resource_data
-                                merged_group[group_key] = merged_resources
-                            else:
-                                # Not a resource collection - replace completely
-                                merged_group[group_key] = group_value
-                        
-                        merged_collection[group_id] = merged_group
-                    else:
-                        # Group doesn't exist in base or types don't match - replace completely
-                        merged_collection[group_id] = group_data
-                
-                result[key] = merged_collection
-            else:
-                # Not a collection or types don't match - replace completely
-                result[key] = value
-        
-        return result
+        return DocumentStack(ModelIndex.for_model(self.model), base).push(overlay).document
     
     def load_with_dependencies(self, uri: str, headers: Optional[Dict[str, str]] = None,
                               messagegroup_filter: str = "", endpoint_filter: str = "") -> Tuple[str, Optional[JsonNode]]:
@@ -1205,7 +1821,13 @@ class XRegistryLoader:
         self.logger.info(f"[ENTRY] load_with_dependencies called with uri: {uri}")
         if headers is None:
             headers = {}
+        if self.snapshot_cache is not None and self._inputs is None:
+            return self._load_snapshot(
+                "load_with_dependencies", [uri], headers,
+                {"messagegroup_filter": messagegroup_filter, "endpoint_filter": endpoint_filter},
+                lambda: self.load_with_dependencies(uri, headers, messagegroup_filter, endpoint_filter))
         
+        load_filter = self._set_load_filter(messagegroup_filter, endpoint_filter)
         try:
             # Discover the registry root for resolving relative URIs
             registry_root = None
@@ -1214,10 +1836,22 @@ class XRegistryLoader:
                 self.logger.info(f"Using registry root: {registry_root}")
             
             # Load the entry point
-            resolved_uri, entry_data = self._load_core(uri, headers)
+            resolved_uri, entry_data = self._load_core(uri, headers, messagegroup_filter=messagegroup_filter,
+                                                       endpoint_filter=endpoint_filter)
             if entry_data is None:
                 return uri, None
             
+            # With a large fan-out, one inlined snapshot of the registry is cheaper than
+            # walking the references; the walk below is then served from the snapshot
+            self.stats.strategy = "walk"
+            if (registry_root and self.prefetch_threshold > 0
+                    and XRegistryUrlParser(resolved_uri).get_entry_type() != "registry"):
+                self.stats.fan_out = self.dependency_resolver.estimate_fan_out(resolved_uri, entry_data, registry_root)
+                if (self.stats.fan_out >= self.prefetch_threshold
+                        and self.dependency_resolver.prefetch_registry(registry_root, headers)):
+                    self.logger.info(f"Fan-out of {self.stats.fan_out} groups, using a snapshot of {registry_root}")
+                    self.stats.strategy = "snapshot"
+            
             # Build composed document with all dependencies
             composed_document = self.dependency_resolver.build_composed_document(
                 resolved_uri, entry_data, headers, registry_root)
@@ -1226,26 +1860,37 @@ class XRegistryLoader:
             # This fetches collections that may contain additional references
             self.resource_resolver.resolve_collection_urls(composed_document, headers)
             
-            # Iteratively resolve dependencies until no new references are found
-            max_iterations = 10  # Prevent infinite loops
-            for iteration in range(max_iterations):
-                # Find all references in the current document
-                all_refs = []
-                model_groups = self.model.groups
-                for group_type in model_groups.keys():
-                    if group_type in composed_document:
-                        refs = self.dependency_resolver.find_xid_references(
-                            {group_type: composed_document[group_type]}, group_type)
-                        all_refs.extend(refs)
-                
-                # Filter out already resolved references
-                new_refs = [ref for ref in all_refs if ref not in self.dependency_resolver.resolved_resources]
-                
+            # Resolve dependencies with a worklist: the first step scans the whole document,
+            # every later step only the nodes added or changed by the step before. Resolution
+            # ends when a step turns up no new references.
+            # With filters, references into groups the filters discard are not followed; they
+            # are held back in case a later step includes their group.
+            changed: List[Tuple[str, ...]] = [(group_type,) for group_type in ModelIndex.for_model(self.model).group_types
+                                              if group_type in composed_document]
+            deferred_refs: List[str] = []
+            index = ReferenceIndex(self.dependency_resolver.scanner)
+            self.dependency_resolver.reference_index = index
+            processed: Set[str] = set()
+            step = 0
+            while True:
+                load_filter.bind(composed_document)
+                candidates = self.dependency_resolver.scan_added_nodes(composed_document, changed) + deferred_refs
+                new_refs = [ref for ref in candidates
+                            if ref not in processed and ref not in self.dependency_resolver.resolved_resources]
+                deferred_refs = [ref for ref in new_refs if not load_filter.includes_reference(ref)]
+                new_refs = [ref for ref in new_refs if load_filter.includes_reference(ref)]
                 if not new_refs:
-                    self.logger.debug(f"Dependency resolution complete after {iteration} iterations")
+                    self.logger.debug(f"Dependency resolution complete after {step} steps")
                     break
                 
-                self.logger.debug(f"Iteration {iteration}: Resolving {len(new_refs)} new references")
+                self.logger.debug(f"Step {step}: Resolving {len(new_refs)} new references")
+                processed.update(new_refs)
+                changed = []
+                
+                # Fetch this step's references (and missing parent groups) concurrently;
+                # they are merged into the document sequentially below to keep the order stable
+                self.dependency_resolver.resolve_references(
+                    self._collect_prefetch_urls(composed_document, new_refs, registry_root), headers)
                 
                 # Resolve new references
                 for ref_url in new_refs:
@@ -1282,30 +1927,40 @@ class XRegistryLoader:
                                 group_resource = self.dependency_resolver.resolve_reference(group_url, headers, registry_root)
                                 if group_resource is not None:
                                     self.logger.debug(f"Successfully fetched parent group {group_id}, adding to document")
-                                    self.dependency_resolver._add_resource_to_document(composed_document, group_url, group_resource)
+                                    changed.append(self.dependency_resolver._add_resource_to_document(composed_document, group_url, group_resource))
                                     # Resolve collection URLs in the newly added group
-                                    self.resource_resolver.resolve_collection_urls(composed_document, headers)
+                                    changed.extend(self.resource_resolver.resolve_collection_urls(composed_document, headers))
                                 else:
                                     self.logger.debug(f"Failed to fetch parent group from {group_url}")
                     
                     resolved_resource = self.dependency_resolver.resolve_reference(full_ref_url, headers, registry_root)
                     if resolved_resource is not None:
-                        self.dependency_resolver._add_resource_to_document(composed_document, full_ref_url, resolved_resource)
+                        changed.append(self.dependency_resolver._add_resource_to_document(composed_document, full_ref_url, resolved_resource))
                 
                 # Resolve collection URLs again in case new groups were added
-                self.resource_resolver.resolve_collection_urls(composed_document, headers)
-            
+                changed.extend(self.resource_resolver.resolve_collection_urls(composed_document, headers))
+                step += 1
+
+            # The filters would have emptied the collections of the groups that were not
+            # fetched; keep those collections so the result has the same shape
+            for ref in deferred_refs:
+                group = load_filter.group_of(ref)
+                if group:
+                    composed_document.setdefault(group[0], {})
+
             # Resolve all individual resource references (like schemaurl, resourceurl)
-            self.resource_resolver.resolve_all_resources(composed_document, headers)
+            index.rescan(composed_document,
+                         self.resource_resolver.resolve_all_resources(composed_document, headers))
             
-            # Resolve basemessage references
+            # Resolve basemessage references; the index keeps track of the replaced messages
             if isinstance(composed_document, dict):
-                self.message_resolver.resolve_all_basemessages(composed_document)
+                index.rescan(composed_document,
+                             self.message_resolver.resolve_all_basemessages(composed_document, index))
             
             # Normalize schema references from relative URIs to JSON pointers
             # This must be done after all dependencies are resolved to ensure
             # newly added resources have their references normalized
-            self.dependency_resolver._normalize_schema_references(composed_document)
+            self.dependency_resolver._normalize_schema_references(composed_document, index)
             
             # Apply message group filtering if needed
             if messagegroup_filter and isinstance(composed_document, dict):
@@ -1320,15 +1975,85 @@ class XRegistryLoader:
         except Exception as e:
             self.logger.error(f"Failed to load document with dependencies from {uri}: {e}")
             return uri, None
+        finally:
+            self._set_load_filter("", "")
+    
+    def _set_load_filter(self, messagegroup_filter: str, endpoint_filter: str) -> LoadFilter:
+        """Compile the filters of a load and share them with the resolvers.
+        
+        The resolvers skip the groups the filters will discard; the filters are
+        still applied to the finished document.
+        """
+        load_filter = LoadFilter(ModelIndex.for_model(self.model).group_types, messagegroup_filter, endpoint_filter)
+        self.dependency_resolver.load_filter = load_filter
+        self.resource_resolver.load_filter = load_filter
+        self.message_resolver.load_filter = load_filter
+        return load_filter
+    
+    async def aload(self, uri: str, headers: Optional[Dict[str, str]] = None,
+                    is_schema_style: bool = False, expand_refs: bool = False,
+                    messagegroup_filter: str = "", endpoint_filter: str = "") -> Tuple[str, Optional[JsonNode]]:
+        """Async variant of ``load``; see ``_run_async``."""
+        return await self._run_async(self.load, uri, headers, is_schema_style, expand_refs,
+                                     messagegroup_filter, endpoint_filter)
+    
+    async def aload_stacked(self, uris: List[str], headers: Optional[Dict[str, str]] = None,
+                            is_schema_style: bool = False, expand_refs: bool = False,
+                            messagegroup_filter: str = "", endpoint_filter: str = "") -> Tuple[str, Optional[JsonNode]]:
+        """Async variant of ``load_stacked``; see ``_run_async``."""
+        return await self._run_async(self.load_stacked, uris, headers, is_schema_style, expand_refs,
+                                     messagegroup_filter, endpoint_filter)
+    
+    async def aload_with_dependencies(self, uri: str, headers: Optional[Dict[str, str]] = None,
+                                      messagegroup_filter: str = "", endpoint_filter: str = "") -> Tuple[str, Optional[JsonNode]]:
+        """Async variant of ``load_with_dependencies``; see ``_run_async``."""
+        return await self._run_async(self.load_with_dependencies, uri, headers,
+                                     messagegroup_filter, endpoint_filter)
+    
+    async def _run_async(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a load in a worker thread so that it does not block the event loop.
+        
+        The load has the same resolution semantics as the sync method and shares the
+        pooled HTTP transport and the HTTP cache. Loads on one loader are serialized
+        because the resolvers keep per-load state; to resolve several registries
+        concurrently, use one loader per registry (e.g. with ``asyncio.gather``).
+        """
+        def run_locked() -> T:
+            with self._load_lock:
+                return func(*args)
+        return await asyncio.to_thread(run_locked)
+    
+    def _collect_prefetch_urls(self, composed_document: Dict[str, Any], refs: List[str],
+                               registry_root: Optional[str]) -> List[str]:
+        """List the URLs an iteration of load_with_dependencies will need, parent groups first."""
+        urls: List[str] = []
+        for ref_url in refs:
+            full_ref_url = ref_url
+            if ref_url.startswith('/') and registry_root:
+                full_ref_url = urllib.parse.urljoin(registry_root, ref_url)
+            
+            parser = XRegistryUrlParser(full_ref_url)
+            if parser.get_entry_type() in ["resource", "version"]:
+                group_type = parser.get_group_type()
+                group_id = parser.get_group_id()
+                if group_type and group_id and (group_type not in composed_document or group_id not in composed_document.get(group_type, {})):
+                    group_path = f"/{group_type}/{group_id}"
+                    urls.append(urllib.parse.urljoin(registry_root, group_path) if registry_root else group_path)
+            urls.append(full_ref_url)
+        return urls
     
     def _load_core(self, uri: str, headers: Dict[str, str], 
-                   ignore_handled: bool = False) -> Tuple[str, Optional[JsonNode]]:
+                   ignore_handled: bool = False, messagegroup_filter: str = "",
+                   endpoint_filter: str = "") -> Tuple[str, Optional[JsonNode]]:
         """Core loading method for fetching and parsing documents.
         
         Args:
             uri: The URI to load from
             headers: HTTP headers for authentication
             ignore_handled: Internal flag for recursive loading
+            messagegroup_filter: Filter that will be applied to the document; large
+                local files may skip groups it discards
+            endpoint_filter: Filter that will be applied to the document, likewise
             
         Returns:
             Tuple of (resolved_uri, document) or (uri, None) on error
@@ -1342,77 +2067,256 @@ class XRegistryLoader:
             elif uri.startswith('file://'):
                 # Load from file URI
                 file_path = uri[7:]  # Remove 'file://' prefix
-                return self._load_from_file(file_path)
+                return self._load_from_file(file_path, messagegroup_filter, endpoint_filter)
             else:
                 # Assume local file path
-                return self._load_from_file(uri)
+                return self._load_from_file(uri, messagegroup_filter, endpoint_filter)
                 
         except Exception as e:
             self.logger.error(f"Error loading from {uri}: {e}")
             return uri, None
     
-    def _load_from_url(self, url: str, headers: Dict[str, str]) -> Tuple[str, Optional[JsonNode]]:
-        """Load document from HTTP/HTTPS URL."""
+    def _load_from_url(self, url: str, headers: Dict[str, str],
+                       optional: bool = False) -> Tuple[str, Optional[JsonNode]]:
+        """Load document from HTTP/HTTPS URL.
+        
+        Failures are logged as errors, or at debug level if ``optional`` is set
+        (for requests the caller has a fallback for).
+        """
+        # Use the ?inline flag to fetch nested collections automatically
+        # This avoids the need to make multiple HTTP requests
+        parser = XRegistryUrlParser(url)
+        entry_type = parser.get_entry_type()
+        
+        # Add ?inline parameter for group instances and resources to fetch their collections
+        modified_url = url
+        if entry_type in ["group_instance", "resource"]:
+            # For group instances, inline all resource collections (messages, schemas, etc.)
+            # For resources, inline versions
+            separator = '&' if '?' in url else '?'
+            inline_param = "inline=*"  # Inline all collections
+            modified_url = f"{url}{separator}{inline_param}"
+            self.logger.debug(f"Adding inline parameter to URL: {modified_url}")
+        
+        return url, self._fetch_document(modified_url, headers, optional)  # Return original URL for consistency
+    
+    def cache_headers(self, url: str, headers: Optional[Dict[str, str]]) -> Dict[str, str]:
+        """Return the headers a request is cached under: those the transport sends, including its credentials.
+        
+        Responses fetched with different credentials, or without any, never
+        share a cache entry.
+        """
+        return self.transport.effective_headers(url, headers)
+    
+    def _fetch_document(self, request_url: str, headers: Dict[str, str],
+                        optional: bool = False) -> Optional[JsonNode]:
+        """Fetch and parse the document at a request URL, through the HTTP cache if there is one."""
+        log_failure = self.logger.debug if optional else self.logger.error
+        cache_headers = self.cache_headers(request_url, headers)
         try:
-            # Use the ?inline flag to fetch nested collections automatically
-            # This avoids the need to make multiple HTTP requests
-            parser = XRegistryUrlParser(url)
-            entry_type = parser.get_entry_type()
-            
-            # Add ?inline parameter for group instances and resources to fetch their collections
-            modified_url = url
-            if entry_type in ["group_instance", "resource"]:
-                # For group instances, inline all resource collections (messages, schemas, etc.)
-                # For resources, inline versions
-                separator = '&' if '?' in url else '?'
-                inline_param = "inline=*"  # Inline all collections
-                modified_url = f"{url}{separator}{inline_param}"
-                self.logger.debug(f"Adding inline parameter to URL: {modified_url}")
+            cached = self.http_cache.lookup(request_url, cache_headers) if self.http_cache else None
+            if cached and self.http_cache and self.http_cache.is_fresh(cached[0]):
+                self.http_cache.stats.record("hits")
+                self.logger.debug(f"Serving {request_url} from cache")
+                document = self._parse_content(cached[1])
+                self._record_input(request_url, self._remote_input(request_url, document, cached[0].content_hash,
+                                                                   cached[0].stored_at, cached[0].etag))
+                return document
+            if self.http_cache and self.http_cache.offline:
+                self.http_cache.stats.record("misses")
+                log_failure(f"Offline mode: {request_url} is not in the cache")
+                self._record_input(request_url, remote_input(None, time.time()))
+                return None
             
-            request = urllib.request.Request(modified_url)
-            for key, value in headers.items():
-                request.add_header(key, value)
+            request_headers = dict(headers)
+            if cached:
+                request_headers.update(HttpResponseCache.conditional_headers(cached[0]))
+            self.stats.record("requests")
+            response = self.transport.get(request_url, request_headers)
+            if response.status_code == 304 and cached and self.http_cache:
+                # Not modified - the cached body is still current
+                self.http_cache.stats.record("revalidated")
+                self.http_cache.touch(request_url, cache_headers, cached[0], response.headers)
+                self.logger.debug(f"Revalidated cached {request_url}")
+                document = self._parse_content(cached[1])
+                self._record_input(request_url, self._remote_input(request_url, document, cached[0].content_hash,
+                                                                   cached[0].stored_at, cached[0].etag))
+                return document
+            response.raise_for_status()
+            body = response.content
+            self.stats.record("bytes_on_wire", self._wire_size(response, body))
+            self.stats.record("bytes_decoded", len(body))
             
-            with urllib.request.urlopen(request) as response:
-                content = response.read().decode('utf-8')
-                document = self._parse_content(content)
-                return url, document  # Return original URL for consistency
+            document = self._parse_content(body)
+            if self.http_cache:
+                self.http_cache.stats.record("misses")
+                if document is not None:
+                    self.http_cache.store(request_url, cache_headers, body, response.headers, extract_epoch(document))
+            if self._inputs is not None:
+                self._record_input(request_url, self._remote_input(request_url, document, hashlib.sha256(body).hexdigest(),
+                                                                   time.time(), response.headers.get("ETag")))
+            return document
                 
-        except urllib.error.HTTPError as e:
-            self.logger.error(f"HTTP error loading {url}: {e.code} {e.reason}")
-            return url, None
-        except urllib.error.URLError as e:
-            self.logger.error(f"URL error loading {url}: {e.reason}")
-            return url, None
-    
-    def _load_from_file(self, file_path: str) -> Tuple[str, Optional[JsonNode]]:
-        """Load document from local file."""
+        except requests.HTTPError as e:
+            log_failure(f"HTTP error loading {request_url}: {e.response.status_code} {e.response.reason}")
+            self._record_input(request_url, remote_input(None, time.time()))
+            return None
+        except requests.RequestException as e:
+            log_failure(f"URL error loading {request_url}: {e}")
+            self._record_input(request_url, remote_input(None, time.time()))
+            return None
+    
+    def _remote_input(self, request_url: str, document: Optional[JsonNode], content_hash: str,
+                      fetched_at: float, etag: Optional[str]) -> Dict[str, Any]:
+        """Describe a fetched document as a snapshot input, with the versions of the groups it holds."""
+        if self._inputs is None:
+            return {}
+        versions = entity_versions(request_url, document, ModelIndex.for_model(self.model).group_types)
+        return remote_input(content_hash, fetched_at, etag, extract_epoch(document), **versions)
+    
+    @staticmethod
+    def _wire_size(response: requests.Response, body: bytes) -> int:
+        """Return the number of body bytes transferred for a response, before decompression."""
+        try:
+            size = response.raw.tell()
+        except (AttributeError, OSError):
+            size = None
+        return size if isinstance(size, int) and size > 0 else len(body)
+    
+    def _load_from_file(self, file_path: str, messagegroup_filter: str = "",
+                        endpoint_filter: str = "") -> Tuple[str, Optional[JsonNode]]:
+        """Load document from local file.
+        
+        The format is sniffed so that only one parser runs. YAML is parsed from the
+        file stream. JSON files of at least ``stream_threshold`` bytes that are loaded
+        with filters are parsed event by event, skipping the groups the filters will
+        discard (see ``_stream_filtered_json``).
+        """
         try:
+            if self._inputs is not None:
+                self._record_input(os.path.abspath(file_path), file_input(file_path))
             if not os.path.exists(file_path):
                 self.logger.error(f"File not found: {file_path}")
                 return file_path, None
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                document = self._parse_content(content)
-                return file_path, document
+            with open(file_path, 'rb') as f:
+                content_format = self._sniff_format(file_path, f)
+                if content_format == "yaml":
+                    return file_path, self._parse_yaml(f)
+                if ((messagegroup_filter or endpoint_filter) and json_streaming.is_available()
+                        and os.path.getsize(file_path) >= self.stream_threshold):
+                    try:
+                        return file_path, self._stream_filtered_json(f, messagegroup_filter, endpoint_filter)
+                    except ValueError as e:
+                        self.logger.debug(f"Streaming parse of {file_path} failed, parsing it as a whole: {e}")
+                        f.seek(0)
+                return file_path, self._parse_content(f.read())
                 
         except IOError as e:
             self.logger.error(f"IO error loading {file_path}: {e}")
             return file_path, None
     
-    def _parse_content(self, content: str) -> Optional[JsonNode]:
-        """Parse content as JSON or YAML."""
+    @staticmethod
+    def _sniff_format(file_path: str, stream: Any) -> str:
+        """Tell JSON from YAML by the file extension, else by the first non-whitespace byte.
+        
+        ``.json`` files and files starting with ``{`` or ``[`` are JSON (which
+        ``_parse_content`` still falls back to YAML for); anything else is YAML.
+        The stream is rewound afterwards.
+        """
+        if os.path.splitext(file_path)[1].lower() == ".json":
+            return "json"
+        first = b""
+        while True:
+            chunk = stream.read(4096)
+            if not chunk:
+                break
+            first = chunk.lstrip(b"\xef\xbb\xbf \t\r\n")[:1]
+            if first:
+                break
+        stream.seek(0)
+        return "json" if first in (b"{", b"[") else "yaml"
+    
+    def _parse_yaml(self, content: Any) -> Optional[JsonNode]:
+        """Parse YAML from a string, bytes or a binary stream."""
+        try:
+            return yaml.load(content, Loader=YAML_LOADER)
+        except yaml.YAMLError as e:
+            self.logger.error(f"Failed to parse content as YAML: {e}")
+            return None
+    
+    def _stream_filtered_json(self, stream: Any, messagegroup_filter: str, endpoint_filter: str) -> Optional[JsonNode]:
+        """Parse a JSON document, skipping the groups ``_apply_*_filter`` would discard.
+        
+        Skipped groups that the kept part of the document references (for instance
+        as basemessages) are parsed in a further pass, so resolution sees the same
+        content as with a full parse.
+        
+        Raises:
+            ValueError: If the document is not valid JSON
+        """
+        group_types = ModelIndex.for_model(self.model).group_plurals
+        load_filter = LoadFilter(group_types, messagegroup_filter, endpoint_filter)
+        # The filters only need the selected endpoints; message groups are assumed present (checked below)
+        outline: Dict[str, Any] = {"messagegroups": {}}
+        if endpoint_filter:
+            outline["endpoints"] = {endpoint_id: endpoint for endpoint_id, endpoint
+                                    in json_streaming.load_members(stream, "endpoints")
+                                    if endpoint_filter in endpoint_id}
+            stream.seek(0)
+        load_filter.bind(outline)
+        
+        document, skipped = json_streaming.load_groups(stream, group_types, load_filter.keeps)
+        if not skipped:
+            return document
+        if not isinstance(document, dict) or (messagegroup_filter and "messagegroups" not in document):
+            # The filters would not apply as assumed; parse everything
+            stream.seek(0)
+            return self._parse_content(stream.read())
+        
+        # Bring back skipped groups the kept ones refer to, until nothing new is referenced
+        pattern = re.compile("/(" + "|".join(re.escape(g) for g in group_types) + ")/([^/#?]+)")
+        pending = set(skipped)
+        scan: JsonNode = document
+        while True:
+            wanted = {(m.group(1), m.group(2)) for text in self._strings(scan) for m in pattern.finditer(text)} & pending
+            if not wanted:
+                return document
+            pending -= wanted
+            stream.seek(0)
+            restored, _ = json_streaming.load_groups(stream, group_types, lambda t, i: (t, i) in wanted)
+            scan = {group_type: {group_id: restored[group_type][group_id] for t, group_id in wanted if t == group_type}
+                    for group_type in {t for t, _ in wanted}}
+            for group_type, groups in scan.items():
+                document[group_type].update(groups)
+    
+    @staticmethod
+    def _strings(data: JsonNode) -> List[str]:
+        """List all strings in a document (keys excluded)."""
+        strings: List[str] = []
+        stack: List[Any] = [data]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                strings.append(node)
+            elif isinstance(node, dict):
+                stack.extend(node.values())
+            elif isinstance(node, list):
+                stack.extend(node)
+        return strings
+    
+    def _parse_content(self, content: Union[str, bytes]) -> Optional[JsonNode]:
+        """Parse content as JSON or YAML.
+        
+        Bytes are parsed directly (UTF-8/16/32 are detected), without decoding
+        them to an intermediate string first.
+        """
         try:
             # Try JSON first
             return json.loads(content)
-        except json.JSONDecodeError:
-            try:
-                # Fall back to YAML
-                return yaml.safe_load(content)
-            except yaml.YAMLError as e:
-                self.logger.error(f"Failed to parse content as JSON or YAML: {e}")
-                return None
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            # Fall back to YAML
+            return self._parse_yaml(content)
     
     def _apply_messagegroup_filter(self, document: Dict[str, Any], 
                                   messagegroup_filter: str) -> Dict[str, Any]:
@@ -1461,27 +2365,7 @@ class XRegistryLoader:
             filtered_doc["endpoints"] = filtered_endpoints
             
             # Step 2: Collect messagegroup IDs referenced by filtered endpoints
-            referenced_messagegroups = set()
-            for endpoint_data in filtered_endpoints.values():
-                if isinstance(endpoint_data, dict):
-                    # Check for messagegroups at top level
-                    messagegroups = endpoint_data.get("messagegroups", [])
-                    if isinstance(messagegroups, list):
-                        for mg_ref in messagegroups:
-                            if isinstance(mg_ref, str):
-                                # Handle both direct IDs and #/messagegroups/... references
-                                mg_id = mg_ref.split("/")[-1] if "/" in mg_ref else mg_ref
-                                referenced_messagegroups.add(mg_id)
-                    
-                    # Also check for messagegroups in config (alternative structure)
-                    config = endpoint_data.get("config", {})
-                    if isinstance(config, dict):
-                        config_messagegroups = config.get("messagegroups", [])
-                        if isinstance(config_messagegroups, list):
-                            for mg_ref in config_messagegroups:
-                                if isinstance(mg_ref, str):
-                                    mg_id = mg_ref.split("/")[-1] if "/" in mg_ref else mg_ref
-                                    referenced_messagegroups.add(mg_id)
+            referenced_messagegroups = endpoint_messagegroup_ids(filtered_endpoints)
             
             # Step 3: Filter messagegroups to only those referenced by filtered endpoints
             if referenced_messagegroups and isinstance(filtered_doc.get("messagegroups"), dict):